@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Measures how much memory the Node and Edge objects of an assembly graph
+# take up. A synthetic LastGraph-like graph is built through
+# graph_core.GraphCore the same way that collate.py builds it: each contig
+# gets 3 Node objects (its node and its reverse complement's node in the
+# double graph, and its node in the single graph), and each contig has an arc
+# to the next one (wrapping around at the end), which gives 2 Edge objects in
+# the double graph.
+#
+# Memory is measured as the increase in this process' resident set size
+# (RSS): once after all of the nodes have been added (divided by the number
+# of Node objects), and again after all of the arcs have been added and every
+# Edge object has been created (divided by the number of Edge objects). So
+# these numbers include everything else that's stored per node or per edge,
+# e.g. in GraphCore's arrays.
+#
+# Usage (Linux only, since RSS is read from /proc/self/status):
+#
+#   ./benchmarks/memory.py [-n CONTIGS] [-gc] [-t TREE]
+#
+# To compare against an older version of graph_core.py and graph_objects.py,
+# check it out somewhere else (e.g. "git worktree add /tmp/before <commit>")
+# and pass its graph_collator directory as -t.
+
+import os
+import gc
+import sys
+import time
+import argparse
+
+parser = argparse.ArgumentParser(description="Measures the memory used by "
+    + "the Node and Edge objects of a synthetic assembly graph.")
+parser.add_argument("-n", "--contigs", type=int, default=1000000,
+    help="number of contigs in the graph (default 1000000)")
+parser.add_argument("-gc", "--keepgc", action="store_true",
+    help="leave cyclic garbage collection on while building the graph"
+        + " (collate.py turns it off)")
+parser.add_argument("-t", "--tree", default=None,
+    help="graph_collator directory to import graph_core and graph_objects"
+        + " from (default: the one containing this script)")
+args = parser.parse_args()
+
+tree = args.tree
+if tree is None:
+    tree = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, tree)
+import graph_core
+import graph_objects
+
+def rss():
+    """Returns this process' current resident set size, in bytes."""
+    with open("/proc/self/status", "r") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+
+if not args.keepgc:
+    gc.disable()
+contig_count = args.contigs
+start_time = time.time()
+start_rss = rss()
+core = graph_core.GraphCore(True)
+for i in xrange(1, contig_count + 1):
+    node_id = str(i)
+    # (Varying the depths and G/C contents keeps them from being shared
+    # between nodes)
+    depth = 1.0 + (i % 97)
+    gc_content = (i % 89) / 89.0
+    n = graph_objects.Node(node_id, 1000, False, depth=depth,
+        gc_content=gc_content)
+    c = graph_objects.Node('-' + node_id, 1000, True, depth=depth,
+        gc_content=1.0 - gc_content)
+    sn = graph_objects.Node(node_id, 1000, False, depth=depth,
+        gc_content=gc_content, is_single=True)
+    core.add_node(n, c, sn)
+node_rss = rss()
+for i in xrange(1, contig_count + 1):
+    core.add_edge(str(i), str(i % contig_count + 1), multiplicity=i % 50)
+core.finalize()
+edge_count = 0
+for n in core.nodes:
+    edge_count += len(n.outgoing_edge_objects)
+edge_rss = rss()
+build_time = time.time() - start_time
+gc.enable()
+
+node_count = 3 * contig_count
+print "Contigs: %d (%d Node objects, %d Edge objects)" % (contig_count,
+    node_count, edge_count)
+print "Bytes per Node: %d" % ((node_rss - start_rss) / node_count)
+print "Bytes per Edge: %d" % ((edge_rss - node_rss) / edge_count)
+print "Time to build the graph: %.1f s (cyclic GC %s)" % (build_time,
+    "on" if args.keepgc else "off")
@@ -29,31 +29,38 @@
 import argparse
 # For flushing the output
 from sys import stdout
-# For running the C++ spqr script binary
-from subprocess import check_output, STDOUT
 # For laying out graphs using Graphviz (in particular, via the dot and sfdp
 # layout tools)
 import pygraphviz
 # For creating the output directory, and for file I/O
 import os
-# For parsing certain filenames easily
-import re
 # For calculating quartiles, etc. for edge weight outlier detection
 import numpy
-# For checking I/O errors
-import errno
-# For interfacing with SQLite
-import sqlite3
+# For removing the temporary output .db file if something goes wrong
+import atexit
 # For benchmarking
 import time
+# For laying out connected components in parallel (see the -j option)
+import multiprocessing
+# For pausing cyclic garbage collection while building the assembly graph
+import gc
 
 import graph_objects
+import graph_core
+import db_writer
+import input_files
+import parsers
+import parse_cache
+import pattern_detectors
+import spqr_stream
+import sequence_utils
 import config
 
 # Get argument information
 parser = argparse.ArgumentParser(description=config.COLLATE_DESCRIPTION)
 parser.add_argument("-i", "--inputfile", required=True,
-    help="input assembly graph filename (LastGraph, GFA, or Bambus 3 GML)")
+    help="input assembly graph filename (LastGraph, GFA, or Bambus 3 GML;" + \
+        " can be compressed with gzip, bzip2, or xz)")
 parser.add_argument("-o", "--outputprefix", required=True,
     help="output file prefix for .db and .xdot/.gv files")
 parser.add_argument("-d", "--outputdirectory", required=False,
@@ -68,10 +75,6 @@ parser.add_argument("-px", "--preservexdot", required=False, default=False,
         help="save all .xdot files generated for connected components")
 parser.add_argument("-w", "--overwrite", required=False, default=False,
         action="store_true", help="overwrite output (.db/.gv/.xdot) files")
-parser.add_argument("-b", "--bicomponentsfile", required=False,
-    help="file containing bicomponent information for the assembly graph" + \
-        " (will be generated using the SPQR script in the output directory" + \
-        " if not passed)")
 parser.add_argument("-au", "--assumeunoriented", required=False, default=False,
         action="store_true", help="assume that input GML-file graphs are" + \
             " unoriented (default for GML files is assuming they are" + \
@@ -80,6 +83,36 @@ parser.add_argument("-ao", "--assumeoriented", required=False, default=False,
         action="store_true", help="assume that input LastGraph-/GFA-file" + \
             " graphs are oriented (default for LastGraph/GFA files is" + \
             " assuming they are unoriented); this option is unfinished")
+parser.add_argument("-j", "--jobs", required=False, default=1, type=int,
+        help="number of processes to use when parsing the input file and" + \
+            " when laying out the connected components of the standard" + \
+            " mode view of the graph; defaults to 1")
+parser.add_argument("-c", "--cachedirectory", required=False,
+        help="directory in which to cache snapshots of parsed input files," + \
+            " so that running this script on the same input file again" + \
+            " doesn't require parsing it again; by default, no snapshots" + \
+            " are cached")
+parser.add_argument("-cs", "--cachesize", required=False, type=int,
+        default=config.CACHE_SIZE_MB,
+        help="maximum total size (in MiB) of the snapshots in the cache" + \
+            " directory; the least recently used snapshots are removed" + \
+            " once this is exceeded; defaults to %d" % (config.CACHE_SIZE_MB))
+parser.add_argument("-sq", "--storesequences", required=False, default=False,
+        action="store_true", help="store the DNA sequences of nodes in the" + \
+            " .db file, so that they can be exported from the viewer" + \
+            " interface (only for LastGraph/GFA files)")
+parser.add_argument("-s", "--sequences", required=False,
+        help="FASTA file (optionally compressed) containing the DNA" + \
+            " sequences of nodes that the input file doesn't include" + \
+            " sequences for (e.g. GML files, or GFA files with segments" + \
+            " of *), used to compute the G/C content of these nodes")
+parser.add_argument("-pp", "--patternprecedence", required=False,
+        default=",".join(config.PATTERN_PRECEDENCE),
+        help="comma-separated list of the patterns to collapse nodes into," + \
+            " in order of precedence (patterns not listed aren't looked" + \
+            " for); can include %s; defaults to %s" % (", ".join(
+            d.name for d in pattern_detectors.DETECTORS),
+            ",".join(config.PATTERN_PRECEDENCE)))
 args = parser.parse_args()
 asm_fn = args.inputfile
 output_fn = args.outputprefix
@@ -88,9 +121,21 @@ dir_fn = args.outputdirectory
 preserve_gv = args.preservegv
 preserve_xdot = args.preservexdot
 overwrite = args.overwrite
-bicmps_fullfn = args.bicomponentsfile
 assume_unoriented = args.assumeunoriented
 assume_oriented = args.assumeoriented
+jobs = args.jobs
+if jobs < 1:
+    raise ValueError, config.ARG_ERR + config.JOBS_ERR
+cache_dir = args.cachedirectory
+cache_size = args.cachesize
+if cache_size < 0:
+    raise ValueError, config.ARG_ERR + config.CACHE_SIZE_ERR
+store_sequences = args.storesequences
+sequences_fn = args.sequences
+# An empty -pp means that no patterns are looked for
+pattern_names = [name.strip() for name in args.patternprecedence.split(",")
+    if name.strip() != ""]
+detector_classes = pattern_detectors.get_detector_classes(pattern_names)
 
 try:
     os.makedirs(dir_fn)
@@ -139,115 +184,18 @@ def check_file_existence(filepath):
         return True
     return False
 
-def safe_file_remove(filepath):
-    """Safely (preventing race conditions of the file already being removed)
-       removes a file located at the given file path.
-    """
-    try:
-        os.remove(filepath)
-    except OSError as error:
-        if error.errno == errno.ENOENT:
-            # Something removed the file before we could. That's alright.
-            pass
-        else:
-            # Something strange happened -- maybe someone changed the file
-            # to a directory, or something similarly odd. Raise the original
-            # error to inform the user.
-            raise
-
 # Right off the bat, check if the .db file name causes an error somehow.
 # (See check_file_existence() for possible causes.)
 # This prevents us from doing a lot of work and then realizing that due to the
 # nature of the .db file name we can't continue.
-# Yeah, there is technically a race condition here where the user/some process
-# could create a file with the same .db name in between us checking for its
-# existence here/etc. and us actually connecting to the .db file using SQLite.
-# However, as is detailed below, that doesn't really matter -- SQLite will
-# handle that condition suitably.
+# If the user asked to overwrite an existing .db file via -w, we leave that
+# file alone for now: the new .db file is built in a temporary file and only
+# replaces the existing one once it's been completely written (see
+# db_writer.DatabaseWriter). The same goes for the race condition where a file
+# with the same .db name is created in between this check and the end of this
+# script -- DatabaseWriter.finish() won't replace it unless -w is set.
 db_fullfn = os.path.join(dir_fn, db_fn)
-if check_file_existence(db_fullfn):
-    # The user asked to overwrite this database via -w, so remove it
-    safe_file_remove(db_fullfn)
-
-def dfs(n):
-    """Recursively runs depth-first search, starting at node n.
-       Returns a list of all nodes found that corresponds to a list of all
-       nodes within the entire connected component (ignoring edge
-       directionality) in which n resides.
-       
-       This assumes that the connected component containing n has not had this
-       method run on it before (due to its reliance on the .seen_in_dfs Node
-       property).
-
-       (In identifying a connected component, the graph is treated as if
-       its edges are undirected, so the actual starting node within a
-       connected component should not make a difference on the connected
-       component node list returned.)
-
-       I modified this function to not use recursion since Python isn't
-       super great at that -- this allows us to avoid hitting the maximum
-       recursion depth, which would cause us to get a RuntimeError for
-       really large connected components.
-    """
-    nodes_to_check = [n]
-    nodes_in_ccomponent = []
-    # len() of a list in python is a constant-time operation, so this is okay--
-    while len(nodes_to_check) > 0:
-        # We rely on the invariant that all nodes in nodes_to_check have
-        # seen_in_dfs = False, and that no duplicate nodes exist within
-        # nodes_to_check
-        j = nodes_to_check.pop()
-        j.seen_in_dfs = True
-        nodes_in_ccomponent.append(j)
-        tentative_nodes = j.outgoing_nodes + j.incoming_nodes
-        # Only travel to unvisited and not already-marked-to-visit neighbor
-        # nodes of j
-        for m in tentative_nodes:
-            if not m.seen_in_dfs and not m.in_nodes_to_check:
-                # in_nodes_to_check prevents duplicate nodes in that list
-                m.in_nodes_to_check = True
-                nodes_to_check.append(m)
-    return nodes_in_ccomponent
-
-def reverse_complement(dna_string):
-    """Returns the reverse complement of a string of DNA.
-   
-       e.g. reverse_complement("GCATATA") == "TATATGC"
-   
-       This is used when getting data from GFA files (which only include
-       positive DNA sequence information).
-       
-       Note that this will break on invalid DNA input (so inputs like RNA
-       or protein sequences, or sequences that contain spaces, will cause
-       this to fail).
-    """
-    rc = ""
-    dna_last_char_index = len(dna_string) - 1
-    for nt in range(dna_last_char_index, -1, -1):
-        rc += config.COMPLEMENT[dna_string[nt]] 
-    return rc
-
-def gc_content(dna_string):
-    """Returns the GC content (as a float in the range [0, 1]) of a string of
-       DNA, in a 2-tuple with the second element of the tuple being the
-       actual number of Gs and Cs in the dna_string.
-       
-       Assumes that the string of DNA only contains nucleotides (e.g., it
-       doesn't contain any spaces).
-
-       For reference, the GC content of a DNA sequence is the percentage of
-       nucleotides within the sequence that are either G (guanine) or C
-       (cytosine).
-
-       e.g. gc_content("GCATTCAC") == (0.5, 4)
-    """
-    # len() of a str is a constant-time operation in Python
-    seq_len = len(dna_string)
-    gc_ct = 0
-    for nt in dna_string:
-        if nt == 'G' or nt == 'C':
-            gc_ct += 1
-    return (float(gc_ct) / seq_len), gc_ct
+check_file_existence(db_fullfn)
 
 def assembly_gc(gc_ct, total_bp):
     """Returns the G/C content of an assembly, where total_bp is the number of
@@ -259,16 +207,6 @@ def assembly_gc(gc_ct, total_bp):
     else:
         return float(gc_ct) / (2 * total_bp)
 
-def negate_node_id(id_string):
-    """Negates a node ID.
-    
-       e.g. "-18" -> "18", "18" -> "-18"
-    """
-    if id_string[0] == '-':
-        return id_string[1:]
-    else:
-        return '-' + id_string
-
 def n50(node_lengths):
     """Determines the N50 statistic of an assembly, given its node lengths.
 
@@ -301,12 +239,13 @@ def save_aux_file(aux_filename, source, layout_msg_printed, warnings=True):
     """Given a filename and a source of "input" for the file, writes to that
        file (using check_file_existence() accordingly).
 
-       If aux_filename ends with ".xdot", we assume that source is a
-       pygraphviz.AGraph object of which we will write its "drawn" xdot output
-       to the file.
+       If source is a pygraphviz.AGraph object, we write its "drawn" xdot
+       output to the file. (aux_filename should end with ".xdot" in this
+       case.)
 
-       Otherwise, we assume that source is just a string of text to write
-       to the file.
+       Otherwise, we assume that source is either a string of text to write
+       to the file, or an iterable (e.g. a generator) of strings to write to
+       the file one after another.
 
        If check_file_existence() gives us an error (or if os.open() gives
        us an error due to the flags we've used), we don't save the
@@ -338,10 +277,12 @@ def save_aux_file(aux_filename, source, layout_msg_printed, warnings=True):
         # to ensure some degree of atomicity in our file operations here,
         # preventing errors whenever possible
         with os.fdopen(os.open(fullfn, flags, config.AUXMOD), 'w') as file_obj:
-            if aux_filename.endswith(".xdot"):
+            if isinstance(source, pygraphviz.AGraph):
                 file_obj.write(source.draw(format="xdot"))
-            else:
+            elif isinstance(source, basestring):
                 file_obj.write(source)
+            else:
+                file_obj.writelines(source)
         return True
     except (IOError, OSError) as e:
         # An IOError indicates check_file_existence failed, and (far less
@@ -409,11 +350,9 @@ clusterid2obj = {}
 # Like nodeid2obj but for "single" Nodes, to be used in the SPQR-integrated
 # graph
 singlenodeid2obj = {}
-# List of 2-tuples, where each 2-tuple contains two node IDs
-# For GML files this will just contain all the normal connections in the graph
-# For LastGraph/GFA files, though, this will contain half of the connections
-# in the graph, due to no edges being "implied"
-single_graph_edges = []
+# The structure of the graph, with nodes stored as integer indices (see
+# graph_core.py). This is created once we know the assembly graph's filetype.
+core = None
 
 # Pertinent Assembly-wide information we use 
 graph_filetype = ""
@@ -445,367 +384,177 @@ total_bicomponent_count = 0
 #    attribute will result in edge_weights_available being set to False.
 # -All GFA files do not contain edge multiplicity values
 edge_weights_available = True
-# List of all the node lengths in the assembly. Used when calculating n50.
-bp_length_list = []
+# Set to True if we store any sequences in the .db file (see -sq)
+sequences_given = False
+# Set to True if the assembly graph file contains read tracking information
+# (i.e. NR sections in LastGraph files)
+read_counts_given = False
+
+operation_msg(config.DB_INIT_MSG + "%s..." % (db_fn))
+# We create the output file -- a SQLite database in which we store
+# biological and graph layout information, which will be opened in the
+# Javascript graph viewer -- before parsing the assembly graph file, so that
+# nodes' sequences can be written to it while parsing (see -sq) instead of
+# being held in memory. Everything else is written to it once we've done all
+# our processing on the assembly graph.
+# (See db_writer.py for the database's schema.)
+db = db_writer.DatabaseWriter(db_fullfn, overwrite)
+# If this script crashes before the database has been completely written,
+# remove the temporary file the database is being written to
+atexit.register(db.discard)
+conclude_msg()
 
 # Below "with" block parses the assembly file.
 # Please consult the README for the most accurate list of assembly graph
-# filetypes supported.
+# filetypes supported. The parsers for these filetypes are defined in
+# parsers.py; here, we just build the assembly graph from the node and edge
+# records they generate.
 operation_msg(config.READ_FILE_MSG + "%s..." % (os.path.basename(asm_fn)))
-with open(asm_fn, 'r') as assembly_file:
-    # We don't really care about case in file extensions
-    lowercase_asm_fn = asm_fn.lower()
-    parsing_LastGraph = lowercase_asm_fn.endswith(config.LASTGRAPH_SUFFIX)
-    parsing_GML       = lowercase_asm_fn.endswith(config.GRAPHML_SUFFIX)
-    parsing_GFA       = lowercase_asm_fn.endswith(config.GFA_SUFFIX)
-    if parsing_LastGraph:
-        graph_filetype = "LastGraph"
-        dna_given = True
-        # TODO -- Should we account for SEQ/NR information here?
-        curr_node_id = ""
-        curr_node_bp = 1
-        curr_node_depth = 1
-        curr_node_dnafwd = None
-        curr_node_dnarev = None
-        curr_node_gcfwd = None
-        curr_node_gcrev = None
-        parsing_node = False
-        parsed_fwdseq = False
-        for line in assembly_file:
-            if line[:4] == "NODE":
-                parsing_node = True
-                l = line.split()
-                curr_node_id = l[1]
-                curr_node_bp = int(l[2])
-                # depth = $O_COV_SHORT1 / $COV_SHORT1 (bp)
-                curr_node_depth = float(l[3]) / curr_node_bp
-            elif line[:3] == "ARC":
-                # ARC information is only stored on one line -- makes things
-                # simple for us
-                a = line.split()
-                # Per the Velvet docs: "This one line implicitly represents
-                # an arc from node A to B and another, with same
-                # multiplicity, from -B to -A."
-                # (http://computing.bio.cam.ac.uk/local/doc/velvet.pdf)
-                id1 = a[1]
-                id2 = a[2]
-                nid2 = negate_node_id(id2)
-                nid1 = negate_node_id(id1)
-                mult = int(a[3])
-                nodeid2obj[id1].add_outgoing_edge(nodeid2obj[id2],
-                        multiplicity=mult)
-                pid1 = id1[1:] if id1[0] == '-' else id1
-                pid2 = id2[1:] if id2[0] == '-' else id2
-                single_graph_edges.append((pid1, pid2))
-                singlenodeid2obj[pid1].add_outgoing_edge(singlenodeid2obj[pid2])
-                # Only add implied edge if the edge does not imply itself
-                # (see issue #105 on GitHub for context)
-                if not (id1 == nid2 and id2 == nid1):
-                    nodeid2obj[nid2].add_outgoing_edge(nodeid2obj[nid1],
-                            multiplicity=mult)
-                    # Use total_all_edge_count to keep track of self-implying
-                    # edges' impact on the assembly; is used in viewer tool
-                    total_all_edge_count += 1
-                total_all_edge_count += 1
-                # Record this edge for graph statistics
-                total_edge_count += 1
-            elif parsing_node:
-                # If we're in the middle of parsing a node's info and
-                # the current line doesn't match either a NODE or ARC
-                # declaration, then it refers to the node's DNA sequence.
-                # It can either refer to the forward or reverse sequence -- in
-                # LastGraph files, the forward sequence occurs first.
-                if parsed_fwdseq:
-                    # Parsing reverse sequence
-                    curr_node_dnarev = line.strip()
-                    curr_node_gcrev, gc_ct = gc_content(curr_node_dnarev)
-                    total_gc_nt_count += gc_ct
-                    curr_node_dnarev = None
-                    # In any case, now that we've parsed both the forward and
-                    # reverse sequences for the node's DNA (or ignored the
-                    # sequences, if the user passed the -nodna flag), we are
-                    # done getting data for this node -- so we can create new
-                    # Node objects to be added to the .db file and used in the
-                    # graph layout.
-                    n = graph_objects.Node(curr_node_id, curr_node_bp, False,
-                            depth=curr_node_depth, gc_content=curr_node_gcfwd)
-                    c = graph_objects.Node('-' + curr_node_id,
-                            curr_node_bp, True, depth=curr_node_depth,
-                            gc_content=curr_node_gcrev)
-                    add_node_to_stdmode_mapping(n, c)
-                    # Create single Node object, for the SPQR-integrated graph
-                    sn = graph_objects.Node(curr_node_id, curr_node_bp, False,
-                            depth=curr_node_depth, gc_content=curr_node_gcfwd,
-                            is_single=True)
-                    singlenodeid2obj[curr_node_id] = sn
-                    # Record this node for graph statistics
-                    # Note that recording these statistics here ensures that
-                    # only "fully complete" node definitions are recorded.
-                    total_node_count += 1
-                    total_length += curr_node_bp
-                    bp_length_list.append(curr_node_bp)
-                    bp_length_list.append(curr_node_bp)
-                    # Clear temporary/marker variables for later use
-                    curr_node_id = ""
-                    curr_node_bp = 1
-                    curr_node_dnafwd = None
-                    curr_node_dnarev = None
-                    curr_node_gcfwd = None
-                    curr_node_gcrev = None
-                    parsing_node = False
-                    parsed_fwdseq = False
-                else:
-                    # Parsing forward sequence (It's actually offset by a
-                    # number of bp, so we should probably mention that in
-                    # README or even in the Javascript graph viewer)
-                    parsed_fwdseq = True
-                    curr_node_dnafwd = line.strip()
-                    curr_node_gcfwd, gc_ct = gc_content(curr_node_dnafwd)
-                    total_gc_nt_count += gc_ct
-                    curr_node_dnafwd = None
-    elif parsing_GML:
-        graph_filetype = "GML"
-        dna_given = False
-        distinct_single_graph = False
-        # Since GML files don't contain DNA
+# Python's cyclic garbage collector is run every time enough objects have
+# been allocated, and each full collection traverses every object created so
+# far -- so creating millions of Node/Edge objects would trigger many
+# increasingly slow collections, none of which would find any garbage. So we
+# turn it off until we're done building the graph.
+gc.disable()
+# (Compressed files are decompressed on the fly; see input_files.py.)
+with input_files.AssemblyFile(asm_fn) as assembly_file:
+    asm_parser = parsers.get_parser(assembly_file, jobs, store_sequences)
+    if cache_dir != None:
+        asm_cache = parse_cache.ParseCache(cache_dir, cache_size * 1048576)
+        # Don't leave a partially written snapshot in the cache if something
+        # goes wrong before all of the records have been read
+        atexit.register(asm_cache.discard)
+        asm_records = asm_cache.records(asm_fn, asm_parser)
+    else:
+        asm_records = asm_parser.records()
+    graph_filetype = asm_parser.filetype
+    double_stranded = asm_parser.double_stranded
+    # For double-stranded filetypes (LastGraph and GFA), the single graph
+    # (used for the SPQR-integrated view) is distinct from the graph shown in
+    # the standard mode view
+    distinct_single_graph = double_stranded
+    core = graph_core.GraphCore(double_stranded)
+    # Assume initially that DNA is given. If we encounter any contigs where
+    # DNA is not given, then set this to False.
+    dna_given = asm_parser.dna_given
+    if not dna_given:
         total_gc_nt_count = None
-        # Record state -- parsing node or parsing edge?
-        # (This is kind of a lazy approach, but to be fair it's actually
-        # sort of efficient)
-        # We assume that each declaration occurs on its own line.
-        parsing_node = False
-        curr_node_id = None
-        curr_node_bp = 0
-        curr_node_orientation = None
-        curr_node_is_repeat = None
-        parsing_edge = False
-        curr_edge_src_id = None
-        curr_edge_tgt_id = None
-        curr_edge_orientation = None
-        curr_edge_mean = None
-        curr_edge_stdev = None
-        curr_edge_bundlesize = None
-        for line in assembly_file:
-            # Record node attributes/detect end of node declaration
-            if parsing_node:
-                if line.strip().startswith("id"):
-                    l = line.split()
-                    curr_node_id = l[1]
-                if line.strip().startswith("label"):
-                    l = line.split()
-                    curr_node_label = l[1].strip("\"")
-                    if curr_node_label.startswith("NODE_"):
-                        label_parts = curr_node_label.split("_")
-                        curr_node_label = "NODE_" + label_parts[1]
-                elif line.strip().startswith("orientation"):
-                    l = line.split()
-                    curr_node_orientation = l[1] # either "FOW" or "REV"
-                elif line.strip().startswith("length"):
-                    # fetch value from length attribute
-                    l = line.split()
-                    curr_node_bp = int(l[1].strip("\""))
-                elif line.strip().startswith("repeat"):
-                    l = line.split()
-                    curr_node_is_repeat = int(l[1])
-                elif line.endswith("]\n"):
-                    # TODO pass the repeat value via optional arg to Node()
-                    # Then store the repeat thing in db_values, modifying the
-                    # corresponding database construction thing for nodes also
-                    # then in the viewer application in renderNodeObject()
-                    # if the node has repeat === 1 then we can assign its
-                    # repeatColor as the 100% color, and else we can assign its
-                    # repeatColor as the 0% color. Then adding colorization
-                    # stuff should just be a function of modifying the GC
-                    # content stuff
-                    # Also the detection of a single node where
-                    # curr_node_is_repeat != None should result in a
-                    # REPEAT_INFO_AVAILABLE var or something getting set to
-                    # true, which should then be stored in the assembly table
-                    # in the database. we'll use that in the viewer JS.
-                    n = graph_objects.Node(curr_node_id, curr_node_bp,
-                            (curr_node_orientation == '"REV"'),
-                            label=curr_node_label,
-                            is_repeat=curr_node_is_repeat)
-                    add_node_to_stdmode_mapping(n)
-                    # Create single Node object, for the SPQR-integrated graph
-                    sn = graph_objects.Node(curr_node_id, curr_node_bp, False,
-                            label=curr_node_label, is_single=True,
-                            is_repeat=curr_node_is_repeat)
-                    singlenodeid2obj[curr_node_id] = sn
-                    # Record this node for graph statistics
-                    total_node_count += 1
-                    total_length += curr_node_bp
-                    bp_length_list.append(curr_node_bp)
-                    if curr_node_is_repeat != None:
-                        repeats_given = True
-                    # Clear tmp/marker variables
-                    parsing_node = False
-                    curr_node_id = None
-                    curr_node_bp = 0
-                    curr_node_orientation = None
-                    curr_node_is_repeat = None
-            elif parsing_edge:
-                if line.strip().startswith("source"):
-                    l = line.split()
-                    curr_edge_src_id = l[1]
-                elif line.strip().startswith("target"):
-                    l = line.split()
-                    curr_edge_tgt_id = l[1]
-                elif line.strip().startswith("orientation"):
-                    l = line.split()
-                    curr_edge_orientation = l[1].strip('"')
-                elif line.strip().startswith("bsize"):
-                    l = line.split()
-                    curr_edge_bundlesize = int(l[1].strip('"'))
-                elif line.strip().startswith("mean"):
-                    l = line.split()
-                    curr_edge_mean = float(l[1].strip('"'))
-                elif line.strip().startswith("stdev"):
-                    l = line.split()
-                    curr_edge_stdev = float(l[1].strip('"'))
-                elif line.endswith("]\n"):
-                    nodeid2obj[curr_edge_src_id].add_outgoing_edge(
-                            nodeid2obj[curr_edge_tgt_id],
-                            multiplicity=curr_edge_bundlesize,
-                            orientation=curr_edge_orientation,
-                            mean=curr_edge_mean,
-                            stdev=curr_edge_stdev)
-                    #single_graph_edges.append((curr_edge_src_id, \
-                    #    curr_edge_tgt_id))
-                    singlenodeid2obj[curr_edge_src_id].add_outgoing_edge(
-                            singlenodeid2obj[curr_edge_tgt_id])
-                    total_edge_count += 1
-                    total_all_edge_count += 1
-                    if curr_edge_bundlesize == None:
-                        edge_weights_available = False
-                    # Clear tmp/marker vars
-                    parsing_edge = False
-                    curr_edge_src_id = None
-                    curr_edge_tgt_id = None
-                    curr_edge_orientation = None
-                    curr_edge_bundlesize = None
-                    curr_edge_mean = None
-                    curr_edge_stdev = None
-            # Start parsing node
-            elif line.endswith("node [\n"):
-                parsing_node = True
-            # Start parsing edge
-            elif line.endswith("edge [\n"):
-                parsing_edge = True
-    elif parsing_GFA:
-        graph_filetype = "GFA"
-        # Assume initially that DNA is given. If we encounter any contigs where
-        # DNA is not given, then set this to False.
-        dna_given = True
-        edge_weights_available = False
-        # NOTE--
-        # Currently, we only parse (S)egment and (L)ink lines in GFA files,
-        # and only take into account their "required" fields (as given on the
-        # GFA spec).
-        # TODO--
-        # We can look into parsing S+L optional fields, as well as
-        # (C)ontainment and (P)ath lines (and, more
-        # importantly, making use of this data in the AsmViz viewer) in the
-        # future, but for now having Segment + Link data should match what we
-        # have for the other two supported input assembly graph filetypes.
-        curr_node_id = None
-        curr_node_bp = None
-        curr_node_gc = None
-        curr_node_dnafwd = None
-        curr_node_dnarev = None
-        for line in assembly_file:
-            # Parsing a segment (node) line
-            if line.startswith("S"):
-                # For GFA files: given a + DNA seq, its - DNA seq is the
-                # reverse complement of that DNA seq.
-                l = line.split()
-                curr_node_id = l[1]
-                if curr_node_id.startswith("NODE_"):
-                    curr_node_id = curr_node_id.split("_")[1]
-                elif curr_node_id.startswith("tig"):
-                    curr_node_id = curr_node_id[3:]
-                # The sequence data can be optionally not given -- in this
-                # case, a single asterisk, *, will be located at l[2].
-                curr_node_dnafwd = l[2]
-                if curr_node_dnafwd != "*":
-                    curr_node_bp = len(curr_node_dnafwd)
-                    curr_node_dnarev = reverse_complement(curr_node_dnafwd)
-                    # The G/C content of a DNA sequence "m" will always equal
-                    # the G/C content of the reverse complement of m, since
-                    # a reverse complement just flips A <-> T and C <-> G --
-                    # meaning that the total count of C + G occurrences does
-                    # not change.
-                    # Hence, we just need to calculate the G/C content here
-                    # once. This is not the case for LastGraph nodes, though.
-                    curr_node_gc, gc_ct = gc_content(curr_node_dnafwd)
-                    if dna_given:
-                        # If DNA is not given for at least one contig seen thus
-                        # far, don't bother updating this further. (We'll only
-                        # display assembly GC content info in the viewer
-                        # interface if DNA was given for all contigs, not just
-                        # for some of them.)
-                        total_gc_nt_count += (2 * gc_ct)
-                else:
-                    # Allow user to not include DNA but indicate seq length via
-                    # the LN property
-                    dna_given = False
-                    curr_node_bp = None
-                    for seq_attr in l[3:]:
-                        if seq_attr.startswith("LN:i:"):
-                            curr_node_bp = int(seq_attr[5:])
-                            break
-                    if curr_node_bp == None:
-                        errmsg = config.SEQ_NOUN+curr_node_id+config.NO_DNA_ERR
-                        raise AttributeError, errmsg
-                curr_node_dnafwd = None
-                curr_node_dnarev = None
-                nPos = graph_objects.Node(curr_node_id, curr_node_bp, False,
-                        gc_content=curr_node_gc)
-                nNeg = graph_objects.Node('-' + curr_node_id, curr_node_bp,
-                        True,gc_content=curr_node_gc)
-                add_node_to_stdmode_mapping(nPos, nNeg)
-                # Create single Node object, for the SPQR-integrated graph
-                sn = graph_objects.Node(curr_node_id, curr_node_bp, False,
-                        gc_content=curr_node_gc, is_single=True)
-                singlenodeid2obj[curr_node_id] = sn
-                # Update stats
-                total_node_count += 1
-                total_length += curr_node_bp
-                bp_length_list.append(curr_node_bp)
-                bp_length_list.append(curr_node_bp)
-                curr_node_id = None
-                curr_node_bp = None
-                curr_node_gc = None
-                curr_node_dnafwd = None
-                curr_node_dnarev = None
-            # Parsing a link (edge) line from some id1 to id2
-            elif line.startswith("L"):
-                a = line.split()
-                id1 = a[1]
-                id2 = a[3]
-                if id1.startswith("NODE_"): id1 = id1.split("_")[1]
-                if id2.startswith("NODE_"): id2 = id2.split("_")[1]
-                if id1.startswith("tig"): id1 = id1[3:]
-                if id2.startswith("tig"): id2 = id2[3:]
-                single_graph_edges.append((id1, id2))
-                singlenodeid2obj[id1].add_outgoing_edge(singlenodeid2obj[id2])
-                id1 = id1 if a[2] != '-' else '-' + id1
-                id2 = id2 if a[4] != '-' else '-' + id2
-                nid2 = negate_node_id(id2)
-                nid1 = negate_node_id(id1)
-                nodeid2obj[id1].add_outgoing_edge(nodeid2obj[id2])
-                # Only add implied edge if the edge does not imply itself
-                # (see issue #105 on GitHub for context)
-                if not (id1 == nid2 and id2 == nid1):
-                    nodeid2obj[nid2].add_outgoing_edge(nodeid2obj[nid1])
-                    total_all_edge_count += 1
+    for record in asm_records:
+        if type(record) == parsers.SequenceRecord:
+            # (Wrapping the packed sequence in a buffer makes sqlite3 store
+            # it as a BLOB, rather than as TEXT)
+            db.insert("sequences", (record.node_id, record.block_index,
+                record.length, buffer(record.packed), record.exceptions))
+            sequences_given = True
+        elif type(record) == parsers.ReadCountRecord:
+            read_counts_given = True
+            n = nodeid2obj[record.node_id]
+            if n.read_count == None:
+                n.read_count = 0
+            n.read_count += record.read_count
+            # Nodes in the single graph include the reads mapped to both of
+            # their orientations
+            pid = record.node_id
+            if double_stranded and pid[0] == '-':
+                pid = pid[1:]
+            sn = singlenodeid2obj[pid]
+            if sn.read_count == None:
+                sn.read_count = 0
+            sn.read_count += record.read_count
+        elif type(record) == parsers.NodeRecord:
+            if record.gc_count == None:
+                # (We'll only display assembly GC content info in the viewer
+                # interface if DNA was given for all contigs, not just for
+                # some of them -- although the missing DNA might still be
+                # given in a FASTA file, via -s)
+                dna_given = False
+            else:
+                total_gc_nt_count += record.gc_count
+            n = graph_objects.Node(record.id, record.length,
+                    record.is_reverse, depth=record.depth,
+                    gc_content=record.gc_fwd, label=record.label,
+                    is_repeat=record.is_repeat)
+            c = None
+            if double_stranded:
+                c = graph_objects.Node('-' + record.id, record.length, True,
+                        depth=record.depth, gc_content=record.gc_rev)
+            add_node_to_stdmode_mapping(n, c)
+            # Create single Node object, for the SPQR-integrated graph
+            sn = graph_objects.Node(record.id, record.length, False,
+                    depth=record.depth, gc_content=record.gc_fwd,
+                    label=record.label, is_single=True,
+                    is_repeat=record.is_repeat)
+            singlenodeid2obj[record.id] = sn
+            core.add_node(n, c, sn)
+            if record.is_repeat != None:
+                repeats_given = True
+            # Record this node for graph statistics
+            total_node_count += 1
+            total_length += record.length
+        else:
+            if record.multiplicity == None:
+                edge_weights_available = False
+            # For double-stranded filetypes, this also adds the implied edge
+            # (unless the edge implies itself)
+            if core.add_edge(record.source_id, record.target_id,
+                    record.multiplicity, record.orientation, record.mean,
+                    record.stdev):
+                # Use total_all_edge_count to keep track of self-implying
+                # edges' impact on the assembly; is used in viewer tool
                 total_all_edge_count += 1
-                # Update stats
-                total_edge_count += 1
-    else:
-        raise IOError, config.FILETYPE_ERR
+            total_all_edge_count += 1
+            # Record this edge for graph statistics
+            total_edge_count += 1
+    # Build the graph's adjacency arrays (which the Node objects in the graph
+    # get their adjacency lists and Edge objects from)
+    core.finalize()
+    if read_counts_given:
+        # Nodes without an NR section in the file just didn't have any reads
+        # mapped to them
+        for n in nodeid2obj.values() + singlenodeid2obj.values():
+            if n.read_count == None:
+                n.read_count = 0
+gc.enable()
 conclude_msg()
 
+# If a FASTA file of sequences was given, use it to compute the G/C content
+# of nodes that the assembly graph file didn't include DNA for. We only need
+# each sequence's length and G/C count, so sequences are never stored in
+# memory in their entirety (see sequence_utils.fasta_gc_counts()).
+if sequences_fn != None:
+    operation_msg(config.READ_SEQUENCES_MSG + "%s..." % \
+            (os.path.basename(sequences_fn)))
+    if total_gc_nt_count == None:
+        total_gc_nt_count = 0
+    with input_files.AssemblyFile(sequences_fn) as sequences_file:
+        for seq_name, seq_length, seq_gc_ct in \
+                sequence_utils.fasta_gc_counts(sequences_file.blocks()):
+            # Sequences' names can either be node IDs, or names that the GFA
+            # parser would convert to node IDs (e.g. "NODE_5_length_100")
+            for node_id in (seq_name, parsers.GFAParser.node_id(seq_name)):
+                if node_id in singlenodeid2obj:
+                    break
+            else:
+                continue
+            sn = singlenodeid2obj[node_id]
+            if sn.gc_content != None or seq_length == 0:
+                # The assembly graph file already included this node's DNA
+                continue
+            seq_gc = float(seq_gc_ct) / seq_length
+            sn.gc_content = seq_gc
+            n = nodeid2obj[node_id]
+            n.gc_content = seq_gc
+            core.gc_contents[n.index] = seq_gc
+            if double_stranded:
+                nodeid2obj['-' + node_id].gc_content = seq_gc
+                core.gc_contents[n.index ^ 1] = seq_gc
+            # assembly_gc() expects the number of G/C nucleotides in both
+            # strands of the assembly
+            total_gc_nt_count += 2 * seq_gc_ct
+    dna_given = all(sn.gc_content != None
+            for sn in singlenodeid2obj.itervalues())
+    conclude_msg()
+
 # TODO just a temporary measure; output the entire single graph as a .gv file
 # I guess eventually we'd lay this out using pygraphviz and store the nodes'
 # position data? But for debugging, etc. this is a nice feature to keep around
@@ -814,228 +563,61 @@ conclude_msg()
 #    for n in nodeid2obj.values():
 #        if n.id_string[0] != '-':
 #            sgraphfile.write("\t%s;\n" % (n.id_string))
-#    for e in single_graph_edges:
-#        sgraphfile.write("\t%s -- %s;\n" % (e[0], e[1]))
+#    for sn in core.single_nodes:
+#        for m in sn.outgoing_nodes:
+#            sgraphfile.write("\t%s -- %s;\n" % (sn.id_string, m.id_string))
 #    sgraphfile.write("}")
 
 # NOTE -- at this stage, the entire assembly graph file has been parsed.
 # This means that graph_filetype, total_node_count, total_edge_count,
-# total_length, and bp_length_list are all finalized.
-
-# Try to collapse special "groups" of Nodes (Bubbles, Ropes, etc.)
-# As we check nodes, we add either the individual node (if it can't be
-# collapsed) or its collapsed "group" (if it could be collapsed) to a list
-# of nodes to draw, which will later be processed and output to the .gv file.
+# total_length, and core are all finalized.
 
-# We apply "precedence" here: identify all bubbles, then frayed ropes, then
-# cycles, then chains. A TODO is making that precedence configurable; see #87
-# (and generalizing this code to get rid of redundant stuff, maybe?)
-operation_msg(config.BUBBLE_SEARCH_MSG)
 nodes_to_try_collapsing = nodeid2obj.values()
-nodes_to_draw = []
-
-# Find "standard" bubbles. Our algorithm here classifies a bubble as a set of
-# nodes with a starting node, a set of middle nodes, and ending node, where the
-# starting node has at least two outgoing paths: all of which linearly extend
-# to the ending node.
-# This ignores some types of bubbles that exhibit a more complex structure --
-# hence why we use the bicomponent bubble detection using the SPQR script.
-for n in nodes_to_try_collapsing: # Test n as the "starting" node for a bubble
-    if n.used_in_collapsing or len(n.outgoing_nodes) <= 1:
-        # If n doesn't lead to multiple nodes, it couldn't be a bubble start
-        continue
-    bubble_validity, member_nodes = graph_objects.Bubble.is_valid_bubble(n)
-    if bubble_validity:
-        # Found a bubble!
-        new_bubble = graph_objects.Bubble(*member_nodes)
-        nodes_to_draw.append(new_bubble)
-        clusterid2obj[new_bubble.id_string] = new_bubble
 
-conclude_msg()
-# Run the SPQR script, use its output to create SPQR trees and detect complex
-# bubbles
+# Run the SPQR script, and use its output to create SPQR trees
 operation_msg(config.SPQR_MSG)
 
-# Clear extraneous SPQR auxiliary files from the output directory, if present
-# (see issue #191 on the GitHub page)
-cfn_regex = re.compile("component_(\d+)\.info")
-sfn_regex = re.compile("spqr\d+\.gml")
-for fn in os.listdir(dir_fn):
-    match = cfn_regex.match(fn)
-    if match is not None:
-        c_fullfn = os.path.join(dir_fn, fn)
-        if check_file_existence(c_fullfn):
-            safe_file_remove(c_fullfn)
-    else:
-        s_match = sfn_regex.match(fn)
-        if s_match is not None:
-            s_fullfn = os.path.join(dir_fn, fn)
-            if check_file_existence(s_fullfn):
-                safe_file_remove(s_fullfn)
-
-# Construct links file for the single graph
-# (this is unnecessary for Bambus 3 GML files, but for LastGraph/GFA files it's
-# needed in order to generate the SPQR tree)
-s_edges_fullfn = None
+# Stream the edges of the graph that SPQR trees are generated for to the SPQR
+# script, and build each bicomponent's SPQR tree as soon as the script has
+# output it (see spqr_stream.py; older builds of the script that can't do this
+# are run on files in a temporary directory instead). If the input graph has a
+# distinct single graph (i.e. it has unoriented contigs, like Velvet LastGraph
+# or GFA files) then the SPQR trees are generated for the single graph;
+# otherwise they're generated for the double graph (e.g. for Bambus 3 GML
+# files, which have oriented contigs).
 if distinct_single_graph:
-    s_edges_fn = output_fn + "_single_links"
-    s_edges_fn_text = ""
-    for e in single_graph_edges:
-        # (the other values we add are just dummy values -- they don't impact
-        # the biconnected components/SPQR trees that we obtain from the script)
-        line = e[0] + "\tB\t" + e[1] + "\tB\t0\t0\t0\n"
-        s_edges_fn_text += line
-    save_aux_file(s_edges_fn, s_edges_fn_text, False, warnings=False)
-    s_edges_fullfn = os.path.join(dir_fn, s_edges_fn)
-
-# Prepare non-single-graph _links file
-# (unnecessary for the case where -b is passed and the input graph has a
-# distinct single graph)
-edges_fullfn = None
-if bicmps_fullfn == None or not distinct_single_graph:
-    edges_fn = output_fn + "_links"
-    edges_fn_text = ""
-    for n in nodes_to_try_collapsing:
-        for e in n.outgoing_nodes:
-            line = n.id_string + "\tB\t" + e.id_string + "\tB\t0\t0\t0\n"
-            edges_fn_text += line
-    save_aux_file(edges_fn, edges_fn_text, False, warnings=False)
-    edges_fullfn = os.path.join(dir_fn, edges_fn)
+    # The single graph is a view of the double graph, so its edges are
+    # generated from the double graph's arrays as they're written
+    links_chunks = core.links_chunks(core.single,
+        [n.id_string for n in core.single_nodes])
+else:
+    links_chunks = core.links_chunks(core.double,
+        [n.id_string for n in core.nodes],
+        [n.index for n in nodes_to_try_collapsing])
 
 # Get the location of the spqr script -- it should be in the same dir as
 # collate.py, i.e. the currently running python script
 #
-# NOTE: Some of the spqr script's output is sent to stderr, so when we run the
-# script we merge that with the output. Note that we don't really check the
-# output of this, although we could if the need arises -- the main purpose
-# of using check_output() here is to catch all the printed output of the
-# spqr script.
-#
 # TODO: will need to change some script miscellany to work in non-Unix envs.
 spqr_fullfn = os.path.join(os.path.dirname(os.path.realpath(__file__)),
     "spqr")
-spqr_invocation = []
-if bicmps_fullfn != None:
-    # -b has been passed: we already have the file indicating separation pairs
-    # This means we only need to call the script once, to output the SPQR tree
-    if not distinct_single_graph:
-        # Input file has oriented contigs (e.g. Bambus 3 GML output)
-        # Call script once with -t and the normal links file
-        spqr_invocation = [spqr_fullfn, "-l", edges_fullfn, "-t",
-            "-d", dir_fn]
-    else:
-        # Input file has unoriented contigs (e.g. Velvet LastGraph output)
-        # Call script once with -t and the single links file
-        spqr_invocation = [spqr_fullfn, "-l", s_edges_fullfn, "-t",
-            "-d", dir_fn]
-else:
-    # -b has not been passed: we need to call the SPQR script to generate the
-    # separation pairs file
-    # Detect (and remove) a file with a conflicting name, if present
-    bicmps_fn = output_fn + "_bicmps"
-    bicmps_fullfn = os.path.join(dir_fn, bicmps_fn)
-    if check_file_existence(bicmps_fullfn):
-        safe_file_remove(bicmps_fullfn)
-
-    if not distinct_single_graph:
-        # Input file has oriented contigs
-        # Call script once with -s and -t, and the normal links file
-        spqr_invocation = [spqr_fullfn, "-l", edges_fullfn, "-t",
-            "-s", "-o", bicmps_fn, "-d", dir_fn]
-    else:
-        # Input files has unoriented contigs
-        # Call script twice: once with -s and the normal links file, and once
-        # with -t and the single links file
-        spqr_invocation = [spqr_fullfn, "-l", edges_fullfn,
-            "-s", "-o", bicmps_fn, "-d", dir_fn]
-        spqr_invocation_2 = [spqr_fullfn, "-l", s_edges_fullfn, "-t",
-            "-d", dir_fn]
-        check_output(spqr_invocation_2, stderr=STDOUT)
-check_output(spqr_invocation, stderr=STDOUT)
-
-# NOTE we make the assumption that the generated component and spqr files
-# aren't deleted after running the SPQR script but before they're read here.
-# If they are for whatever reason, then this script will fail to recognize
-# the corresponding biconnected component information (thus failing to draw
-# a SPQR tree, and likely causing an error of some sort when creating the
-# .db file).
-#
-# (As with the potential case where the separation pairs file is deleted after
-# being generated but before being read, this falls under the scope of
-# "silly race conditions that probably won't ever happen but are still
-# ostensibly possible".)
+spqr_process = spqr_stream.SPQRProcess(spqr_fullfn, links_chunks)
+# Stop the script (and remove its temporary directory) if something goes
+# wrong before all of its output has been read
+atexit.register(spqr_process.close)
 
-conclude_msg()
-operation_msg(config.SPQR_LAYOUT_MSG)
-# Identify the component_*.info files representing the SPQR tree's composition
-bicomponentid2fn = {}
-for fn in os.listdir(dir_fn):
-    match = cfn_regex.match(fn)
-    if match is not None:
-        c_fullfn = os.path.join(dir_fn, fn)
-        if os.path.isfile(c_fullfn):
-            bicomponentid2fn[match.group(1)] = c_fullfn
-
-# Get info from the SPQR tree auxiliary files (component_*.info and spqr*.gml)
 bicomponentid2obj = {}
-metanode_id_regex = re.compile("^\d+$")
-metanode_type_regex = re.compile("^[SPR]$")
-edge_line_regex = re.compile("^v|r")
-for cfn_id in bicomponentid2fn:
-    with open(bicomponentid2fn[cfn_id], "r") as component_info_file:
-        metanodeid2obj = {}
-        curr_id = ""
-        curr_type = ""
-        curr_nodes = []
-        curr_edges = []
-        for line in component_info_file:
-            if edge_line_regex.match(line):
-                curr_edges.append(line.split())
-            elif metanode_id_regex.match(line):
-                if curr_id != "":
-                    # save previous metanode info
-                    new_metanode = graph_objects.SPQRMetaNode(cfn_id, curr_id,
-                        curr_type, curr_nodes, curr_edges)
-                    metanodeid2obj[curr_id] = new_metanode
-                curr_id = line.strip()
-                curr_type = ""
-                curr_nodes = []
-                curr_edges = []
-            elif metanode_type_regex.match(line):
-                curr_type = line.strip()
-            else:
-                # This line must describe a node within the metanode
-                curr_nodes.append(singlenodeid2obj[line.split()[1]])
-        # Save the last metanode in the file (won't be "covered" in loop above)
-        new_metanode = graph_objects.SPQRMetaNode(cfn_id, curr_id, curr_type,
-            curr_nodes, curr_edges)
-        metanodeid2obj[curr_id] = new_metanode
+for cfn_id, metanodes, tree_edges in spqr_process.frames():
+    metanodeid2obj = {}
+    for curr_id, curr_type, node_ids, curr_edges in metanodes:
+        curr_nodes = [singlenodeid2obj[i] for i in node_ids]
+        metanodeid2obj[curr_id] = graph_objects.SPQRMetaNode(cfn_id, curr_id,
+            curr_type, curr_nodes, curr_edges)
     # At this point, we have all nodes in the entire SPQR tree for a
-    # given biconnected component saved in metanodeid2obj.
-    # For now, let's just parse the structure of this tree and lay it out using
-    # GraphViz -- will implement in the web visualization tool soon.
-    tree_structure_fn = os.path.join(dir_fn, "spqr%s.gml" % (cfn_id))
-    # List of 2-tuples of SPQRMetaNode objects.
-    with open(tree_structure_fn, "r") as spqr_structure_file:
-        parsing_edge = False
-        source_metanode = None
-        target_metanode = None
-        for line in spqr_structure_file:
-            if line.strip().startswith("edge ["):
-                parsing_edge = True
-            elif parsing_edge:
-                if line.strip().startswith("]"):
-                    parsing_edge = False
-                    # save edge data
-                    source_metanode.add_outgoing_edge(target_metanode)
-                    source_metanode = None
-                    target_metanode = None
-                else:
-                    id_line_parts = line.strip().split()
-                    if id_line_parts[0] == "source":
-                        source_metanode = metanodeid2obj[id_line_parts[1]]
-                    elif id_line_parts[0] == "target":
-                        target_metanode = metanodeid2obj[id_line_parts[1]]
+    # given biconnected component saved in metanodeid2obj. Now we just need
+    # to add the edges between these metanodes.
+    for source_id, target_id in tree_edges:
+        metanodeid2obj[source_id].add_outgoing_edge(metanodeid2obj[target_id])
     # Determine root of the bicomponent and store it as part of the bicomponent
     curr_metanode = metanodeid2obj.values()[0] 
     while len(curr_metanode.incoming_nodes) > 0:
@@ -1052,88 +634,26 @@ for cfn_id in bicomponentid2fn:
         metanode_list, curr_metanode)
     total_bicomponent_count += 1
 
-# Now that the potential bubbles have been detected by the spqr script, we
-# sort them in ascending order of size and then create Bubble objects
-# accordingly.
-conclude_msg()
-operation_msg(config.BICOMPONENT_BUBBLE_SEARCH_MSG)
-
-with open(bicmps_fullfn, "r") as potential_bubbles_file:
-    bubble_lines = potential_bubbles_file.readlines()
-# Sort the bubbles in ascending order of number of nodes contained.
-# This can be done by counting the number of tabs, since those are the
-# separators between nodes on each line: therefore, more tabs = more nodes
-bubble_lines.sort(key=lambda c: c.count("\t"))
-for b in bubble_lines:
-    bubble_nodes = b.split()
-    # The first two nodes listed on a line are the source and sink node of the
-    # biconnected component; they're listed later on the line, so we ignore
-    # them when actually drawing the bubble.
-    bubble_line_node_ids = bubble_nodes[2:]
-
-    # As a heuristic, we disallow complex bubbles of node size > 10. This is to
-    # prevent bubbles being detected that are so complex that they "aren't
-    # really bubbles."
-    if len(bubble_line_node_ids) > 10:
-        # We can just break here, since the bubble lines are sorted in
-        # ascending order of size
-        break
-
-    # Validate this "separation pair" as a source-sink pair (i.e. an actual
-    # bubble). If validation fails, move on.
-    bubble_node_objects = [nodeid2obj[k] for k in bubble_nodes]
-    if not graph_objects.Bubble.is_valid_source_sink_pair(bubble_node_objects):
-        continue
-    curr_bubble_nodeobjs = []
-    for node_id in bubble_line_node_ids:
-        try:
-            curr_bubble_nodeobjs.append(nodeid2obj[node_id])
-        except KeyError, e:
-            raise KeyError, "Bicomponents file %s contains invalid node %s" % \
-                (bicmps_fullfn, e)
-    new_bubble = graph_objects.Bubble(*curr_bubble_nodeobjs)
-    nodes_to_draw.append(new_bubble)
-    clusterid2obj[new_bubble.id_string] = new_bubble
-
-conclude_msg()
-operation_msg(config.FRAYEDROPE_SEARCH_MSG)
-for n in nodes_to_try_collapsing: # Test n as the "starting" node for a rope
-    if n.used_in_collapsing or len(n.outgoing_nodes) != 1:
-        # If n doesn't lead to a single node, it couldn't be a rope start
-        continue
-    rope_validity, member_nodes = graph_objects.Rope.is_valid_rope(n)
-    if rope_validity:
-        # Found a frayed rope!
-        new_rope = graph_objects.Rope(*member_nodes)
-        nodes_to_draw.append(new_rope)
-        clusterid2obj[new_rope.id_string] = new_rope
-
 conclude_msg()
-operation_msg(config.CYCLE_SEARCH_MSG)
-for n in nodes_to_try_collapsing: # Test n as the "starting" node for a cycle
-    if n.used_in_collapsing:
-        continue
-    cycle_validity, member_nodes = graph_objects.Cycle.is_valid_cycle(n)
-    if cycle_validity:
-        # Found a cycle!
-        new_cycle = graph_objects.Cycle(*member_nodes)
-        nodes_to_draw.append(new_cycle)
-        clusterid2obj[new_cycle.id_string] = new_cycle
+# Try to collapse special "groups" of Nodes (Bubbles, Ropes, etc.)
+# As we check nodes, we add either the individual node (if it can't be
+# collapsed) or its collapsed "group" (if it could be collapsed) to a list
+# of nodes to draw, which will later be processed and output to the .gv file.
 
-conclude_msg()
-operation_msg(config.CHAIN_SEARCH_MSG)
-for n in nodes_to_try_collapsing: # Test n as the "starting" node for a chain
-    if n.used_in_collapsing or len(n.outgoing_nodes) != 1:
-        # If n doesn't lead to a single node, it couldn't be a chain start
-        continue
-    chain_validity, member_nodes = graph_objects.Chain.is_valid_chain(n)
-    if chain_validity:
-        # Found a chain!
-        new_chain = graph_objects.Chain(*member_nodes)
-        nodes_to_draw.append(new_chain)
-        clusterid2obj[new_chain.id_string] = new_chain
+# We apply "precedence" here: each kind of pattern is looked for in the order
+# given by -pp (see pattern_detectors.py), which by default is bubbles, then
+# superbubbles, then frayed ropes, then cycles, then chains.
+nodes_to_draw = []
+detectors = [d(nodeid2obj) for d in detector_classes]
+for detector in detectors:
+    operation_msg(detector.message)
+    for group in detector.timed_run(nodes_to_try_collapsing):
+        nodes_to_draw.append(group)
+        clusterid2obj[group.id_string] = group
+    conclude_msg()
+for detector in detectors:
+    print detector.report()
 
-conclude_msg()
 # Add individual (not used in collapsing) nodes to the nodes_to_draw list
 # We could build this list up at the start and then gradually remove nodes as
 # we use nodes in collapsing, but remove() is an O(n) operation so that'd make
@@ -1144,61 +664,38 @@ for n in nodes_to_try_collapsing:
         nodes_to_draw.append(n)
 
 # Identify connected components in the "single" graph
-# We'll need to actually run DFS if distinct_single_graph is True.
-# However, if it's False, then we can just run DFS on the "double" graph to
-# identify its connected components -- and then use those connected components'
-# nodes' IDs to construct the single graph's connected components.
+# Both graphs' connected components were found while parsing the assembly
+# graph file (see graph_core.DisjointSets), so here we just gather the node
+# groups/bicomponents in each component.
+# If distinct_single_graph is False, then the single graph's connected
+# components are constructed from the double graph's connected components.
 operation_msg(config.COMPONENT_MSG)
 single_connected_components = []
 if distinct_single_graph:
-    for n in singlenodeid2obj.values():
-        if not n.seen_in_ccomponent:
-            # We've identified a node within an unseen connected component.
-            # Run DFS to identify all nodes in its connected component.
-            # (Also identify all bicomponents in the connected component)
-            node_list = dfs(n)
-            bicomponent_set = set()
-            for m in node_list:
-                m.seen_in_ccomponent = True
-                bicomponent_set = bicomponent_set.union(m.parent_bicomponents)
-            single_connected_components.append(
-                graph_objects.Component(node_list, bicomponent_set))
-            total_single_component_count += 1
+    for node_indices in core.components(core.single_sets):
+        node_list = [core.single_nodes[i] for i in node_indices]
+        bicomponent_set = set()
+        for m in node_list:
+            bicomponent_set.update(m.parent_bicomponents)
+        single_connected_components.append(
+            graph_objects.Component(node_list, bicomponent_set))
+        total_single_component_count += 1
 
 # Identify connected components in the normal (non-"single") graph
-# NOTE that nodes_to_draw only contains node groups and nodes that aren't in
-# node groups. This allows us to run DFS on the nodes "inside" the node
-# groups, preserving the groups' existence while not counting them in DFS.
 connected_components = []
-for n in nodes_to_draw:
-    if not n.seen_in_ccomponent and not n.is_subsumed:
-        # If n is actually a group of nodes: since we're representing groups
-        # here as clusters, without any adjacencies themselves, we have to
-        # run DFS on the nodes within the groups of nodes to discover them.
-        node_list = []
-        node_group_list = []
-        if issubclass(type(n), graph_objects.NodeGroup):
-            # n is a node group
-            if n.nodes[0].seen_in_ccomponent:
-                continue
-            node_list = dfs(n.nodes[0])
-        else:
-            # It's just a normal Node, but it could certainly be connected
-            # to a group of nodes (not that it really matters)
-            node_list = dfs(n)
-
-        # Now that we've ran DFS to discover all the nodes in this connected
-        # component, we go through each node to identify their groups (if
-        # applicable) and add those to node_group_list if the group is not
-        # already on that list. (TODO, there's probably a more efficient way
-        # to do this using sets/etc.)
-        for m in node_list:
-            m.seen_in_ccomponent = True
-            if m.used_in_collapsing and m.group not in node_group_list:
-                node_group_list.append(m.group)
-        connected_components.append(
-            graph_objects.Component(node_list, node_group_list))
-        total_component_count += 1
+for node_indices in core.components(core.double_sets):
+    node_list = [core.nodes[i] for i in node_indices]
+    # Go through each node to identify their groups (if applicable), keeping
+    # the groups in the order we first see them in
+    node_group_list = []
+    node_group_set = set()
+    for m in node_list:
+        if m.used_in_collapsing and m.group not in node_group_set:
+            node_group_set.add(m.group)
+            node_group_list.append(m.group)
+    connected_components.append(
+        graph_objects.Component(node_list, node_group_list))
+    total_component_count += 1
 connected_components.sort(reverse=True, key=lambda c: len(c.node_list))
 
 # Loop through connected_components. For each cc:
@@ -1220,7 +717,7 @@ if not distinct_single_graph:
         for n in c.node_list:
             s = singlenodeid2obj[n.id_string]
             single_node_list.append(s)
-            bicomponent_set = bicomponent_set.union(s.parent_bicomponents)
+            bicomponent_set.update(s.parent_bicomponents)
         single_connected_components.append(
             graph_objects.Component(single_node_list, bicomponent_set))
         total_single_component_count += 1
@@ -1291,112 +788,22 @@ if edge_weights_available:
                 e.thickness = (e.multiplicity - min_ew) / ew_range
     conclude_msg()
 
-operation_msg(config.DB_INIT_MSG + "%s..." % (db_fn))
-# Now that we've done all our processing on the assembly graph, we create the
-# output file: a SQLite database in which we store biological and graph layout
-# information. This will be opened in the Javascript graph viewer.
-#
-# Note that there's technically a race condition here, but SQLite handles
-# itself so well that we don't need to bother catching it. If, somehow, a
-# file with the name db_fullfn is created in between when we run
-# check_file_existence(db_fullfn) and sqlite3.connect(db_fullfn), then that
-# file will either:
-# -Be repurposed as a database containing this data in addition to
-#  its original data (if the file is a SQLite database, but stores other
-#  data -- expected behavior for this case)
-# -Cause the first cursor.execute() call to fail since the database already
-#  has a nodes table (if the file is a SQLite database this program has
-#  generated -- expected behavior for this case)
-# -Cause the first cursor.execute() call to fail since the file is not a
-#  SQLite database (expected behavior for this case)
-# Essentially, we're okay here -- SQLite will handle the race condition
-# properly, should one arise. (I doubt that race conditions will happen
-# here, but I suppose you can't be too safe.)
-connection = sqlite3.connect(db_fullfn)
-cursor = connection.cursor()
-# Define statements used for inserting a value into these tables
-# The number of question marks has to match the number of table columns
-NODE_INSERTION_STMT = "INSERT INTO nodes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)"
-EDGE_INSERTION_STMT = "INSERT INTO edges VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
-CLUSTER_INSERTION_STMT = "INSERT INTO clusters VALUES (?,?,?,?,?,?,?)"
-COMPONENT_INSERTION_STMT = "INSERT INTO components VALUES (?,?,?,?,?,?)"
-ASSEMBLY_INSERTION_STMT = \
-    "INSERT INTO assembly VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)"
-SINGLENODE_INSERTION_STMT = \
-    "INSERT INTO singlenodes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
-SINGLEEDGE_INSERTION_STMT = "INSERT INTO singleedges VALUES (?,?,?,?,?)"
-BICOMPONENT_INSERTION_STMT = \
-    "INSERT INTO bicomponents VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
-METANODE_INSERTION_STMT = \
-    "INSERT INTO metanodes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
-METANODEEDGE_INSERTION_STMT = "INSERT INTO metanodeedges VALUES (?,?,?,?,?,?)"
-SINGLECOMPONENT_INSERTION_STMT = \
-    "INSERT INTO singlecomponents VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
-cursor.execute("""CREATE TABLE nodes
-        (id text, label text, length integer, gc_content real, depth real,
-        is_repeat integer, component_rank integer, x real, y real, w real,
-        h real, shape text, parent_cluster_id text)""")
-cursor.execute("""CREATE TABLE edges
-        (source_id text, target_id text, multiplicity integer, thickness real,
-        is_outlier integer, orientation text, mean real, stdev real,
-        component_rank integer, control_point_string text,
-        control_point_count integer, parent_cluster_id text)""") 
-cursor.execute("""CREATE TABLE clusters (cluster_id text, length integer,
-        component_rank integer, left real, bottom real, right real,
-        top real)""")
-cursor.execute("""CREATE TABLE components
-        (size_rank integer, node_count integer, edge_count integer,
-        total_length integer, boundingbox_x real, boundingbox_y real)""")
-cursor.execute("""CREATE TABLE assembly
-        (filename text, filetype text, node_count integer,
-        edge_count integer, all_edge_count integer, component_count integer,
-        bicomponent_count integer, single_component_count integer,
-        total_length integer, n50 integer, gc_content real,
-        dna_given integer, repeats_given integer)""")
-# SPQR view tables
-cursor.execute("""CREATE TABLE singlenodes
-        (id text, label text, length integer, gc_content real, depth real,
-        is_repeat integer, scc_rank integer, x real, y real, i_x real,
-        i_y real, w real, h real, parent_metanode_id text,
-        parent_bicomponent_id text)""")
-cursor.execute("""CREATE TABLE singleedges
-        (source_id text, target_id text, scc_rank integer,
-        parent_metanode_id text, is_virtual integer)""")
-cursor.execute("""CREATE TABLE bicomponents
-        (id_num integer, root_metanode_id string, scc_rank integer,
-        node_count integer, left real, bottom real, right real, top real,
-        i_left real, i_bottom real, i_right real, i_top real)""")
-cursor.execute("""CREATE TABLE metanodes
-        (metanode_id text, scc_rank integer, parent_bicomponent_id_num integer,
-        descendant_metanode_count integer, node_count integer,
-        total_length integer, left real, bottom real, right real,
-        top real, i_left real, i_bottom real, i_right real, i_top real)""")
-cursor.execute("""CREATE TABLE metanodeedges
-        (source_metanode_id text, target_metanode_id text, scc_rank integer,
-        control_point_string text, control_point_count integer,
-        parent_bicomponent_id_num integer)""")
-cursor.execute("""CREATE TABLE singlecomponents
-        (size_rank integer, ex_uncompressed_node_count integer,
-        ex_uncompressed_edge_count integer, im_uncompressed_node_count integer,
-        im_uncompressed_edge_count integer, compressed_node_count integer,
-        compressed_edge_count integer, bicomponent_count integer,
-        boundingbox_x real, boundingbox_y real, i_boundingbox_x real,
-        i_boundingbox_y real)""")
-connection.commit()
-
-# Insert general assembly information into the database
+operation_msg(config.DB_ASM_MSG)
+# Now that we've done all our processing on the assembly graph, insert
+# general assembly information into the database
 asm_gc = None
 dna_given_val = 0
 if dna_given:
     asm_gc = assembly_gc(total_gc_nt_count, total_length)
     dna_given_val = 1
 repeats_given_val = 1 if repeats_given else 0
+sequences_given_val = 1 if sequences_given else 0
 graphVals = (os.path.basename(asm_fn), graph_filetype, total_node_count,
             total_edge_count, total_all_edge_count, total_component_count,
             total_bicomponent_count, total_single_component_count,
-            total_length, n50(bp_length_list), asm_gc, dna_given_val,
-            repeats_given_val)
-cursor.execute(ASSEMBLY_INSERTION_STMT, graphVals)    
+            total_length, n50(core.lengths), asm_gc, dna_given_val,
+            repeats_given_val, sequences_given_val)
+db.insert("assembly", graphVals)    
 conclude_msg()
 
 # Lay out both the implicit and explicit SPQR tree views; store stuff for the
@@ -1621,7 +1028,7 @@ for mode in ("implicit", "explicit"):
                 sc_node_count += 1
                 if mode == "explicit":
                     curr_node.set_component_rank(single_component_size_rank)
-                    cursor.execute(SINGLENODE_INSERTION_STMT,
+                    db.insert("singlenodes",
                             curr_node.s_db_values())
             except KeyError: # arising from singlenodeid2obj[a bicomponent id]
                 # We use [9:] to slice off the "cluster_I" prefix on every
@@ -1704,7 +1111,7 @@ for mode in ("implicit", "explicit"):
                     mn.xdot_itop += curr_cluster.xdot_ibottom
                     mn.xdot_ibottom += curr_cluster.xdot_ibottom
                     mn.set_component_rank(single_component_size_rank)
-                    cursor.execute(METANODE_INSERTION_STMT, mn.db_values())
+                    db.insert("metanodes", mn.db_values())
                     # Add nodes in this metanode (...in this bicomponent) to
                     # the .db file. I'm a bit miffed that "double backfilling"
                     # is the fanciest name I can come up with for this process
@@ -1720,7 +1127,7 @@ for mode in ("implicit", "explicit"):
                         # bicomponents.
                         sc_node_count += 1
                         sn.set_component_rank(single_component_size_rank)
-                        cursor.execute(SINGLENODE_INSERTION_STMT,
+                        db.insert("singlenodes",
                                 sn.s_db_values(mn))
                     # Add edges between nodes within this metanode's skeleton
                     # to the .db file. We just treat these edges as straight
@@ -1731,7 +1138,7 @@ for mode in ("implicit", "explicit"):
                         # Save this edge in the .db
                         sc_edge_count += 1
                         se.component_size_rank = single_component_size_rank
-                        cursor.execute(SINGLEEDGE_INSERTION_STMT, \
+                        db.insert("singleedges", \
                                 se.s_db_values())
                 # Reconcile edges between metanodes in this bicomponent
                 for e in curr_cluster.edges:
@@ -1760,11 +1167,11 @@ for mode in ("implicit", "explicit"):
                         p += 2
                     # Save this edge in the .db
                     sc_edge_count += 1
-                    cursor.execute(METANODEEDGE_INSERTION_STMT,
+                    db.insert("metanodeedges",
                             e.metanode_edge_db_values())
                 # Save this bicomponent's information in the .db
                 curr_cluster.component_size_rank = single_component_size_rank
-                cursor.execute(BICOMPONENT_INSERTION_STMT, \
+                db.insert("bicomponents", \
                         curr_cluster.db_values())
         # We don't need to get edge info or store anything in the .db just yet,
         # so just move on to the next single connected component.
@@ -1817,8 +1224,8 @@ for mode in ("implicit", "explicit"):
             # curves
             # anyway. If we decide to change this behavior to display these
             # edges with control point info, then we can modify
-            # SINGLEEDGE_INSERTION_STMT above (as well as the database schema
-            # for the singleedges table) to store this data accordingly.
+            # the schema for the singleedges table (in db_writer.py) to
+            # store this data accordingly.
             # (At this point, we've already computed xdot_ctrl_pt_str and
             # xdot_ctrl_pt_count, so all that would really remain is storing
             # that info in the database and handling it properly in the
@@ -1826,14 +1233,14 @@ for mode in ("implicit", "explicit"):
             db_values = (source_id, target_id, single_component_size_rank,
                     None, 0)
             sc_edge_count += 1
-            cursor.execute(SINGLEEDGE_INSERTION_STMT, db_values)
+            db.insert("singleedges", db_values)
 
         if not no_print or \
                     total_single_component_count == single_component_size_rank:
             conclude_msg()
 
         # Output component information to the database
-        cursor.execute(SINGLECOMPONENT_INSERTION_STMT,
+        db.insert("singlecomponents",
             (single_component_size_rank, sc_node_count, sc_edge_count,
                 implicit_spqr_node_counts[single_component_size_rank - 1],
                 implicit_spqr_edge_counts[single_component_size_rank - 1],
@@ -1853,7 +1260,137 @@ if not no_print:
     conclude_msg()
 # Lay out the "standard mode" view of the graph and store information about it
 # in the database.
+
+def layout_standard_component(component_index):
+    """Lays out the connected component at the given index of
+       connected_components (along with all of its node groups) using dot.
+
+       This doesn't modify anything in the database; instead, it returns a
+       "layout record" of plain values that can be sent between processes
+       (which lets us run this function in a multiprocessing.Pool when -j is
+       greater than 1). The main process then reconciles each record with the
+       Node/Edge/NodeGroup objects in the component in question and saves the
+       results in the database, in order of component size rank.
+
+       The layout record is a dict with the following keys:
+        -"groups": a list of the layout records (see
+         NodeGroup.isolated_layout_record()) of each node group in the
+         component, in the same order as component.node_group_list
+        -"nodes": a list of (node name, position string, width, height, shape)
+         tuples for each node in the component's layout, where a "node" is
+         either a normal Node or a backfilled node group rectangle
+        -"edges": a list of (layout source name, layout target name, comment,
+         position string) tuples for each edge in the component's layout
+        -"gv": the DOT input used for the layout if -pg was passed, or None
+        -"xdot": the xdot output of the layout if -px was passed, or None
+    """
+    component = connected_components[component_index]
+    # Lay out all clusters individually, to be backfilled
+    group_records = []
+    for ng in component.node_group_list:
+        group_records.append(ng.layout_isolated())
+    # Get the node info (for both normal nodes and clusters), and the edge
+    # info (obtained by just getting the outgoing edge list for each normal
+    # node in the component). This is an obviously limited subset of the
+    # data we've ascertained from the file; once we parse the layout
+    # information (.xdot) generated by GraphViz, we'll reconcile that data
+    # with the previously-stored biological data.
+    node_info, edge_info = component.node_and_edge_info()
+    # NOTE: Currently, we reduce each component of the asm. graph to a DOT
+    # string that we send to pygraphviz. However, we could also send
+    # nodes/edges procedurally, using add_edge(), add_node(), etc.
+    # That might be faster, and it might be worth doing;
+    # however, for now I think this approach should be fine (knock on wood).
+    gv_input = ""
+    gv_input += "digraph asm {\n"
+    if config.GRAPH_STYLE != "":
+        gv_input += "\t%s;\n" % (config.GRAPH_STYLE)
+    if config.GLOBALNODE_STYLE != "":
+        gv_input += "\tnode [%s];\n" % (config.GLOBALNODE_STYLE)
+    if config.GLOBALEDGE_STYLE != "":
+        gv_input += "\tedge [%s];\n" % (config.GLOBALEDGE_STYLE)
+    gv_input += node_info
+    gv_input += edge_info
+    gv_input += "}"
+    h = pygraphviz.AGraph(gv_input)
+    # lay out the graph in .xdot -- this step is the main bottleneck in the
+    # python side of AsmViz
+    # NOTE if dot is taking a really long time to lay stuff out, then other
+    # Graphviz layout programs (e.g. sfdp) can be used instead -- however
+    # they'll generally produce less useful drawings for directed graphs
+    h.layout(prog='dot')
+    xdot_output = None
+    if preserve_xdot:
+        # AGraph.draw() doesn't perform graph positioning if layout()
+        # has already been called on the given AGraph and no prog is
+        # specified -- so this should be relatively fast
+        xdot_output = h.draw(format="xdot")
+    node_records = []
+    for n in h.nodes():
+        node_records.append((str(n), str(n.attr[u'pos']),
+            float(n.attr[u'width']), float(n.attr[u'height']),
+            str(n.attr[u'shape'])))
+    edge_records = []
+    for e in h.edges():
+        edge_records.append((str(e[0]), str(e[1]), str(e.attr[u'comment']),
+            str(e.attr[u'pos'])))
+    h.clear()
+    h.close()
+    return {"groups": group_records, "nodes": node_records,
+            "edges": edge_records, "gv": gv_input if preserve_gv else None,
+            "xdot": xdot_output}
+
+def parallel_standard_layouts():
+    """Generator that lays out every component in connected_components using
+       a pool of jobs processes, yielding the resulting layout records (see
+       layout_standard_component()) in order of component size rank.
+
+       Components are submitted to the pool in the order they're stored in
+       connected_components (i.e. in descending order of node count), so
+       that the largest components (which take the longest to lay out) are
+       started first instead of potentially being left as stragglers at the
+       end of the run.
+
+       Since the worker processes are forked from this one after
+       connected_components has been constructed, they can just access the
+       components by index -- we only send indices to the workers, and only
+       plain layout records are sent back.
+    """
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.imap_unordered(layout_standard_component_by_index,
+            xrange(len(connected_components)), chunksize=1)
+        # Layout records that have been received, but that we can't yield yet
+        # because a larger component is still being laid out
+        pending_records = {}
+        next_index = 0
+        for index, record in results:
+            pending_records[index] = record
+            while next_index in pending_records:
+                yield pending_records.pop(next_index)
+                next_index += 1
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def layout_standard_component_by_index(component_index):
+    """Returns a 2-tuple of the given index and the layout record of the
+       component at that index of connected_components.
+
+       Used by parallel_standard_layouts(), since the records it receives
+       from the pool aren't necessarily in order.
+    """
+    return component_index, layout_standard_component(component_index)
+
 t3 = time.time()
+if jobs > 1:
+    standard_layouts = parallel_standard_layouts()
+else:
+    standard_layouts = (layout_standard_component(i)
+        for i in xrange(len(connected_components)))
 component_size_rank = 1 # largest component is 1, the 2nd largest is 2, etc
 no_print = False # used to reduce excess printing (see issue #133 on GitHub)
 for component in connected_components:
@@ -1887,35 +1424,16 @@ for component in connected_components:
             # insert node info and cc info into the database, then continue
             # (Also TODO: Do this for the SPQR modes above)
             pass
-    # Lay out all clusters individually, to be backfilled
-    for ng in component.node_group_list:
-        ng.layout_isolated()
-    # OK, we're displaying this component.
-    # Get the node info (for both normal nodes and clusters), and the edge
-    # info (obtained by just getting the outgoing edge list for each normal
-    # node in the component). This is an obviously limited subset of the
-    # data we've ascertained from the file; once we parse the layout
-    # information (.xdot) generated by GraphViz, we'll reconcile that data
-    # with the previously-stored biological data.
-    node_info, edge_info = component.node_and_edge_info()
+    # OK, we're displaying this component. Get its layout (this is where the
+    # actual layout happens if -j is 1; otherwise, this waits for one of the
+    # worker processes to finish laying out this component)
+    layout = next(standard_layouts)
+    # Reconcile the layouts of this component's node groups with their child
+    # nodes/edges (if the layout was done in this process, this was already
+    # done, but reapplying the records is harmless)
+    for ng, group_record in zip(component.node_group_list, layout["groups"]):
+        ng.apply_isolated_layout(group_record)
     component_prefix = "%s_%d" % (output_fn, component_size_rank)
-    # NOTE: Currently, we reduce each component of the asm. graph to a DOT
-    # string that we send to pygraphviz. However, we could also send
-    # nodes/edges procedurally, using add_edge(), add_node(), etc.
-    # That might be faster, and it might be worth doing;
-    # however, for now I think this approach should be fine (knock on wood).
-    gv_input = ""
-    gv_input += "digraph asm {\n"
-    if config.GRAPH_STYLE != "":
-        gv_input += "\t%s;\n" % (config.GRAPH_STYLE)
-    if config.GLOBALNODE_STYLE != "":
-        gv_input += "\tnode [%s];\n" % (config.GLOBALNODE_STYLE)
-    if config.GLOBALEDGE_STYLE != "":
-        gv_input += "\tedge [%s];\n" % (config.GLOBALEDGE_STYLE)
-    gv_input += node_info
-    gv_input += edge_info
-    gv_input += "}"
-    h = pygraphviz.AGraph(gv_input)
     # We've just printed a layout message (and haven't printed a \n yet) if:
     # -we're laying out a "not small" component (i.e. no_print is False), or
     # -we're laying out a "small" component, but we just printed the "laying
@@ -1932,22 +1450,14 @@ for component in connected_components:
     r = True
     # save the .gv file if the user requested .gv preservation
     if preserve_gv:
-        r=save_aux_file(component_prefix + ".gv", gv_input, layout_msg_printed)
-
-    # lay out the graph in .xdot -- this step is the main bottleneck in the
-    # python side of AsmViz
-    # NOTE if dot is taking a really long time to lay stuff out, then other
-    # Graphviz layout programs (e.g. sfdp) can be used instead -- however
-    # they'll generally produce less useful drawings for directed graphs
-    h.layout(prog='dot')
+        r = save_aux_file(component_prefix + ".gv", layout["gv"],
+            layout_msg_printed)
     # save the .xdot file if the user requested .xdot preservation
     if preserve_xdot:
-        # AGraph.draw() doesn't perform graph positioning if layout()
-        # has already been called on the given AGraph and no prog is
-        # specified -- so this should be relatively fast
         if not r:
             layout_msg_printed = False
-        save_aux_file(component_prefix + ".xdot", h, layout_msg_printed)
+        save_aux_file(component_prefix + ".xdot", layout["xdot"],
+            layout_msg_printed)
 
     # Record the layout information of the graph's nodes, edges, and clusters
 
@@ -1986,17 +1496,17 @@ for component in connected_components:
     bounding_box_top = 0
 
     # Record layout info of nodes (incl. rectangular "empty" node groups)
-    for n in h.nodes():
+    for node_name, pos, width, height, shape in layout["nodes"]:
         try:
-            curr_node = nodeid2obj[str(n)]
+            curr_node = nodeid2obj[node_name]
             component_node_count += 1
             component_total_length += curr_node.bp
             if curr_node.group != None:
                 continue
-            ep = n.attr[u'pos'].split(',')
+            ep = pos.split(',')
             curr_node.xdot_x, curr_node.xdot_y = tuple(float(c) for c in ep)
-            curr_node.xdot_width = float(n.attr[u'width'])
-            curr_node.xdot_height = float(n.attr[u'height'])
+            curr_node.xdot_width = width
+            curr_node.xdot_height = height
             # Try to expand the component bounding box
             right_side = curr_node.xdot_x + \
                 (config.POINTS_PER_INCH * (curr_node.xdot_width/2.0))
@@ -2005,21 +1515,21 @@ for component in connected_components:
             if right_side > bounding_box_right: bounding_box_right = right_side
             if top_side > bounding_box_top: bounding_box_top = top_side
             # Save this cluster in the .db
-            curr_node.xdot_shape = str(n.attr[u'shape'])
+            curr_node.xdot_shape = shape
             curr_node.set_component_rank(component_size_rank)
-            cursor.execute(NODE_INSERTION_STMT, curr_node.db_values())
+            db.insert("nodes", curr_node.db_values())
         except KeyError: # arising from nodeid2obj[a cluster id]
             # We use [8:] to slice off the "cluster_" prefix on every rectangle
             # node that is actually a node group that will be backfilled (#80)
-            curr_cluster = clusterid2obj[str(n)[8:]]
+            curr_cluster = clusterid2obj[node_name[8:]]
             component_node_count += curr_cluster.node_count
             component_edge_count += curr_cluster.edge_count
             component_total_length += curr_cluster.bp
-            ep = n.attr[u'pos'].split(',')
+            ep = pos.split(',')
             curr_cluster.xdot_x = float(ep[0])
             curr_cluster.xdot_y = float(ep[1])
-            curr_cluster.xdot_width = float(n.attr[u'width'])
-            curr_cluster.xdot_height = float(n.attr[u'height'])
+            curr_cluster.xdot_width = width
+            curr_cluster.xdot_height = height
             half_width_pts = \
                 (config.POINTS_PER_INCH * (curr_cluster.xdot_width/2.0))
             half_height_pts = \
@@ -2038,7 +1548,7 @@ for component in connected_components:
                 n.xdot_x = curr_cluster.xdot_left + n.xdot_rel_x
                 n.xdot_y = curr_cluster.xdot_bottom + n.xdot_rel_y
                 n.set_component_rank(component_size_rank)
-                cursor.execute(NODE_INSERTION_STMT, n.db_values())
+                db.insert("nodes", n.db_values())
             # Reconcile child edges -- add to .db
             for e in curr_cluster.edges:
                 # Adjust the control points to be relative to the entire
@@ -2056,29 +1566,29 @@ for component in connected_components:
                     e.xdot_ctrl_pt_str += str(curr_cluster.xdot_bottom + yp)
                     # Try to expand the component bounding box -- interior
                     # edges should normally be entirely within the bounding box
-                    # of their node group, but complex bubbles might contain
+                    # of their node group, but superbubbles might contain
                     # interior edges that go outside of the node group's b. box
                     if xp > bounding_box_right: bounding_box_right = xp
                     if yp > bounding_box_top: bounding_box_top = yp
                     p += 2
                 # Save this edge in the .db
-                cursor.execute(EDGE_INSERTION_STMT, e.db_values())
+                db.insert("edges", e.db_values())
             # Save the cluster in the .db
             curr_cluster.component_size_rank = component_size_rank
-            cursor.execute(CLUSTER_INSERTION_STMT, curr_cluster.db_values())
+            db.insert("clusters", curr_cluster.db_values())
     # Record layout info of edges (that aren't inside node groups)
-    for e in h.edges():
+    for layout_source, layout_target, comment, pos in layout["edges"]:
         # Since edges could point to/from node groups, we store their actual
         # source/target nodes in a comment attribute
-        source_id, target_id = e.attr[u'comment'].split(',')
+        source_id, target_id = comment.split(',')
         source = nodeid2obj[source_id]
         curr_edge = source.outgoing_edge_objects[target_id]
         component_edge_count += 1
         if curr_edge.group != None:
             continue
         curr_edge.xdot_ctrl_pt_str, coord_list, curr_edge.xdot_ctrl_pt_count= \
-            graph_objects.Edge.get_control_points(e.attr[u'pos'])
-        if source_id != e[0]:
+            graph_objects.Edge.get_control_points(pos)
+        if source_id != layout_source:
             # Adjust edge to point from interior node "source"'s tailport
             pts_height = source.xdot_height * config.POINTS_PER_INCH
             tail_y = source.xdot_y - (pts_height / 2)
@@ -2089,7 +1599,7 @@ for component in connected_components:
             xcps = xcps[xcps.index(" ") + 1:]
             xcps = xcps[xcps.index(" ") + 1:]
             curr_edge.xdot_ctrl_pt_str = new_points + xcps
-        if target_id != e[1]:
+        if target_id != layout_target:
             # Adjust edge to point to interior node "target"'s headport
             target = nodeid2obj[target_id]
             pts_height = target.xdot_height * config.POINTS_PER_INCH
@@ -2110,17 +1620,15 @@ for component in connected_components:
             if y_coord > bounding_box_top: bounding_box_top = y_coord
             p += 2
         # Save this edge in the .db
-        cursor.execute(EDGE_INSERTION_STMT, curr_edge.db_values())
+        db.insert("edges", curr_edge.db_values())
 
     if not no_print:
         conclude_msg()
     # Output component information to the database
-    cursor.execute(COMPONENT_INSERTION_STMT,
+    db.insert("components",
         (component_size_rank, component_node_count, component_edge_count,
         component_total_length, bounding_box_right, bounding_box_top))
 
-    h.clear()
-    h.close()
     component_size_rank += 1
 
 t4 = time.time()
@@ -2129,7 +1637,5 @@ if no_print:
 print "Standard view layout time: %g seconds" % (t4 - t3)
 
 operation_msg(config.DB_SAVE_MSG + "%s..." % (db_fn))
-connection.commit()
+db.finish()
 conclude_msg()
-# Close the database connection
-connection.close()
@@ -25,15 +25,29 @@
 from math import sqrt
 import stat
 
-# This really shouldn't be messed with. Defines a dict of nucleotides to their
-# complements that we can use when getting the reverse complement of a sequence
-# from the GFA format.
-COMPLEMENT = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
+# This really shouldn't be messed with. Defines a dict of nucleotides (and
+# IUPAC ambiguity codes) to their complements that we can use when getting the
+# reverse complement of a sequence from the GFA format. Lowercase nucleotides
+# are added below.
+COMPLEMENT = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C', 'U': 'A', 'N': 'N',
+              'R': 'Y', 'Y': 'R', 'K': 'M', 'M': 'K', 'S': 'S', 'W': 'W',
+              'B': 'V', 'V': 'B', 'D': 'H', 'H': 'D'}
+COMPLEMENT.update([(n.lower(), c.lower()) for n, c in COMPLEMENT.items()])
 # The conversion factor between points (in GraphViz output) and inches, as used
 # by GraphViz. By default GraphViz uses 72 points per inch, so changing this is
 # not recommended. (This must be a float.)
 POINTS_PER_INCH = 72.0
 
+# The number of rows buffered for each table of the output .db file before
+# they're written to the database in one executemany() call
+DB_BATCH_SIZE = 10000
+# The size of SQLite's page cache (in KiB) while the .db file is being written
+DB_CACHE_SIZE_KB = 65536
+# The number of rows buffered for the sequences table of the output .db file
+# (see -sq); since each of these rows contains a packed block of sequence, this
+# is a lot lower than DB_BATCH_SIZE
+DB_SEQUENCE_BATCH_SIZE = 256
+
 # File mode used for auxiliary files (.gv/.xdot)
 # This should match up with the defaults on most systems.
 AUXMOD = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH
@@ -93,6 +107,13 @@ GLOBALEDGE_STYLE = "headport=n,tailport=s"
 # Style applied (directly) to every cluster in the graph.
 GLOBALCLUSTER_STYLE = "margin=0"
 
+# The order in which the patterns that nodes are collapsed into are looked for
+# (see pattern_detectors.py). Patterns looked for earlier take precedence over
+# patterns looked for later, and patterns not listed here aren't looked for at
+# all. This can be overridden with -pp.
+PATTERN_PRECEDENCE = ("bubbles", "superbubbles", "frayed_ropes", "cycles",
+    "chains")
+
 # Various status messages/message prefixes that are displayed to the user.
 # Displayed during command-line argument parsing
 COLLATE_DESCRIPTION = "Prepare an assembly graph file for visualization, " + \
@@ -100,17 +121,20 @@ COLLATE_DESCRIPTION = "Prepare an assembly graph file for visualization, " + \
 BUBBLE_SEARCH_MSG = "Looking for simple bubbles in the graph..."
 SPQR_MSG = \
     "Generating SPQR tree decompositions for the bicomponents of the graph..."
-SPQR_LAYOUT_MSG = \
-    "Laying out SPQR trees for each bicomponent in the graph..."
-BICOMPONENT_BUBBLE_SEARCH_MSG = \
-    "Looking for complex bubbles in the graph using SPQR tree decompositions..."
+SUPERBUBBLE_SEARCH_MSG = "Looking for superbubbles in the graph..."
 FRAYEDROPE_SEARCH_MSG = "Looking for frayed ropes in the graph..."
 CYCLE_SEARCH_MSG = "Looking for cyclic chains in the graph..."
 CHAIN_SEARCH_MSG = "Looking for chains in the graph..."
+PATTERN_REPORT_MSG = "Pattern detection (%s): %d found in %g seconds"
+SUPERBUBBLE_NESTING_MSG = \
+    " (of %d superbubbles in the graph: %d top-level, %d nested, maximum" + \
+    " nesting depth %d)"
 COMPONENT_MSG = "Identifying connected components within the graph..."
 EDGE_SCALING_MSG = "Scaling edge thicknesses in each connected component..."
 READ_FILE_MSG = "Reading and parsing input file "
+READ_SEQUENCES_MSG = "Reading sequences from FASTA file "
 DB_INIT_MSG = "Initializing output file "
+DB_ASM_MSG = "Storing general assembly information in the output file..."
 SAVE_AUX_FAIL_MSG = "Not saving "
 LAYOUT_MSG = "Laying out "
 SMALL_COMPONENTS_MSG = "small (containing < 5 nodes) remaining components..."
@@ -132,10 +156,50 @@ IS_DIR_ERR = " is a directory"
 EXISTS_ERR = " already exists and -w is not set"
 EMPTY_LIST_N50_ERR = "N50 of an empty list does not exist"
 N50_CALC_ERR = "N50 calculation error"
+JOBS_ERR = "the number of jobs (-j) must be at least 1"
+CACHE_SIZE_ERR = "the cache size (-cs) must be nonnegative"
+CORRUPT_SNAPSHOT_ERR = " is corrupted (it has been removed from the cache)"
+PATTERN_ERR = "unknown pattern in -pp: "
+PATTERN_DUPLICATE_ERR = "pattern given more than once in -pp: "
+NO_LZMA_ERR = "Reading xz-compressed files requires the backports.lzma module"
+SPQR_FRAME_ERR = "Unexpected line in the SPQR script's output: "
 
+# The number of bytes at the start of an assembly graph file that are examined
+# to detect what filetype the file is (see parsers.get_parser())
+SNIFF_SIZE = 4096
+# The number of bytes of a compressed assembly graph file that are read (and
+# then decompressed) at a time
+DECOMPRESSION_CHUNK_SIZE = 1048576
+# The maximum number of decompressed blocks that can be waiting to be parsed
+# at once. (The decompression thread pauses once this many blocks are
+# waiting, so this limits how much memory decompression can use.)
+DECOMPRESSION_QUEUE_SIZE = 16
+# The number of bytes read at a time from uncompressed assembly graph files
+# that are parsed in blocks instead of line by line (i.e. GML files)
+READ_BLOCK_SIZE = 1048576
+# The number of edges written at a time to the stdin of the SPQR script (see
+# graph_core.GraphCore.links_chunks() and spqr_stream.py)
+LINKS_CHUNK_SIZE = 65536
+# The number of bytes of a sequence in a memory-mapped assembly graph file that
+# are copied at a time when computing the sequence's G/C content
+SEQUENCE_WINDOW_SIZE = 1048576
+# Assembly graph files smaller than this many bytes are always parsed in a single
+# process, even if -j is greater than 1
+PARALLEL_PARSE_MIN_SIZE = 16777216
+# When parsing an assembly graph file in parallel, the file is split into this
+# many chunks per process (so that processes that finish their chunks early can
+# take on more work)
+PARSE_CHUNKS_PER_JOB = 4
+# The default maximum total size (in MiB) of the snapshots of parsed assembly
+# graph files stored in the cache directory (see -c and -cs)
+CACHE_SIZE_MB = 10240
+# The number of nucleotides in each block of sequence stored in the sequences
+# table of the output .db file (see -sq). Each block is stored in its own row,
+# and takes up a quarter of this many bytes once packed.
+SEQUENCE_BLOCK_SIZE = 16384
 # The filename suffixes indicating a file is of a certain type.
-# Ideally, we should be able to detect what filetype an assembly file is by
-# just examining the file's contents, but for now this is an okay workaround.
+# These are only used if we can't detect what filetype an assembly file is by
+# examining the file's contents.
 LASTGRAPH_SUFFIX = "lastgraph"
 GRAPHML_SUFFIX   = "gml"
 GFA_SUFFIX       = "gfa"
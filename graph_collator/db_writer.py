@@ -0,0 +1,318 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# This file defines the schema of the SQLite .db files that collate.py
+# generates (and that the viewer interface reads), along with the
+# DatabaseWriter class that collate.py uses to actually write these files.
+
+import os
+import errno
+import sqlite3
+import tempfile
+import config
+
+# The tables in the .db file, as (table name, column definitions) tuples.
+# This is the most up-to-date specification of how the .db file is laid out.
+# If you change a table here, make sure that the corresponding db_values()
+# method(s) in graph_objects.py (and the viewer interface's code) are updated
+# accordingly.
+TABLES = (
+    ("nodes", """id text, label text, length integer, gc_content real,
+        depth real, is_repeat integer, component_rank integer, x real,
+        y real, w real, h real, shape text, parent_cluster_id text,
+        read_count integer"""),
+    ("edges", """source_id text, target_id text, multiplicity integer,
+        thickness real, is_outlier integer, orientation text, mean real,
+        stdev real, component_rank integer, control_point_string text,
+        control_point_count integer, parent_cluster_id text"""),
+    ("clusters", """cluster_id text, length integer, component_rank integer,
+        left real, bottom real, right real, top real"""),
+    ("components", """size_rank integer, node_count integer,
+        edge_count integer, total_length integer, boundingbox_x real,
+        boundingbox_y real"""),
+    ("assembly", """filename text, filetype text, node_count integer,
+        edge_count integer, all_edge_count integer, component_count integer,
+        bicomponent_count integer, single_component_count integer,
+        total_length integer, n50 integer, gc_content real,
+        dna_given integer, repeats_given integer,
+        sequences_given integer"""),
+    # The forward sequences of nodes, split into blocks that are packed
+    # using sequence_utils.pack_sequence() (only filled in if collate.py was
+    # run with -sq). These are kept out of the nodes table so that drawing a
+    # component never has to read sequence data from the .db file.
+    ("sequences", """node_id text, block_index integer, length integer,
+        packed blob, exceptions text"""),
+    # SPQR view tables
+    ("singlenodes", """id text, label text, length integer, gc_content real,
+        depth real, is_repeat integer, scc_rank integer, x real, y real,
+        i_x real, i_y real, w real, h real, parent_metanode_id text,
+        parent_bicomponent_id text, read_count integer"""),
+    ("singleedges", """source_id text, target_id text, scc_rank integer,
+        parent_metanode_id text, is_virtual integer"""),
+    ("bicomponents", """id_num integer, root_metanode_id string,
+        scc_rank integer, node_count integer, left real, bottom real,
+        right real, top real, i_left real, i_bottom real, i_right real,
+        i_top real"""),
+    ("metanodes", """metanode_id text, scc_rank integer,
+        parent_bicomponent_id_num integer,
+        descendant_metanode_count integer, node_count integer,
+        total_length integer, left real, bottom real, right real,
+        top real, i_left real, i_bottom real, i_right real, i_top real"""),
+    ("metanodeedges", """source_metanode_id text, target_metanode_id text,
+        scc_rank integer, control_point_string text,
+        control_point_count integer, parent_bicomponent_id_num integer"""),
+    ("singlecomponents", """size_rank integer,
+        ex_uncompressed_node_count integer,
+        ex_uncompressed_edge_count integer,
+        im_uncompressed_node_count integer,
+        im_uncompressed_edge_count integer, compressed_node_count integer,
+        compressed_edge_count integer, bicomponent_count integer,
+        boundingbox_x real, boundingbox_y real, i_boundingbox_x real,
+        i_boundingbox_y real"""),
+)
+
+# The indexes created on the tables in the .db file, as (index name, table
+# name, indexed columns) tuples. These are built by DatabaseWriter.finish(),
+# after all rows have been inserted (building an index once is a lot faster
+# than updating it for every inserted row).
+#
+# The schema is tuned for the following query shapes, which are the ones that
+# the viewer interface (viewer/js/xdot2cy.js) runs. If you add a query to the
+# viewer interface that filters on a column not listed here, add an index for
+# it below.
+#
+# Standard mode (drawComponent()):
+#   SELECT ... FROM components WHERE size_rank = ?
+#   SELECT * FROM clusters WHERE component_rank = ?
+#   SELECT * FROM nodes WHERE component_rank = ?
+#   SELECT * FROM edges WHERE component_rank = ?
+# Exporting the sequences of selected nodes (getSelectedNodeDNA()):
+#   SELECT * FROM sequences WHERE node_id IN (...)
+#       ORDER BY node_id, block_index
+# SPQR mode (drawSPQRComponent()):
+#   SELECT ... FROM singlecomponents WHERE size_rank = ?
+#   SELECT * FROM bicomponents WHERE scc_rank = ?
+#   SELECT * FROM metanodes WHERE scc_rank = ? AND metanode_id IN (...)
+#   SELECT * FROM singlenodes WHERE scc_rank = ?
+#       AND (parent_metanode_id IS NULL OR parent_metanode_id IN (...))
+#   SELECT * FROM singleedges WHERE scc_rank = ?
+#       AND (parent_metanode_id IS NULL OR parent_metanode_id IN (...))
+# SPQR mode, expanding a metanode (uncollapseSPQRMetanode()):
+#   SELECT * FROM metanodeedges WHERE source_metanode_id = ?
+#   SELECT * FROM metanodes WHERE metanode_id IN (...)
+#   SELECT * FROM singlenodes WHERE parent_metanode_id IN (...)
+#   SELECT * FROM singleedges WHERE parent_metanode_id IN (...)
+#
+# Since all of these queries select every column of a table, these
+# indexes aren't covering indexes; each one just narrows a query down to the
+# rows it needs, so that drawing a component doesn't require a full scan of
+# every table.
+INDEXES = (
+    ("components_size_rank", "components", "size_rank"),
+    ("clusters_component_rank", "clusters", "component_rank"),
+    ("nodes_component_rank", "nodes", "component_rank"),
+    ("nodes_id", "nodes", "id"),
+    ("edges_component_rank", "edges", "component_rank"),
+    ("sequences_node_id", "sequences", "node_id, block_index"),
+    ("singlecomponents_size_rank", "singlecomponents", "size_rank"),
+    ("bicomponents_scc_rank", "bicomponents", "scc_rank"),
+    ("metanodes_metanode_id", "metanodes", "metanode_id"),
+    ("singlenodes_scc_rank", "singlenodes", "scc_rank, parent_metanode_id"),
+    ("singlenodes_parent_metanode_id", "singlenodes", "parent_metanode_id"),
+    ("singleedges_scc_rank", "singleedges", "scc_rank, parent_metanode_id"),
+    ("singleedges_parent_metanode_id", "singleedges", "parent_metanode_id"),
+    ("metanodeedges_source_metanode_id", "metanodeedges",
+        "source_metanode_id"),
+)
+
+# The number of rows buffered for each table before they're written to the
+# database, for tables that don't use the default of config.DB_BATCH_SIZE
+BATCH_SIZES = {"sequences": config.DB_SEQUENCE_BATCH_SIZE}
+
+# PRAGMA statements run on the database before anything is written to it.
+# Since the database is built from scratch in a temporary file that is only
+# moved to its actual location once it's been completely written (see
+# DatabaseWriter.finish()), we don't need SQLite's rollback journal or its
+# fsync()s to protect the file from crashes -- a crashed run just results in
+# the temporary file being discarded.
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -%d" % (config.DB_CACHE_SIZE_KB),
+)
+
+# The errors that link() raises on filesystems that don't support hard links
+# (e.g. some network, FUSE, and FAT filesystems), in which case
+# DatabaseWriter.finish() falls back to checking for an existing file before
+# renaming the temporary file
+LINK_UNSUPPORTED_ERRNOS = (errno.EPERM, errno.EOPNOTSUPP, errno.EXDEV,
+    errno.ENOSYS)
+
+class DatabaseWriter(object):
+    """Writes a .db file for the viewer interface.
+
+       Rows are buffered in memory for each table, and are written to the
+       database in batches of config.DB_BATCH_SIZE rows (or fewer; see
+       BATCH_SIZES) using executemany(), within a single transaction.
+
+       The database is initially built in a temporary file in the same
+       directory as the final .db file. Calling finish() commits everything
+       and then moves the temporary file to the final .db filename
+       atomically; calling discard() (or just never calling finish()) means
+       that the final .db filename is never touched. This way, a crashed run
+       of collate.py doesn't leave a half-written .db file behind.
+    """
+
+    def __init__(self, db_fullfn, overwrite):
+        """Creates a temporary database file (in the same directory as
+           db_fullfn) and initializes all of the tables in TABLES in it.
+
+           If overwrite is False, then finish() will raise an error instead of
+           replacing a file located at db_fullfn.
+        """
+        self.db_fullfn = db_fullfn
+        self.overwrite = overwrite
+        db_dir, db_basename = os.path.split(db_fullfn)
+        fd, self.temp_fullfn = tempfile.mkstemp(prefix=db_basename + ".",
+            suffix=".tmp", dir=db_dir)
+        os.close(fd)
+        # mkstemp() creates files that only the owner can read; give the
+        # database the permissions it would've had if we just created it
+        # normally
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.temp_fullfn, 0666 & ~umask)
+        self.finished = False
+        self.connection = sqlite3.connect(self.temp_fullfn)
+        self.cursor = self.connection.cursor()
+        for pragma in LOAD_PRAGMAS:
+            self.cursor.execute(pragma)
+        # Maps table names to their INSERT statements
+        self.insertion_stmts = {}
+        # Maps table names to lists of rows that haven't been written yet
+        self.buffers = {}
+        for table, columns in TABLES:
+            self.cursor.execute("CREATE TABLE %s (%s)" % (table, columns))
+            # The number of question marks has to match the number of table
+            # columns
+            placeholders = ",".join("?" * len(columns.split(",")))
+            self.insertion_stmts[table] = "INSERT INTO %s VALUES (%s)" % \
+                (table, placeholders)
+            self.buffers[table] = []
+
+    def insert(self, table, values):
+        """Buffers a row (a tuple of values, e.g. as returned by one of the
+           db_values() methods in graph_objects.py) to be inserted into the
+           given table.
+        """
+        buf = self.buffers[table]
+        buf.append(values)
+        if len(buf) >= BATCH_SIZES.get(table, config.DB_BATCH_SIZE):
+            self.flush_table(table)
+
+    def flush_table(self, table):
+        """Writes all buffered rows for the given table to the database."""
+        buf = self.buffers[table]
+        if len(buf) > 0:
+            self.cursor.executemany(self.insertion_stmts[table], buf)
+            self.buffers[table] = []
+
+    def flush(self):
+        """Writes all buffered rows for every table to the database."""
+        for table, columns in TABLES:
+            self.flush_table(table)
+
+    def create_indexes(self):
+        """Creates all of the indexes in INDEXES, and then runs ANALYZE so
+           that SQLite's query planner (in the viewer interface) has
+           statistics about these indexes to work with.
+        """
+        for index, table, columns in INDEXES:
+            self.cursor.execute("CREATE INDEX %s ON %s (%s)" % \
+                (index, table, columns))
+        self.cursor.execute("ANALYZE")
+
+    def finish(self):
+        """Writes all remaining buffered rows, creates the indexes in INDEXES,
+           commits the transaction, and atomically moves the temporary
+           database file to self.db_fullfn.
+
+           Raises an OSError if self.overwrite is False and a file already
+           exists at self.db_fullfn (in this case, the temporary database file
+           is removed).
+
+           If self.overwrite is False but hard links can't be created in
+           self.db_fullfn's directory, the check for an existing file and
+           the move aren't done atomically: a file created at
+           self.db_fullfn between the two is replaced.
+        """
+        self.flush()
+        self.create_indexes()
+        self.connection.commit()
+        self.connection.close()
+        self.finished = True
+        try:
+            if self.overwrite:
+                os.rename(self.temp_fullfn, self.db_fullfn)
+            else:
+                self.move_without_overwriting()
+        except OSError as e:
+            self.remove_temp_file()
+            if e.errno == errno.EEXIST:
+                raise OSError, self.db_fullfn + config.EXISTS_ERR
+            raise
+
+    def move_without_overwriting(self):
+        """Moves the temporary database file to self.db_fullfn, raising an
+           OSError (with errno EEXIST) if a file already exists there.
+        """
+        try:
+            # Unlike rename(), link() fails (instead of replacing the file)
+            # if something now exists at db_fullfn
+            os.link(self.temp_fullfn, self.db_fullfn)
+        except OSError as e:
+            if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+                raise
+            if os.path.lexists(self.db_fullfn):
+                raise OSError(errno.EEXIST, os.strerror(errno.EEXIST),
+                    self.db_fullfn)
+            os.rename(self.temp_fullfn, self.db_fullfn)
+            return
+        os.remove(self.temp_fullfn)
+
+    def discard(self):
+        """Closes the database connection and removes the temporary database
+           file, if finish() hasn't already been called.
+
+           collate.py registers this to be called when it exits, so that the
+           temporary file is cleaned up if collate.py crashes.
+        """
+        if not self.finished:
+            self.finished = True
+            self.connection.close()
+            self.remove_temp_file()
+
+    def remove_temp_file(self):
+        """Removes the temporary database file, if it still exists."""
+        try:
+            os.remove(self.temp_fullfn)
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
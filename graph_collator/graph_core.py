@@ -0,0 +1,1119 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# A compact, array-backed store of the structure of an assembly graph, which
+# collate.py builds while parsing the assembly graph file.
+#
+# Every node is interned as an integer index when it's added. For
+# double-stranded filetypes (LastGraph and GFA), node "5" is given an even
+# index 2k and its reverse complement "-5" is given the index 2k + 1 -- so the
+# reverse complement of index i is just i ^ 1, and the index of either node
+# in the single graph is i >> 1. (For other filetypes, the single graph's
+# indices are the same as the double graph's.)
+#
+# While parsing, each edge given in the assembly graph file (an "arc") is
+# appended once to compact array.array buffers, along with its attributes;
+# the reverse complement edge that an arc implies is never stored, since it's
+# just the arc from (target ^ 1) to (source ^ 1). Attributes that both
+# strands of a sequence share (its length and depth) are also stored once per
+# sequence. Once the file has been parsed, finalize() derives the edges of
+# the double and single graphs from the arcs and converts them into NumPy
+# arrays in compressed sparse row (CSR) form: the successors of node i are
+# out_targets[out_offsets[i]:out_offsets[i + 1]], and its predecessors are
+# stored the same way in in_offsets/in_targets.
+#
+# The single graph of a double-stranded assembly graph isn't stored at all:
+# it's the projection of the double graph given by folding each node i and
+# its reverse complement i ^ 1 into the single node i >> 1, and keeping one
+# undirected edge per arc (see FoldedAdjacency).
+#
+# Connected components aren't found by traversing these arrays: instead, the
+# nodes of the double and single graphs are kept in DisjointSets (union-find
+# structures) that are updated as each arc is added, so every node's
+# component is known as soon as the file has been parsed.
+#
+# Nodes don't store any adjacency information of their own: the adjacency
+# lists and Edge objects of the Node objects in GraphCore.nodes and
+# GraphCore.single_nodes are views of these arrays (see
+# graph_objects.Node.outgoing_nodes). Things that only need the structure of
+# the graph (streaming the links file to the SPQR script, checking node
+# degrees during pattern detection, finding the graph's unitigs so that chains
+# and cycles don't have to be found by walking the graph, finding the graph's
+# superbubbles) read these arrays directly.
+
+from array import array
+import numpy
+import config
+
+# The value stored in the edge multiplicity array for edges without a given
+# multiplicity (or bundle size). Multiplicities are never negative, so this
+# can't be mistaken for an actual multiplicity.
+NO_MULTIPLICITY = -1
+
+class AdjacencyArrays(object):
+    """The adjacencies of a directed graph with node_count nodes, in CSR
+       form.
+
+       Within each node's successors (or predecessors), edges are kept in
+       the order of their positions in the sources/targets arrays given to
+       the constructor. out_edges (and in_edges) give the position of each
+       edge in out_targets (and in_targets) within those arrays, which
+       GraphCore uses to look up the edge's attributes.
+    """
+
+    def __init__(self, node_count, sources, targets):
+        """Builds the CSR arrays, given the number of nodes in the graph and
+           NumPy arrays of the source and target index of each edge.
+        """
+        self.node_count = node_count
+        self.edge_count = len(sources)
+        self.out_degrees = numpy.bincount(sources, minlength=node_count)
+        self.in_degrees = numpy.bincount(targets, minlength=node_count)
+        self.out_offsets = numpy.zeros(node_count + 1, dtype=numpy.int64)
+        numpy.cumsum(self.out_degrees, out=self.out_offsets[1:])
+        self.in_offsets = numpy.zeros(node_count + 1, dtype=numpy.int64)
+        numpy.cumsum(self.in_degrees, out=self.in_offsets[1:])
+        # A stable sort keeps edges with the same source (or target) in the
+        # order they were added in
+        self.out_edges = numpy.argsort(sources, kind="mergesort") \
+            .astype(numpy.int32)
+        self.out_targets = targets[self.out_edges]
+        self.in_edges = numpy.argsort(targets, kind="mergesort") \
+            .astype(numpy.int32)
+        self.in_targets = sources[self.in_edges]
+
+    def successors(self, i):
+        """Returns a list of the indices that node i has edges to."""
+        return self.out_targets[self.out_offsets[i]:
+            self.out_offsets[i + 1]].tolist()
+
+    def predecessors(self, i):
+        """Returns a list of the indices that have edges to node i."""
+        return self.in_targets[self.in_offsets[i]:
+            self.in_offsets[i + 1]].tolist()
+
+    def out_edge_slice(self, i):
+        """Returns a 2-tuple of lists of the indices that node i has edges to
+           and of the positions of these edges (see out_edges).
+        """
+        start = self.out_offsets[i]
+        end = self.out_offsets[i + 1]
+        return (self.out_targets[start:end].tolist(),
+            self.out_edges[start:end].tolist())
+
+    def strongly_connected_components(self):
+        """Returns a 2-tuple of a NumPy array of the strongly connected
+           component that each node is in and the number of components,
+           found using an iterative version of Tarjan's algorithm.
+
+           Components are numbered in reverse topological order: if there's
+           an edge from a node in component a to a node in component b, and
+           a != b, then a > b.
+        """
+        node_count = self.node_count
+        offsets = self.out_offsets.tolist()
+        targets = self.out_targets.tolist()
+        order = [-1] * node_count
+        lowlink = [0] * node_count
+        on_stack = [False] * node_count
+        component = [-1] * node_count
+        stack = []
+        counter = 0
+        component_count = 0
+        for root in xrange(node_count):
+            if order[root] != -1:
+                continue
+            order[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            # The DFS path, and the position in targets of the next edge to
+            # look at from each node on it
+            path = [root]
+            next_edges = [offsets[root]]
+            while path:
+                v = path[-1]
+                e = next_edges[-1]
+                end = offsets[v + 1]
+                while e < end:
+                    w = targets[e]
+                    e += 1
+                    if order[w] == -1:
+                        break
+                    if on_stack[w] and order[w] < lowlink[v]:
+                        lowlink[v] = order[w]
+                else:
+                    # We've looked at all of v's edges
+                    path.pop()
+                    next_edges.pop()
+                    if lowlink[v] == order[v]:
+                        w = -1
+                        while w != v:
+                            w = stack.pop()
+                            on_stack[w] = False
+                            component[w] = component_count
+                        component_count += 1
+                    if path and lowlink[v] < lowlink[path[-1]]:
+                        lowlink[path[-1]] = lowlink[v]
+                    continue
+                next_edges[-1] = e
+                order[w] = lowlink[w] = counter
+                counter += 1
+                stack.append(w)
+                on_stack[w] = True
+                path.append(w)
+                next_edges.append(offsets[w])
+        return numpy.array(component, dtype=numpy.int32), component_count
+
+class FoldedAdjacency(object):
+    """The single graph of a double-stranded assembly graph, as a view of
+       the AdjacencyArrays of its double graph.
+
+       Single node k is the fold of double nodes 2k and 2k + 1, and each arc
+       (i.e. each edge in the double graph that isn't an implied edge)
+       becomes an edge from the fold of its source to the fold of its
+       target. Within each node's successors (or predecessors), edges are
+       kept in the order their arcs were added in.
+
+       The folded graph's own CSR arrays are only built the first time they
+       (or the adjacencies/degrees of a node) are needed, after which
+       looking up a node's adjacencies is as fast as in the double graph.
+    """
+
+    def __init__(self, double, edge_implied):
+        """Initializes the view, given the double graph's AdjacencyArrays and
+           a NumPy boolean array indicating which of its edges are implied.
+        """
+        self.double = double
+        self.edge_implied = edge_implied
+        self.node_count = double.node_count >> 1
+        self.folded_arrays = None
+
+    def arrays(self):
+        """Returns the AdjacencyArrays of the folded graph, building them
+           from the double graph's arrays if this hasn't been done yet.
+        """
+        if self.folded_arrays is None:
+            d = self.double
+            # Get the source and target of each edge in the double graph, by
+            # its position, and keep just the arcs (which are in the order
+            # they were added in)
+            sources = numpy.empty(d.edge_count, dtype=numpy.int32)
+            sources[d.out_edges] = numpy.repeat(
+                numpy.arange(d.node_count, dtype=numpy.int32), d.out_degrees)
+            targets = numpy.empty(d.edge_count, dtype=numpy.int32)
+            targets[d.out_edges] = d.out_targets
+            arcs = ~self.edge_implied
+            self.folded_arrays = AdjacencyArrays(self.node_count,
+                sources[arcs] >> 1, targets[arcs] >> 1)
+        return self.folded_arrays
+
+    @property
+    def out_degrees(self):
+        """A NumPy array of the number of edges from each node."""
+        return self.arrays().out_degrees
+
+    @property
+    def in_degrees(self):
+        """A NumPy array of the number of edges to each node."""
+        return self.arrays().in_degrees
+
+    def successors(self, k):
+        """Returns a list of the indices that node k has edges to."""
+        return self.arrays().successors(k)
+
+    def predecessors(self, k):
+        """Returns a list of the indices that have edges to node k."""
+        return self.arrays().predecessors(k)
+
+class DisjointSets(object):
+    """A union-find structure over the integer indices 0, 1, ..., used to
+       track the connected components (ignoring edge directionality) of a
+       graph while its edges are being added.
+
+       Uses union by size and path halving, so any sequence of n add() and
+       m union() calls runs in O((n + m) * alpha(n)) time.
+    """
+
+    def __init__(self):
+        """Initializes an empty structure."""
+        self.parents = array("i")
+        self.sizes = array("i")
+
+    def add(self):
+        """Adds a new element in a set of its own, and returns its index."""
+        i = len(self.parents)
+        self.parents.append(i)
+        self.sizes.append(1)
+        return i
+
+    def find(self, i):
+        """Returns the index of the representative of i's set."""
+        parents = self.parents
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def union(self, i, j):
+        """Merges the sets containing i and j."""
+        i = self.find(i)
+        j = self.find(j)
+        if i == j:
+            return
+        if self.sizes[i] < self.sizes[j]:
+            i, j = j, i
+        self.parents[j] = i
+        self.sizes[i] += self.sizes[j]
+
+    def components(self):
+        """Returns a list of NumPy arrays of the elements in each set. Each
+           array is in ascending order, and the arrays are ordered by their
+           smallest elements.
+        """
+        if len(self.parents) == 0:
+            return []
+        # Point every element directly at its representative
+        roots = numpy.frombuffer(self.parents, dtype=numpy.int32)
+        while True:
+            grandparents = roots[roots]
+            if numpy.array_equal(grandparents, roots):
+                break
+            roots = grandparents
+        # A stable sort keeps each set's elements in ascending order
+        order = numpy.argsort(roots, kind="mergesort").astype(numpy.int32)
+        boundaries = numpy.flatnonzero(numpy.diff(roots[order])) + 1
+        sets = numpy.split(order, boundaries)
+        sets.sort(key=lambda elements: elements[0])
+        return sets
+
+class Unitigs(object):
+    """The unitigs (maximal non-branching paths) of a graph, found in one
+       pass over the degree arrays of its AdjacencyArrays.
+
+       An edge from i to j is "compactable" if i has exactly one outgoing
+       edge, j has exactly one incoming edge, and i != j. Each unitig is a
+       maximal path of nodes joined by compactable edges -- or a cycle, if
+       every edge around it is compactable -- and every node is in exactly
+       one unitig (possibly just by itself).
+
+       The members of unitig u are members[offsets[u]:offsets[u + 1]], in
+       order from start to end; unitig_of and positions give the unitig
+       that each node is in and its position in members.
+    """
+
+    def __init__(self, graph):
+        """Finds the unitigs of the given AdjacencyArrays."""
+        self.graph = graph
+        node_count = graph.node_count
+        # Find the compactable edge (if any) from each node
+        nexts = numpy.full(node_count, -1, dtype=numpy.int64)
+        prevs = numpy.full(node_count, -1, dtype=numpy.int64)
+        candidates = numpy.flatnonzero(graph.out_degrees == 1)
+        targets = graph.out_targets[graph.out_offsets[candidates]]
+        compactable = (graph.in_degrees[targets] == 1) & \
+            (targets != candidates)
+        nexts[candidates[compactable]] = targets[compactable]
+        prevs[targets[compactable]] = candidates[compactable]
+        # Walk along the compactable edges from the start of each path, and
+        # then around each cycle that's left over
+        nexts = nexts.tolist()
+        members = []
+        offsets = [0]
+        cyclic = []
+        seen = numpy.zeros(node_count, dtype=bool)
+        for i in numpy.flatnonzero(prevs == -1).tolist():
+            while i != -1:
+                members.append(i)
+                i = nexts[i]
+            offsets.append(len(members))
+            cyclic.append(False)
+        seen[members] = True
+        for i in numpy.flatnonzero(~seen).tolist():
+            if seen[i]:
+                continue
+            j = i
+            while not seen[j]:
+                seen[j] = True
+                members.append(j)
+                j = nexts[j]
+            offsets.append(len(members))
+            cyclic.append(True)
+        self.members = numpy.array(members, dtype=numpy.int32)
+        self.offsets = numpy.array(offsets, dtype=numpy.int64)
+        self.cyclic = numpy.array(cyclic, dtype=bool)
+        lengths = numpy.diff(self.offsets)
+        self.unitig_of = numpy.empty(node_count, dtype=numpy.int32)
+        self.unitig_of[self.members] = numpy.repeat(
+            numpy.arange(len(lengths), dtype=numpy.int32), lengths)
+        self.positions = numpy.empty(node_count, dtype=numpy.int64)
+        self.positions[self.members] = numpy.arange(len(self.members))
+
+    def run(self, i, used):
+        """Returns a 2-tuple of a list of the indices of the nodes in the
+           longest stretch of i's unitig that includes i and no other node j
+           for which used(j) is True (in order from start to end), and
+           whether or not the last of these nodes has an edge to the first.
+
+           This only visits the nodes in the stretch (and the used nodes
+           bounding it), so finding the stretches of every node in a unitig
+           takes time linear in the unitig's length.
+        """
+        members = self.members
+        u = self.unitig_of[i]
+        first = self.offsets[u]
+        last = self.offsets[u + 1] - 1
+        p = self.positions[i]
+        if self.cyclic[u]:
+            length = last - first + 1
+            q = p - first
+            # Walk around the cycle in both directions until we reach a used
+            # node, or come back to i
+            f = 1
+            while f < length and not used(members[first + (q + f) % length]):
+                f += 1
+            if f == length:
+                return [int(members[first + (q + k) % length])
+                    for k in xrange(length)], True
+            b = 0
+            while not used(members[first + (q - b - 1) % length]):
+                b += 1
+            return [int(members[first + (q + k) % length])
+                for k in xrange(-b, f)], False
+        end = p
+        while end < last and not used(members[end + 1]):
+            end += 1
+        start = p
+        while start > first and not used(members[start - 1]):
+            start -= 1
+        run = members[start:end + 1].tolist()
+        loops = False
+        if end == last:
+            graph = self.graph
+            loops = bool((graph.out_targets[graph.out_offsets[run[-1]]:
+                graph.out_offsets[run[-1] + 1]] == run[0]).any())
+        return run, loops
+
+    def linear_cycles(self):
+        """Returns a list of the "linear cycles" in the graph, each of which
+           is a list of the indices of its nodes in order around the cycle.
+
+           A node with an edge to itself is always a linear cycle by itself.
+           Otherwise, a linear cycle is either a cyclic unitig, or a unitig
+           of at least two nodes whose last node has an edge to its first
+           node: that is, a cycle in which only the first node can have
+           other incoming edges and only the last node can have other
+           outgoing edges. (This is essentially a chain that ends
+           cyclically.)
+
+           This takes time linear in the size of the graph.
+        """
+        graph = self.graph
+        sources = numpy.repeat(numpy.arange(graph.node_count),
+            graph.out_degrees)
+        targets = graph.out_targets
+        cycles = [[i] for i in
+            numpy.unique(sources[sources == targets]).tolist()]
+        # Find the edges from the last node of a unitig to its first node
+        unitigs = self.unitig_of[sources]
+        closing = (self.positions[sources] == self.offsets[unitigs + 1] - 1) \
+            & (targets == self.members[self.offsets[unitigs]]) & \
+            (sources != targets)
+        cyclic = self.cyclic.copy()
+        cyclic[unitigs[closing]] = True
+        offsets = self.offsets.tolist()
+        for u in numpy.flatnonzero(cyclic).tolist():
+            cycles.append(self.members[offsets[u]:offsets[u + 1]].tolist())
+        return cycles
+
+class Superbubbles(object):
+    """The superbubbles of a graph, found in time linear in the size of its
+       AdjacencyArrays (following Brankovic et al., "Linear-time superbubble
+       identification algorithm for genome assembly", 2016).
+
+       A superbubble (Onodera et al., 2013) is a pair of an entrance node s
+       and an exit node t != s, along with the set U of nodes between them,
+       such that: every node reachable from s without passing through t is
+       in U, and so is every node that can reach t without passing through
+       s; the subgraph induced by U is acyclic; and no other node in U
+       besides t forms such a pair with s. Superbubbles that are just a
+       path from s to t aren't kept, since they don't have any "bubble" to
+       them.
+
+       Superbubbles are found by a DFS whose roots are taken in topological
+       order of the graph's strongly connected components. Removing the
+       back edges of this DFS gives a DAG, and in the reverse postorder of
+       the DFS every superbubble whose entrance was discovered before the
+       rest of its nodes becomes an interval [i, j] in which no edge from
+       [i, j) leaves the interval and no edge into (i, j] enters it. These
+       intervals are found with two stack-based sweeps over the positions,
+       and then checked against the back edges that were removed.
+
+       The only superbubbles whose entrance isn't discovered first are ones
+       containing the root of a strongly connected component that has no
+       incoming edges from other components (and that isn't just a single
+       node without a self-loop) -- and these superbubbles lie entirely
+       within that component. So the search is repeated on the reverse of
+       the subgraph made of these components, in which each component is
+       entered through a node with an edge leaving it (rather than at a
+       root).
+
+       A component with no edges to or from the rest of the graph can't be
+       entered from outside of it in either search, so both searches start
+       at the same node r of it instead: together, they then only miss the
+       superbubbles that have r as an interior node. Each of these
+       superbubbles lies around the cycles through r, and so both searches
+       are repeated from a second node of the component that no
+       superbubble containing r has as an interior node (see
+       cycle_cut()).
+
+       Superbubbles are kept in ascending order of size, so that each one
+       comes before the superbubbles containing it. entrances[b] and
+       exits[b] are the entrance and exit of superbubble b, members[b] is a
+       NumPy array of its nodes in topological order (starting at the
+       entrance and ending at the exit), and parents[b] is the innermost
+       superbubble that b is nested within (i.e. that has b's entrance as
+       one of its interior nodes), or -1 if there isn't one.
+    """
+
+    def __init__(self, graph):
+        """Finds the superbubbles of the given AdjacencyArrays."""
+        self.graph = graph
+        node_count = graph.node_count
+        component, component_count = graph.strongly_connected_components()
+        # Components are numbered in reverse topological order, so sorting
+        # the nodes by descending component number makes the roots of the
+        # forward search the first node of each component that doesn't have
+        # incoming edges from other components
+        forward_roots = numpy.argsort(-component, kind="mergesort")
+        found = {}
+        for s, t, members in self.search(graph.out_offsets,
+                graph.out_targets, forward_roots):
+            found[(s, t)] = members
+        # Find the components that the reverse search needs to cover
+        sources = numpy.repeat(numpy.arange(node_count), graph.out_degrees)
+        targets = graph.out_targets
+        internal = component[sources] == component[targets]
+        nontrivial = numpy.bincount(component[sources[internal]],
+            minlength=component_count) > 0
+        entered = numpy.bincount(component[targets[~internal]],
+            minlength=component_count) > 0
+        left = numpy.bincount(component[sources[~internal]],
+            minlength=component_count) > 0
+        # The root of the forward search in each component with no edges to
+        # or from other components, which is its first node
+        first = numpy.full(component_count, node_count, dtype=numpy.int64)
+        numpy.minimum.at(first, component, numpy.arange(node_count))
+        isolated_roots = first[numpy.flatnonzero(nontrivial & ~entered &
+            ~left)]
+        selected = (nontrivial & ~entered)[component]
+        subgraph_nodes = numpy.flatnonzero(selected)
+        if len(subgraph_nodes) > 0:
+            # Nodes outside of the subgraph are all represented by a single
+            # "outside" node, which is the first root of the reverse search.
+            # (None of the subgraph's components have incoming edges from
+            # outside of it, so it only has edges to the outside node.)
+            outside = len(subgraph_nodes)
+            local = numpy.full(node_count, outside, dtype=numpy.int64)
+            local[subgraph_nodes] = numpy.arange(outside)
+            kept = selected[sources]
+            reverse = AdjacencyArrays(outside + 1, local[targets[kept]],
+                local[sources[kept]])
+            # Components that the outside node can't reach are searched from
+            # the same root as in the forward search
+            reverse_roots = numpy.concatenate(([outside],
+                local[isolated_roots], numpy.arange(outside - 1, -1, -1)))
+            for t, s, members in self.search(reverse.out_offsets,
+                    reverse.out_targets, reverse_roots):
+                if t == outside:
+                    continue
+                s = int(subgraph_nodes[s])
+                t = int(subgraph_nodes[t])
+                if (s, t) not in found:
+                    found[(s, t)] = subgraph_nodes[members[::-1]]
+        # Search the components with no edges to or from other components
+        # again in both directions, from a second root
+        offsets_list = graph.out_offsets.tolist()
+        targets_list = targets.tolist()
+        cuts = [self.cycle_cut(offsets_list, targets_list, root)
+            for root in isolated_roots.tolist()]
+        cuts = numpy.array([c for c in cuts if c != -1], dtype=numpy.int64)
+        if len(cuts) > 0:
+            selected = numpy.zeros(component_count, dtype=bool)
+            selected[component[cuts]] = True
+            selected = selected[component]
+            subgraph_nodes = numpy.flatnonzero(selected)
+            local = numpy.empty(node_count, dtype=numpy.int64)
+            local[subgraph_nodes] = numpy.arange(len(subgraph_nodes))
+            kept = selected[sources]
+            roots = numpy.concatenate((local[cuts],
+                numpy.arange(len(subgraph_nodes))))
+            for backwards in (False, True):
+                ends = (local[sources[kept]], local[targets[kept]])
+                if backwards:
+                    ends = ends[::-1]
+                subgraph = AdjacencyArrays(len(subgraph_nodes), *ends)
+                for s, t, members in self.search(subgraph.out_offsets,
+                        subgraph.out_targets, roots):
+                    if backwards:
+                        s, t, members = t, s, members[::-1]
+                    s = int(subgraph_nodes[s])
+                    t = int(subgraph_nodes[t])
+                    if (s, t) not in found:
+                        found[(s, t)] = subgraph_nodes[members]
+        pairs = found.keys()
+        self.members = [found[p] for p in pairs]
+        entrances = numpy.array([p[0] for p in pairs], dtype=numpy.int32)
+        exits = numpy.array([p[1] for p in pairs], dtype=numpy.int32)
+        sizes = numpy.array([len(m) for m in self.members], dtype=numpy.int64)
+        order = numpy.lexsort((exits, entrances, sizes))
+        self.entrances = entrances[order]
+        self.exits = exits[order]
+        self.members = [self.members[b] for b in order]
+        # Superbubbles are laminar, so labelling the interior nodes of every
+        # superbubble from the largest to the smallest leaves each node
+        # labelled with the innermost superbubble it's inside
+        innermost = numpy.full(node_count, -1, dtype=numpy.int32)
+        for b in xrange(len(order) - 1, -1, -1):
+            innermost[self.members[b][1:-1]] = b
+        self.parents = innermost[self.entrances]
+
+    def __len__(self):
+        return len(self.members)
+
+    def depths(self):
+        """Returns a NumPy array of how many superbubbles each superbubble
+           is nested within.
+        """
+        depths = numpy.zeros(len(self.members), dtype=numpy.int32)
+        parents = self.parents.tolist()
+        # Parents are larger than their children, so they come later
+        for b in xrange(len(parents) - 1, -1, -1):
+            if parents[b] != -1:
+                depths[b] = depths[parents[b]] + 1
+        return depths
+
+    @staticmethod
+    def cycle_cut(offsets, targets, root):
+        """Returns a node of the strongly connected component containing
+           root (which has no edges to or from other components) that isn't
+           an interior node of any superbubble with root as an interior
+           node, or -1 if there are no such superbubbles. offsets and
+           targets are lists of the CSR arrays of the graph.
+
+           Cutting the component at root -- so that root's out-edges leave
+           from a source and its in-edges go to a sink -- leaves a graph in
+           which every path from the source to the sink passes through the
+           same sequence of nodes d_1, ..., d_m: these are the nodes on
+           every cycle through root. A superbubble (s, t) with root as an
+           interior node has t = d_i and s = d_j, for some i < j, and its
+           nodes outside of the superbubble lie between them; the cut graph
+           also has to have a cycle through t and s, since otherwise s and
+           root would form a smaller superbubble. If d_k is the last of
+           these nodes such that the nodes reachable from the source without
+           passing through d_k don't include a cycle, then k >= i for the
+           outermost such superbubble, and d_k either lies between t and s
+           (inclusive) or is on every path from s to t in it -- in which
+           case there aren't any superbubbles containing both root and d_k
+           as interior nodes, so d_k can be returned either way.
+        """
+        # Find a path from root to a node with an edge back to root
+        parent = {root: None}
+        stack = [root]
+        last = None
+        while last is None:
+            v = stack.pop()
+            for w in targets[offsets[v]:offsets[v + 1]]:
+                if w == root:
+                    last = v
+                    break
+                if w not in parent:
+                    parent[w] = v
+                    stack.append(w)
+        path = []
+        while last is not None:
+            path.append(last)
+            last = parent[last]
+        path.reverse()
+        # The nodes on every cycle through root are the nodes on the path
+        # that can't be skipped over by a detour from earlier in the path
+        # (root's position at the end of the path is len(path))
+        position = dict((v, i) for i, v in enumerate(path))
+        seen = set(path)
+        furthest = 0
+        cut_nodes = []
+        for i, v in enumerate(path):
+            if i > 0 and furthest <= i:
+                cut_nodes.append(v)
+            stack = [v]
+            while stack:
+                u = stack.pop()
+                for w in targets[offsets[u]:offsets[u + 1]]:
+                    if w == root:
+                        furthest = len(path)
+                    elif w in position:
+                        furthest = max(furthest, position[w])
+                    elif w not in seen:
+                        seen.add(w)
+                        stack.append(w)
+        # Label each node with the number of these nodes that every path
+        # from root to it passes through
+        label = {root: 0}
+        for k in xrange(len(cut_nodes) + 1):
+            start = cut_nodes[k - 1] if k > 0 else root
+            end = cut_nodes[k] if k < len(cut_nodes) else None
+            label[start] = k
+            stack = [start]
+            while stack:
+                u = stack.pop()
+                for w in targets[offsets[u]:offsets[u + 1]]:
+                    if w != root and w != end and w not in label:
+                        label[w] = k
+                        stack.append(w)
+        # A cycle made of nodes with labels <= k first appears at the
+        # smallest k with an edge from a node labelled k to an earlier
+        # label, or with a cycle among the nodes labelled k (which Kahn's
+        # algorithm leaves nodes of behind)
+        first_cyclic = len(cut_nodes) + 1
+        indegree = dict((u, 0) for u in label)
+        for u, k in label.iteritems():
+            for w in targets[offsets[u]:offsets[u + 1]]:
+                if w == root:
+                    continue
+                if label[w] < k:
+                    first_cyclic = min(first_cyclic, k)
+                elif label[w] == k:
+                    indegree[w] += 1
+        queue = [u for u, d in indegree.iteritems() if d == 0]
+        while queue:
+            u = queue.pop()
+            del indegree[u]
+            for w in targets[offsets[u]:offsets[u + 1]]:
+                if w in indegree and label[w] == label[u]:
+                    indegree[w] -= 1
+                    if indegree[w] == 0:
+                        queue.append(w)
+        for u in indegree:
+            first_cyclic = min(first_cyclic, label[u])
+        if 0 < first_cyclic <= len(cut_nodes):
+            return cut_nodes[first_cyclic - 1]
+        return -1
+
+    @staticmethod
+    def search(offsets, targets, roots):
+        """Returns a list of 3-tuples (entrance, exit, members) of the
+           superbubbles found using a DFS of the graph whose edges are
+           described by the given CSR arrays, trying roots in the order
+           given by roots (see the docstring of this class). members is a
+           NumPy array of the nodes in the superbubble in topological order.
+        """
+        node_count = len(offsets) - 1
+        offsets_list = offsets.tolist()
+        targets_list = targets.tolist()
+        # Find the postorder of the DFS, and the back edges (by position in
+        # targets) that it finds. State 1 means a node is on the DFS path,
+        # and state 2 means it's been finished.
+        state = [0] * node_count
+        postorder = []
+        back_edges = []
+        for root in roots.tolist():
+            if state[root] != 0:
+                continue
+            state[root] = 1
+            path = [root]
+            next_edges = [offsets_list[root]]
+            while path:
+                v = path[-1]
+                e = next_edges[-1]
+                end = offsets_list[v + 1]
+                while e < end:
+                    w = targets_list[e]
+                    if state[w] == 0:
+                        break
+                    if state[w] == 1:
+                        back_edges.append(e)
+                    e += 1
+                else:
+                    state[v] = 2
+                    postorder.append(v)
+                    path.pop()
+                    next_edges.pop()
+                    continue
+                next_edges[-1] = e + 1
+                state[w] = 1
+                path.append(w)
+                next_edges.append(offsets_list[w])
+        order = numpy.array(postorder[::-1], dtype=numpy.int32)
+        positions = numpy.empty(node_count, dtype=numpy.int64)
+        positions[order] = numpy.arange(node_count)
+        sources = numpy.repeat(numpy.arange(node_count, dtype=numpy.int32),
+            numpy.diff(offsets))
+        back = numpy.zeros(len(targets), dtype=bool)
+        back[back_edges] = True
+        forward_sources = positions[sources[~back]]
+        forward_targets = positions[targets[~back]]
+        # The furthest child and the nearest parent of each position in the
+        # DAG, or node_count and -1 if it has no children or parents
+        furthest_child = numpy.full(node_count, -1, dtype=numpy.int64)
+        numpy.maximum.at(furthest_child, forward_sources, forward_targets)
+        furthest_child[furthest_child == -1] = node_count
+        nearest_parent = numpy.full(node_count, node_count, dtype=numpy.int64)
+        numpy.minimum.at(nearest_parent, forward_targets, forward_sources)
+        nearest_parent[nearest_parent == node_count] = -1
+        furthest_child = furthest_child.tolist()
+        nearest_parent = nearest_parent.tolist()
+        # Sweep from right to left to find, for each entrance position i,
+        # the first position j > i such that no edge from [i, j) goes past
+        # j. The stack holds the positions that are still candidates, with
+        # the nearest on top.
+        exit_of = [-1] * node_count
+        stack = []
+        for i in xrange(node_count - 1, -1, -1):
+            if i + 1 < node_count:
+                stack.append(i + 1)
+            child = furthest_child[i]
+            while stack and stack[-1] < child:
+                stack.pop()
+            if stack:
+                exit_of[i] = stack[-1]
+        # Sweep from left to right to check, for each candidate interval
+        # [i, j], that no edge into (i, j] comes from before i. Here the
+        # stack holds the entrance positions that are still valid for j.
+        entrances_of = [[] for j in xrange(node_count)]
+        for i, j in enumerate(exit_of):
+            if j != -1:
+                entrances_of[j].append(i)
+        valid = [False] * node_count
+        stack = []
+        intervals = []
+        for j in xrange(node_count):
+            if j > 0:
+                stack.append(j - 1)
+                valid[j - 1] = True
+            parent = nearest_parent[j]
+            while stack and stack[-1] > parent:
+                valid[stack.pop()] = False
+            for i in entrances_of[j]:
+                if valid[i]:
+                    intervals.append((i, j))
+        # Each interval is a superbubble of the DAG; it's only a superbubble
+        # of the graph if no back edge starts in [i, j) or ends in (i, j],
+        # there isn't an edge from its exit to its entrance, and it isn't
+        # just a path (i.e. a node in [i, j) has two different children)
+        def prefix_counts(values):
+            counts = numpy.zeros(node_count + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(values, minlength=node_count),
+                out=counts[1:])
+            return counts.tolist()
+        back_tails = prefix_counts(positions[sources[back]])
+        back_heads = prefix_counts(positions[targets[back]])
+        distinct_sources = numpy.unique(
+            sources.astype(numpy.int64) * node_count + targets) // node_count
+        distinct_degrees = numpy.bincount(distinct_sources,
+            minlength=node_count)
+        branching = prefix_counts(positions[numpy.flatnonzero(
+            distinct_degrees > 1)])
+        superbubbles = []
+        for i, j in intervals:
+            if back_tails[j] != back_tails[i] or \
+                    back_heads[j + 1] != back_heads[i + 1] or \
+                    branching[j] == branching[i]:
+                continue
+            s = int(order[i])
+            t = int(order[j])
+            if s in targets_list[offsets_list[t]:offsets_list[t + 1]]:
+                continue
+            superbubbles.append((s, t, order[i:j + 1]))
+        return superbubbles
+
+class GraphCore(object):
+    """The structure of an assembly graph, with nodes stored as integer
+       indices. See the comments at the top of this file for details.
+
+       Nodes and edges are added while parsing the assembly graph file;
+       finalize() should be called once all of them have been added, after
+       which self.double (the double graph's AdjacencyArrays) and
+       self.single (the single graph's FoldedAdjacency view of them, or just
+       self.double if this graph isn't double-stranded) are available.
+       self.double_sets and self.single_sets (the DisjointSets of the double
+       and single graphs' nodes) are kept up to date throughout, and
+       finalize() also finds self.unitigs (the Unitigs of the double graph).
+    """
+
+    def __init__(self, double_stranded):
+        """Initializes an empty graph. If double_stranded is True, each node
+           added has a reverse complement node and each edge added implies a
+           reverse complement edge.
+        """
+        self.double_stranded = double_stranded
+        # Maps node ID strings to indices
+        self.id2index = {}
+        # The Node objects corresponding to each index, in the double graph
+        # and in the single graph
+        self.nodes = []
+        self.single_nodes = []
+        # Attributes of each sequence (i.e. of each node in the single
+        # graph), by index. Depths that weren't given are stored as NaN.
+        self.lengths = array("l")
+        self.depths = array("d")
+        # The G/C contents of each node in the double graph, by index (these
+        # can differ between the two strands of a sequence in LastGraph
+        # files). G/C contents that weren't given are stored as NaN.
+        self.gc_contents = array("d")
+        # The arcs given in the assembly graph file, in the order they were
+        # added, and their attributes
+        self.sources = array("i")
+        self.targets = array("i")
+        self.multiplicities = array("l")
+        self.means = array("d")
+        self.stdevs = array("d")
+        # Arc orientations (only given in GML files) are stored as indices
+        # into self.orientations, which contains each distinct orientation
+        self.orientations = [None]
+        self.orientation_indices = array("b")
+        self.double = None
+        self.single = None
+        # The connected components of the double and single graphs, updated
+        # as each node and arc is added
+        self.double_sets = DisjointSets()
+        self.single_sets = DisjointSets() if double_stranded else \
+            self.double_sets
+        # For each edge in the double graph (by its position in the arrays
+        # that self.double was built from), the arc that it is or that
+        # implies it, and whether or not it's an implied edge
+        self.edge_arcs = None
+        self.edge_implied = None
+        self.unitigs = None
+
+    def add_node(self, n, rc=None, single_node=None):
+        """Adds a node to the graph, given its Node object (and, if this
+           graph is double-stranded, the Node object of its reverse
+           complement), and the Node object representing it in the single
+           graph. Returns the index of n.
+
+           (This doesn't check for duplicate node IDs; collate.py does that
+           when adding nodes to nodeid2obj.)
+        """
+        for m in (n, rc):
+            if m is None:
+                continue
+            m.index = self.double_sets.add()
+            m.core = self
+            self.id2index[m.id_string] = m.index
+            self.nodes.append(m)
+            self.gc_contents.append(numpy.nan if m.gc_content is None else
+                m.gc_content)
+        single_node.index = len(self.single_nodes)
+        if self.double_stranded:
+            self.single_sets.add()
+        single_node.core = self
+        self.single_nodes.append(single_node)
+        self.lengths.append(n.bp)
+        self.depths.append(numpy.nan if n.depth is None else n.depth)
+        return n.index
+
+    def add_edge(self, source_id, target_id, multiplicity=None,
+            orientation=None, mean=None, stdev=None):
+        """Adds an arc from the node with ID source_id to the node with ID
+           target_id.
+
+           If this graph is double-stranded, this arc implies an edge from
+           the reverse complement of the target to the reverse complement of
+           the source, unless the arc implies itself (see issue #105 on
+           GitHub for context). Returns True if this arc implies another
+           edge, and False otherwise.
+
+           Raises a KeyError if either node hasn't been added yet.
+        """
+        i1 = self.id2index[source_id]
+        i2 = self.id2index[target_id]
+        if multiplicity is None:
+            multiplicity = NO_MULTIPLICITY
+        if mean is None:
+            mean = numpy.nan
+        if stdev is None:
+            stdev = numpy.nan
+        try:
+            o = self.orientations.index(orientation)
+        except ValueError:
+            o = len(self.orientations)
+            self.orientations.append(orientation)
+        self.sources.append(i1)
+        self.targets.append(i2)
+        self.multiplicities.append(multiplicity)
+        self.orientation_indices.append(o)
+        self.means.append(mean)
+        self.stdevs.append(stdev)
+        self.double_sets.union(i1, i2)
+        if self.double_stranded:
+            self.double_sets.union(i2 ^ 1, i1 ^ 1)
+            self.single_sets.union(i1 >> 1, i2 >> 1)
+        # The implied edge is the same edge if i1 == i2 ^ 1 (e.g. 5 -> -5)
+        return self.double_stranded and i1 != i2 ^ 1
+
+    def edge_values(self, e):
+        """Returns a 4-tuple of the multiplicity, orientation, mean, and
+           stdev of the edge at position e in the double graph (see
+           self.edge_arcs), with None for values that weren't given.
+
+           Implied edges only get the multiplicity of the arc they're
+           implied by.
+        """
+        a = self.edge_arcs[e]
+        multiplicity = self.multiplicities[a]
+        if multiplicity == NO_MULTIPLICITY:
+            multiplicity = None
+        if self.edge_implied[e]:
+            return multiplicity, None, None, None
+        mean = self.means[a]
+        stdev = self.stdevs[a]
+        return (multiplicity,
+            self.orientations[self.orientation_indices[a]],
+            None if mean != mean else mean, None if stdev != stdev else stdev)
+
+    def finalize(self):
+        """Builds the CSR arrays for the double graph from the arcs that
+           have been added, and sets up the single graph as a view of them.
+
+           In the double graph, each arc is immediately followed by the edge
+           it implies (if any), so edges are in the same order as they would
+           be if every implied edge had been stored right after its arc.
+        """
+        sources = numpy.frombuffer(self.sources, dtype=numpy.int32)
+        targets = numpy.frombuffer(self.targets, dtype=numpy.int32)
+        arc_count = len(sources)
+        if self.double_stranded:
+            positions = numpy.arange(2 * arc_count, dtype=numpy.int32)
+            # Interleave the arcs and the edges they imply, then remove the
+            # "implied" edges of self-implying arcs
+            keep = numpy.ones(2 * arc_count, dtype=bool)
+            keep[1::2] = sources != targets ^ 1
+            double_sources = numpy.column_stack((sources, targets ^ 1)) \
+                .ravel()[keep]
+            double_targets = numpy.column_stack((targets, sources ^ 1)) \
+                .ravel()[keep]
+            self.edge_arcs = (positions >> 1)[keep]
+            self.edge_implied = (positions & 1)[keep].astype(bool)
+            self.double = AdjacencyArrays(len(self.nodes), double_sources,
+                double_targets)
+            self.single = FoldedAdjacency(self.double, self.edge_implied)
+        else:
+            self.edge_arcs = numpy.arange(arc_count, dtype=numpy.int32)
+            self.edge_implied = numpy.zeros(arc_count, dtype=bool)
+            # The single graph has the same structure as the double graph
+            self.double = AdjacencyArrays(len(self.nodes), sources, targets)
+            self.single = self.double
+        self.unitigs = Unitigs(self.double)
+
+    def graph_of(self, n):
+        """Returns a 2-tuple of the adjacencies and the list of Node
+           objects of the graph (double or single) that the Node n is in.
+        """
+        if n.is_single:
+            return self.single, self.single_nodes
+        return self.double, self.nodes
+
+    def successor_nodes(self, n):
+        """Returns a list of the Node objects that n has edges to."""
+        graph, nodes = self.graph_of(n)
+        return [nodes[j] for j in graph.successors(n.index)]
+
+    def predecessor_nodes(self, n):
+        """Returns a list of the Node objects that have edges to n."""
+        graph, nodes = self.graph_of(n)
+        return [nodes[j] for j in graph.predecessors(n.index)]
+
+    def out_degree(self, n):
+        """Returns the number of edges from the Node n."""
+        graph, nodes = self.graph_of(n)
+        return int(graph.out_degrees[n.index])
+
+    def in_degree(self, n):
+        """Returns the number of edges to the Node n."""
+        graph, nodes = self.graph_of(n)
+        return int(graph.in_degrees[n.index])
+
+    def outgoing_edges(self, n):
+        """Returns a list of 5-tuples describing each edge from the Node n:
+           (target Node, multiplicity, orientation, mean, stdev), with None
+           for values that weren't given.
+
+           Edges in the single graph don't have any of these values.
+        """
+        if n.is_single:
+            return [(m, None, None, None, None)
+                for m in self.successor_nodes(n)]
+        targets, positions = self.double.out_edge_slice(n.index)
+        return [(self.nodes[j],) + self.edge_values(e)
+            for j, e in zip(targets, positions)]
+
+    def components(self, sets):
+        """Generator that yields a list of the indices of the nodes in each
+           connected component described by the given DisjointSets
+           (self.double_sets or self.single_sets), ordered as in
+           DisjointSets.components().
+        """
+        for node_indices in sets.components():
+            yield node_indices.tolist()
+
+    def links_chunks(self, graph, node_ids, order=None):
+        """Generator that yields the contents of a links file (as used as
+           input to the SPQR script) describing every edge in the given graph
+           (self.double or self.single), where node_ids is a list of the ID
+           string of each node in that graph. The contents are yielded in
+           chunks of at most config.LINKS_CHUNK_SIZE edges, so the entire
+           file never has to be stored in memory at once.
+
+           Edges are listed by source node, in order of the source nodes'
+           indices -- or in the order of the indices in order, if given
+           (which should contain each index in the graph exactly once). The
+           numbering of the bicomponents that the SPQR script outputs
+           depends on this order.
+        """
+        if order is None:
+            order = numpy.arange(graph.node_count)
+        else:
+            order = numpy.array(order, dtype=numpy.int64)
+        if isinstance(graph, FoldedAdjacency):
+            # Sort the (folded) arcs by their sources' positions in order,
+            # keeping arcs with the same source in the order they were added
+            sources = numpy.frombuffer(self.sources, dtype=numpy.int32) >> 1
+            targets = numpy.frombuffer(self.targets, dtype=numpy.int32) >> 1
+            ranks = numpy.empty(graph.node_count, dtype=numpy.int64)
+            ranks[order] = numpy.arange(graph.node_count)
+            arc_order = numpy.argsort(ranks[sources], kind="mergesort")
+            sources = sources[arc_order]
+            targets = targets[arc_order]
+        else:
+            # Get the position in out_targets of each source's edges, in
+            # order
+            counts = graph.out_degrees[order]
+            starts = graph.out_offsets[order]
+            run_starts = numpy.cumsum(counts) - counts
+            positions = numpy.arange(counts.sum()) + \
+                numpy.repeat(starts - run_starts, counts)
+            sources = numpy.repeat(order, counts)
+            targets = graph.out_targets[positions]
+        ids = numpy.array(node_ids, dtype=object)
+        for c in xrange(0, len(sources), config.LINKS_CHUNK_SIZE):
+            chunk = slice(c, c + config.LINKS_CHUNK_SIZE)
+            # (the other values we add are just dummy values -- they don't
+            # impact the biconnected components/SPQR trees that we obtain
+            # from the script)
+            yield "".join("%s\tB\t%s\tB\t0\t0\t0\n" % edge
+                for edge in zip(ids[sources[chunk]], ids[targets[chunk]]))
@@ -31,6 +31,13 @@ class Edge(object):
        and, if applicable for this type of assembly file, biological
        metadata (e.g. multiplicity).
     """
+    # Assembly graphs can contain millions of edges, so we use __slots__ to
+    # avoid giving each Edge its own __dict__
+    __slots__ = ("source_id", "target_id", "multiplicity", "orientation",
+        "mean", "stdev", "thickness", "is_outlier", "group",
+        "component_size_rank", "xdot_ctrl_pt_str", "xdot_ctrl_pt_count",
+        "xdot_rel_ctrl_pt_str", "is_virtual")
+
     def __init__(self, source_id, target_id, multiplicity=None,
             orientation=None, mean=None, stdev=None, is_virtual=False):
         """Initializes the edge and all of its attributes."""
@@ -152,10 +159,45 @@ class Edge(object):
     def __repr__(self):
         return "Edge from %s to %s" % (self.source_id, self.target_id)
 
+class SPQRRecord(object):
+    """Data about a node that's only used in the SPQR-integrated view of the
+       graph.
+
+       Most nodes (e.g. all nodes in the double graph of a LastGraph/GFA
+       file) never need this data, so it's only allocated for a node once
+       it's actually used (see Node.spqr_record()).
+    """
+    __slots__ = ("parent_spqrnode2relpos", "parent_bicomponents", "xdot_ix",
+        "xdot_iy")
+
+    def __init__(self):
+        # There should be m + 1 entries in this thing, where m = # of
+        # metanodes in the SPQR tree that this node is in. The + 1 is for the
+        # parent bicomponent of this node.
+        self.parent_spqrnode2relpos = {}
+        # Indicates the Bicomponent(s) in which this node is present
+        self.parent_bicomponents = set()
+        # Used for nodes in the "implicit" SPQR decomposition mode
+        self.xdot_ix = None
+        self.xdot_iy = None
+
+# The parent bicomponents of nodes without an SPQRRecord
+NO_BICOMPONENTS = frozenset()
+
 class Node(object):
     """A generic node. Used for representing individual contigs/scaffolds,
        and as the superclass for groups of nodes.
     """
+    # Assembly graphs can contain millions of nodes, so we use __slots__ to
+    # avoid giving each Node its own __dict__. (Subclasses should define
+    # __slots__ as well.)
+    __slots__ = ("id_string", "bp", "depth", "gc_content", "label",
+        "is_repeat", "read_count", "is_complement", "is_single",
+        "core", "index", "adjacent_nodes", "edge_objects",
+        "used_in_collapsing", "is_subsumed", "group", "component_size_rank",
+        "xdot_width", "xdot_height", "xdot_x", "xdot_y", "xdot_shape",
+        "xdot_rel_x", "xdot_rel_y", "spqr")
+
     def __init__(self, id_string, bp, is_complement, depth=None,
                  gc_content=None, label=None, is_single=False, is_repeat=None):
         """Initializes the object. bp initially stood for "base pairs," but
@@ -171,27 +213,24 @@ class Node(object):
         self.label = label
         # Either 1 (is a repeat), 0 (is not a repeat), or None (not given)
         self.is_repeat = is_repeat
+        # The number of reads mapped to this node, or None if read tracking
+        # information wasn't given (set while parsing the assembly graph)
+        self.read_count = None
         # If True, we use the "flipped" node style
         self.is_complement = is_complement
         # If True, we draw nodes without direction
         self.is_single = is_single
-        # List of nodes to which this node has an outgoing edge
-        self.outgoing_nodes = []
-        # List of nodes from which this node has an incoming edge
-        self.incoming_nodes = []
-        # Dict of Edge objects that have this node as a source -- used for
-        # storing/reading more detailed edge information, not used for graph
-        # traversal. Edge objects are stored as values, and their
-        # corresponding key is the sink (target) node ID of the edge.
-        # ...e.g. for 1->2, 1->3, 1->4, outgoing_edge_objects would look like
-        # {2: Edge(1, 2), 3: Edge(1, 3), 4: Edge(1, 4)}
-        self.outgoing_edge_objects = {}
-        # Flag variables we use to make DFS/finding connected components
-        # more efficient (maintaining a list or dict of this info is more
-        # expensive than just using attributes, like this)
-        self.seen_in_dfs = False
-        self.in_nodes_to_check = False
-        self.seen_in_ccomponent = False
+        # The graph_core.GraphCore that this node is in (which is used for
+        # traversing the graph), and this node's index in it -- or None and
+        # None if this node isn't in a GraphCore (e.g. if it's a NodeGroup)
+        self.core = None
+        self.index = None
+        # For nodes that aren't in a GraphCore, a 2-tuple of the lists
+        # underlying outgoing_nodes and incoming_nodes (nodes that are in a
+        # GraphCore get these from its arrays instead)
+        self.adjacent_nodes = None
+        # The dict underlying outgoing_edge_objects
+        self.edge_objects = None
         self.used_in_collapsing = False
         # If we decide to subsume a node group into another node group,
         # thus removing the initial node group, we use this flag to
@@ -200,13 +239,9 @@ class Node(object):
         # When we collapse nodes into a node group, we change this variable
         # to reference the NodeGroup object in question
         self.group = None
-        # Used in the case of nodes in an SPQR tree
-        # there should be m + 1 entries in this thing, where m = # of metanodes
-        # in the SPQR tree that this node is in. The + 1 is for the parent
-        # bicomponent of this node.
-        self.parent_spqrnode2relpos = {}
-        # Indicates the Bicomponent(s) in which this node is present
-        self.parent_bicomponents = set()
+        # Data used in the SPQR-integrated view, if this node is in it (see
+        # spqr_record())
+        self.spqr = None
         # Reference to the "size rank" (1 for largest, 2 for 2nd largest,
         # ...) of the connected component to which this node belongs.
         self.component_size_rank = -1
@@ -220,10 +255,113 @@ class Node(object):
         # Optional layout data (used for nodes within subgraphs)
         self.xdot_rel_x  = None
         self.xdot_rel_y  = None
-        # Used for nodes in the "implicit" SPQR decomposition mode:
-        self.xdot_ix     = None
-        self.xdot_iy     = None
-        
+
+    def spqr_record(self):
+        """Returns this node's SPQRRecord, creating it if it doesn't exist
+           yet.
+        """
+        if self.spqr is None:
+            self.spqr = SPQRRecord()
+        return self.spqr
+
+    @property
+    def parent_bicomponents(self):
+        """The set of Bicomponents in which this node is present.
+
+           This doesn't create an SPQRRecord for this node, so it can be
+           checked for any node without using up any memory; to add a
+           bicomponent to this set, use spqr_record().parent_bicomponents.
+        """
+        if self.spqr is None:
+            return NO_BICOMPONENTS
+        return self.spqr.parent_bicomponents
+
+    @property
+    def parent_spqrnode2relpos(self):
+        """Maps the metanodes/bicomponents that this node is in to its
+           relative position within them (see SPQRRecord).
+        """
+        return self.spqr_record().parent_spqrnode2relpos
+
+    # Positions of this node in the "implicit" SPQR decomposition mode
+    @property
+    def xdot_ix(self):
+        return None if self.spqr is None else self.spqr.xdot_ix
+
+    @xdot_ix.setter
+    def xdot_ix(self, x):
+        self.spqr_record().xdot_ix = x
+
+    @property
+    def xdot_iy(self):
+        return None if self.spqr is None else self.spqr.xdot_iy
+
+    @xdot_iy.setter
+    def xdot_iy(self, y):
+        self.spqr_record().xdot_iy = y
+
+    @property
+    def outgoing_nodes(self):
+        """List of nodes to which this node has an outgoing edge."""
+        if self.core is not None:
+            return self.core.successor_nodes(self)
+        if self.adjacent_nodes is None:
+            return []
+        return self.adjacent_nodes[0]
+
+    @property
+    def incoming_nodes(self):
+        """List of nodes from which this node has an incoming edge."""
+        if self.core is not None:
+            return self.core.predecessor_nodes(self)
+        if self.adjacent_nodes is None:
+            return []
+        return self.adjacent_nodes[1]
+
+    @property
+    def out_degree(self):
+        """The number of edges from this node (counting each edge to the
+           same node separately), found without building outgoing_nodes.
+        """
+        if self.core is not None:
+            return self.core.out_degree(self)
+        if self.adjacent_nodes is None:
+            return 0
+        return len(self.adjacent_nodes[0])
+
+    @property
+    def in_degree(self):
+        """The number of edges to this node (counting each edge from the
+           same node separately), found without building incoming_nodes.
+        """
+        if self.core is not None:
+            return self.core.in_degree(self)
+        if self.adjacent_nodes is None:
+            return 0
+        return len(self.adjacent_nodes[1])
+
+    @property
+    def outgoing_edge_objects(self):
+        """Dict of Edge objects that have this node as a source -- used for
+           storing/reading more detailed edge information, not used for
+           graph traversal. Edge objects are stored as values, and their
+           corresponding key is the sink (target) node ID of the edge.
+           ...e.g. for 1->2, 1->3, 1->4, outgoing_edge_objects would look
+           like {2: Edge(1, 2), 3: Edge(1, 3), 4: Edge(1, 4)}
+
+           For nodes in a GraphCore, the Edge objects are created from the
+           GraphCore's arrays the first time this is accessed.
+        """
+        if self.edge_objects is None:
+            self.edge_objects = {}
+            if self.core is not None:
+                for m, multiplicity, orientation, mean, stdev in \
+                        self.core.outgoing_edges(self):
+                    self.edge_objects[m.id_string] = Edge(self.id_string,
+                        m.id_string, multiplicity=multiplicity,
+                        orientation=orientation, mean=mean, stdev=stdev)
+        return self.edge_objects
+
     def get_dimensions(self):
         """Calculates the width and height of this node.
 
@@ -268,9 +406,16 @@ class Node(object):
 
            Also adds an Edge with any specified data to this node's
            dict of outgoing Edge objects.
+
+           This is only for nodes that aren't in a GraphCore (e.g. SPQR
+           metanodes); edges between nodes in a GraphCore are added to it
+           instead.
         """
-        self.outgoing_nodes.append(node2)
-        node2.incoming_nodes.append(self)
+        for n in (self, node2):
+            if n.adjacent_nodes is None:
+                n.adjacent_nodes = ([], [])
+        self.adjacent_nodes[0].append(node2)
+        node2.adjacent_nodes[1].append(self)
         self.outgoing_edge_objects[node2.id_string] = \
             Edge(self.id_string, node2.id_string, multiplicity=multiplicity,
                     orientation=orientation, mean=mean, stdev=stdev)
@@ -282,10 +427,12 @@ class Node(object):
            Useful for only printing edges relevant to the nodes we're
            interested in.
 
-           If constrained_nodes is not None, then it is interpreted as a list
+           If constrained_nodes is not None, then it is interpreted as a set
            of nodes to "constrain" the edges: that is, edges pointing to the
-           nodes within this list are the only edges whose info will be
-           included in the returned string.
+           nodes within this set are the only edges whose info will be
+           included in the returned string. (NodeGroups list the edges
+           between their nodes with NodeGroup.member_edge_info(), so they
+           don't need to use this.)
         """
         o = ""
         # Since we only care about the target ID and not about any other
@@ -334,6 +481,10 @@ class Node(object):
            its outgoing edges.
         """
         self.component_size_rank = component_size_rank
+        # Edges in the single graph are never saved in the .db file, so
+        # there's no need to create Edge objects for them here
+        if self.is_single:
+            return
         for e in self.outgoing_edge_objects.values():
             e.component_size_rank = component_size_rank
 
@@ -376,7 +527,7 @@ class Node(object):
         return (self.id_string, self.label, self.bp, self.gc_content,
                 self.depth, self.is_repeat, self.component_size_rank, x, y,
                 ix, iy, self.xdot_width, self.xdot_height, parent_metanode_id,
-                parent_bicmp_id)
+                parent_bicmp_id, self.read_count)
 
     def db_values(self):
         """Returns a tuple of the "values" of this Node.
@@ -391,7 +542,7 @@ class Node(object):
            Also, this shouldn't be called until after this Node's layout
            information has been parsed from an .xdot file and recorded.
         """
-        # See collate.py for the most up-to-date specifications of how this
+        # See db_writer.py for the most up-to-date specifications of how this
         # table is laid out.
         # The "parent cluster id" field can be either an ID or NULL
         # (where NULL denotes no parent cluster), so we decide that here.
@@ -402,7 +553,7 @@ class Node(object):
         return (self.id_string, self.label, length, self.gc_content,
                 self.depth, self.is_repeat, self.component_size_rank,
                 self.xdot_x, self.xdot_y, self.xdot_width, self.xdot_height,
-                self.xdot_shape, group_id)
+                self.xdot_shape, group_id, self.read_count)
 
     def __repr__(self):
         """For debugging -- returns a str representation of this node."""
@@ -419,7 +570,13 @@ class NodeGroup(Node):
        node is an actual "node," while in GraphViz a cluster is merely a
        "subgraph.")
     """
-    
+    __slots__ = ("node_count", "edge_count", "group_style", "gv_id_string",
+        "cy_id_string", "nodes", "edges",
+        "childid2obj", "xdot_c_width",
+        "xdot_c_height", "xdot_left", "xdot_bottom", "xdot_right",
+        "xdot_top", "xdot_ic_width", "xdot_ic_height", "xdot_ileft",
+        "xdot_ibottom", "xdot_iright", "xdot_itop")
+
     def __init__(self, group_prefix, group_style, nodes, spqr_related=False,
             unique_id=None):
         """Initializes the node group, given all the Node objects comprising
@@ -492,6 +649,30 @@ class NodeGroup(Node):
         """Lays out this node group by itself. Stores layout information in
            the attributes of both this NodeGroup object and its child
            nodes/edges.
+
+           Returns the layout record that was applied to this node group (see
+           isolated_layout_record() for details).
+        """
+        record = self.isolated_layout_record()
+        self.apply_isolated_layout(record)
+        return record
+
+    def isolated_layout_record(self):
+        """Lays out this node group by itself, without modifying this
+           NodeGroup or any of its child nodes/edges.
+
+           Returns a "layout record" consisting only of plain values (so that
+           it can be sent between processes, e.g. when laying out components
+           in parallel in collate.py). This is a 4-tuple of:
+            -The width of this node group's bounding box, in inches
+            -The height of this node group's bounding box, in inches
+            -A list of (node ID, relative x, relative y, width, height, shape)
+             tuples, one for each child node
+            -A list of (source ID, target ID, relative control point string,
+             control point count) tuples, one for each child edge
+
+           Positions/control points are relative to the bottom left corner of
+           this node group's bounding box.
         """
         # pipe .gv into pygraphviz to lay out this node group
         gv_input = ""
@@ -503,59 +684,96 @@ class NodeGroup(Node):
         if config.GLOBALEDGE_STYLE != "":
             gv_input += "\tedge [%s];\n" % (config.GLOBALEDGE_STYLE)
         gv_input += self.node_info(backfill=False)
-        for n in self.nodes:
-            # Ensure that only the edges that point to nodes that are within
-            # the node group are present; ensures layout is restricted to just
-            # the node group in question.
-            # This works because the edges we consider in the first place all
-            # originate from nodes within the node group, so we don't have to
-            # worry about edges originating from nodes outside the node group.
-            gv_input += n.edge_info(constrained_nodes=self.nodes)
+        # Only include the edges between nodes within the node group; ensures
+        # layout is restricted to just the node group in question.
+        gv_input += self.member_edge_info()
         gv_input += "}"
         cg = pygraphviz.AGraph(gv_input)
         cg.layout(prog='dot')
         # Obtain cluster width and height from the layout
         bounding_box_text = cg.subgraphs()[0].graph_attr[u'bb']
         bounding_box_numeric = [float(y) for y in bounding_box_text.split(',')]
-        self.xdot_c_width = bounding_box_numeric[2] - bounding_box_numeric[0]
-        self.xdot_c_height = bounding_box_numeric[3] - bounding_box_numeric[1]
+        c_width = bounding_box_numeric[2] - bounding_box_numeric[0]
+        c_height = bounding_box_numeric[3] - bounding_box_numeric[1]
         # convert width and height from points to inches
-        self.xdot_c_width /= config.POINTS_PER_INCH
-        self.xdot_c_height /= config.POINTS_PER_INCH
+        c_width /= config.POINTS_PER_INCH
+        c_height /= config.POINTS_PER_INCH
         # Obtain node layout info
         # NOTE: we could iterate over the subgraph's nodes or over the entire
         # graph (cg)'s nodes -- same result, since the only nodes in the graph
         # are in the subgraph.
+        node_records = []
         for n in cg.nodes():
-            curr_node = self.childid2obj[str(n)]
             # Record the relative position (within the node group's bounding
             # box) of this child node.
             ep = n.attr[u'pos'].split(',')
-            curr_node.xdot_rel_x = float(ep[0]) - bounding_box_numeric[0]
-            curr_node.xdot_rel_y = float(ep[1]) - bounding_box_numeric[1]
-            curr_node.xdot_width = float(n.attr[u'width'])
-            curr_node.xdot_height = float(n.attr[u'height'])
-            curr_node.xdot_shape = str(n.attr[u'shape'])
+            node_records.append((str(n),
+                float(ep[0]) - bounding_box_numeric[0],
+                float(ep[1]) - bounding_box_numeric[1],
+                float(n.attr[u'width']), float(n.attr[u'height']),
+                str(n.attr[u'shape'])))
         # Obtain edge layout info
+        edge_records = []
         for e in cg.edges():
-            self.edge_count += 1
-            source_node = self.childid2obj[str(e[0])]
-            curr_edge = source_node.outgoing_edge_objects[str(e[1])]
-            self.edges.append(curr_edge)
             # Get control points, then find them relative to cluster dimensions
-            ctrl_pt_str, coord_list, curr_edge.xdot_ctrl_pt_count = \
+            ctrl_pt_str, coord_list, ctrl_pt_count = \
                 Edge.get_control_points(e.attr[u'pos'])
-            curr_edge.xdot_rel_ctrl_pt_str = ""
+            rel_ctrl_pt_str = ""
             p = 0
             while p <= len(coord_list) - 2:
                 if p > 0:
-                    curr_edge.xdot_rel_ctrl_pt_str += " "
+                    rel_ctrl_pt_str += " "
                 x_coord = coord_list[p] - bounding_box_numeric[0]
                 y_coord = coord_list[p + 1] - bounding_box_numeric[1]
-                curr_edge.xdot_rel_ctrl_pt_str += str(x_coord)
-                curr_edge.xdot_rel_ctrl_pt_str += " "
-                curr_edge.xdot_rel_ctrl_pt_str += str(y_coord)
+                rel_ctrl_pt_str += str(x_coord)
+                rel_ctrl_pt_str += " "
+                rel_ctrl_pt_str += str(y_coord)
                 p += 2
+            edge_records.append((str(e[0]), str(e[1]), rel_ctrl_pt_str,
+                ctrl_pt_count))
+        cg.clear()
+        cg.close()
+        return c_width, c_height, node_records, edge_records
+
+    def member_edge_info(self):
+        """Returns a GraphViz-compatible string (like in Node.edge_info())
+           describing the edges between the nodes in this group, in the order
+           that edge_info() would list them.
+
+           This is only needed when laying out this group by itself, so the
+           edges aren't stored (most groups, e.g. SPQR metanodes, never need
+           them).
+        """
+        member_set = frozenset(self.nodes)
+        return "".join("\t%s -> %s\n" % (n.id_string, m.id_string)
+            for n in self.nodes for m in n.outgoing_nodes if m in member_set)
+
+    def apply_isolated_layout(self, record):
+        """Stores the layout information contained in a layout record (as
+           returned by isolated_layout_record()) in the attributes of both
+           this NodeGroup object and its child nodes/edges.
+
+           Applying the same record more than once is harmless.
+        """
+        self.xdot_c_width, self.xdot_c_height, node_records, edge_records = \
+            record
+        for node_id, rel_x, rel_y, width, height, shape in node_records:
+            curr_node = self.childid2obj[node_id]
+            curr_node.xdot_rel_x = rel_x
+            curr_node.xdot_rel_y = rel_y
+            curr_node.xdot_width = width
+            curr_node.xdot_height = height
+            curr_node.xdot_shape = shape
+        self.edges = []
+        self.edge_count = 0
+        for source_id, target_id, rel_ctrl_pt_str, ctrl_pt_count in \
+                edge_records:
+            self.edge_count += 1
+            source_node = self.childid2obj[source_id]
+            curr_edge = source_node.outgoing_edge_objects[target_id]
+            self.edges.append(curr_edge)
+            curr_edge.xdot_rel_ctrl_pt_str = rel_ctrl_pt_str
+            curr_edge.xdot_ctrl_pt_count = ctrl_pt_count
             curr_edge.group = self
 
     def node_info(self, backfill=True, incl_cluster_prefix=True):
@@ -609,6 +827,9 @@ class SPQRMetaNode(NodeGroup):
        the linear-time implementation used in OGDF, see
        http://www.ogdf.net/doc-ogdf/classogdf_1_1_s_p_q_r_tree.html#details.
     """
+    __slots__ = ("bicomponent_id", "parent_bicomponent", "spqr_id",
+        "metanode_type", "internal_edges", "nonlaidout_edges",
+        "nonlaidout_edge_count")
 
     def __init__(self, bicomponent_id, spqr_id, metanode_type, nodes,
             internal_edges):
@@ -621,9 +842,19 @@ class SPQRMetaNode(NodeGroup):
         self.spqr_id = spqr_id
         self.metanode_type = metanode_type
         self.internal_edges = internal_edges
-        # Used to maintain a list of edges we haven't reconciled with fancy
-        # Edge objects yet (see layout_isolated() in this class)
-        self.nonlaidout_edges = internal_edges[:]
+        # Used to keep track of the edges we haven't reconciled with fancy
+        # Edge objects yet (see layout_isolated() in this class). This maps
+        # the (unordered) pair of endpoint IDs of each edge to a deque of the
+        # types ("v" for virtual or "r" for real) of the edges between these
+        # endpoints that haven't been reconciled, in the order they're given
+        # in internal_edges.
+        self.nonlaidout_edges = {}
+        for e in internal_edges:
+            endpoints = frozenset(e[1:])
+            if endpoints not in self.nonlaidout_edges:
+                self.nonlaidout_edges[endpoints] = deque()
+            self.nonlaidout_edges[endpoints].append(e[0])
+        self.nonlaidout_edge_count = len(internal_edges)
         unique_id = str(uuid.uuid4()).replace("-", "_")
         super(SPQRMetaNode, self).__init__(self.metanode_type, "", nodes,
                 spqr_related=True, unique_id=unique_id)
@@ -721,16 +952,15 @@ class SPQRMetaNode(NodeGroup):
             # anyway because it doesn't really matter from a layout perspective
             source_id = str(e[0])
             target_id = str(e[1])
-            curr_edge = None
-            for en in self.nonlaidout_edges:
-                if set(en[1:]) == set([source_id, target_id]):
-                    # This edge matches a non-laid-out edge.
-                    is_virt = (en[0] == "v")
-                    curr_edge = Edge(source_id, target_id, is_virtual=is_virt)
-                    self.nonlaidout_edges.remove(en)
-                    break
-            if curr_edge == None:
+            edge_types = self.nonlaidout_edges.get(
+                frozenset((source_id, target_id)))
+            if not edge_types:
                 raise ValueError, "unknown edge obtained from layout"
+            # This edge matches the first non-laid-out edge between these
+            # endpoints
+            is_virt = (edge_types.popleft() == "v")
+            self.nonlaidout_edge_count -= 1
+            curr_edge = Edge(source_id, target_id, is_virtual=is_virt)
             self.edges.append(curr_edge)
             # Get control points, then find them relative to cluster dimensions
             ctrl_pt_str, coord_list, curr_edge.xdot_ctrl_pt_count = \
@@ -747,7 +977,7 @@ class SPQRMetaNode(NodeGroup):
                 curr_edge.xdot_rel_ctrl_pt_str += str(y_coord)
                 p += 2
             curr_edge.group = self
-        if len(self.nonlaidout_edges) > 0:
+        if self.nonlaidout_edge_count > 0:
             raise ValueError, "All edges in metanode %s were not laid out" % \
                 (self.gv_id_string)
 
@@ -781,6 +1011,8 @@ class Bicomponent(NodeGroup):
           biconnected components "filled in" as solid rectangular nodes (with
           the width/height determined from step 4)
     """
+    __slots__ = ("bicomponent_id", "metanode_list", "root_metanode",
+        "singlenode_count", "snid2obj", "real_edges")
 
     def __init__(self, bicomponent_id, metanode_list, root_metanode):
         # a string representation of an integer that matches an ID in
@@ -794,7 +1026,7 @@ class Bicomponent(NodeGroup):
         for mn in self.metanode_list:
             self.singlenode_count += len(mn.nodes) # len() is O(1) so this's ok
             for n in mn.nodes:
-                n.parent_bicomponents.add(self)
+                n.spqr_record().parent_bicomponents.add(self)
             mn.parent_bicomponent = self
         # Get a dict mapping singlenode IDs to their corresponding objects.
         # The length of this dict also provides us with the number of
@@ -909,8 +1141,7 @@ class Bicomponent(NodeGroup):
         for mn in self.metanode_list:
             gv_input += mn.node_info(backfill=True, incl_cluster_prefix=False)
         gv_input += "}\n"
-        for n in self.metanode_list:
-            gv_input += n.edge_info(constrained_nodes=self.nodes)
+        gv_input += self.member_edge_info()
         gv_input += "}"
         cg = pygraphviz.AGraph(gv_input)
         cg.layout(prog='dot')
@@ -979,83 +1210,19 @@ class Bubble(NodeGroup):
        node -- this is the relatively strict definition of a Bubble we used
        until now.
 
-       Now, though, we use OGDF (via the spqr script) to decompose the graph
-       into biconnected components within the graph. Many of these biconnected
-       components should be similar to what we want to identify as "bubbles."
+       Now, though, we also identify the superbubbles of the graph (see
+       graph_core.Superbubbles), which can have any structure between their
+       entrance and exit nodes.
 
        (In any case, this Bubble class is agnostic as to the structure of its
        nodes; all that's needed to create a Bubble is a list of its nodes.)
     """
+    __slots__ = ()
+
     def __init__(self, *nodes):
         """Initializes the Bubble, given a list of nodes comprising it."""
         super(Bubble, self).__init__('B', config.BUBBLE_STYLE, nodes)
 
-    @staticmethod
-    def is_valid_source_sink_pair(nodes):
-        """Returns True if the separation pair defined by the given list of
-           Node objects is a valid "source-sink pair" (see Nijkamp et al. 2013
-           for a discussion of this process -- it's the paper on MaryGold).
-           Note that our algorithm here is a bit different from that described
-           in MaryGold.
-           
-           The input to this function should be a list of Nodes where the
-           first Node is the proposed source of the source-sink pair, 
-           the second node is the proposed sink, and the remaining Nodes are
-           the member nodes comprising the source-sink pair (including the
-           source and sink node again).
-        """
-
-        # Immediately reject complex bubbles containing nodes already present
-        # in other node groups
-        #members = set(nodes[2:])
-        #for n in members:
-        #    if n.used_in_collapsing:
-        #        return False
-        #source = nodes[0]
-        #sink = nodes[1]
-        ## Disallow edges from members to the source, or from the sink to
-        ## members. Either type is obviously not ok.
-        #for outn in sink.outgoing_nodes:
-        #    if outn in members:
-        #        return False
-        #for inn in source.incoming_nodes:
-        #    if inn in members:
-        #        return False
-        ## Ensure that all nodes in the bubble (aside from the source) have
-        ## incoming edges only present in the bubble
-        #for n in members.difference(set([source])):
-        #    if not set(n.incoming_nodes).issubset(members):
-        #        return False
-        ## Ensure that all nodes in the bubble (aside from the sink) have
-        ## outgoing edges only present in the bubble
-        #for n in members.difference(set([sink])):
-        #    if not set(n.outgoing_nodes).issubset(members):
-        #        return False
-        ## Now: ensure that all member nodes arise on path(s) originating from
-        ## the source node, and that all paths from the source node eventually
-        ## converge to the sink node. We do this using a modified BFS.
-        #to_check = set(source.outgoing_nodes)
-        #visited_nodes = {source: True}
-        #while len(to_check) > 0:
-        #    n = to_check.pop()
-        #    visited_nodes[n] = True
-        #    if n == sink:
-        #        # This is good -- a path from the source node made it to the
-        #        # sink node. We've popped (this instance of) the sink from
-        #        # to_check, so we don't need to worry about it any more.
-        #        continue
-        #    outs = n.outgoing_nodes
-        #    if len(outs) == 0:
-        #        # We reached a dead end in the bubble (and we know we aren't
-        #        # at the sink, so this definitely isn't valid).
-        #        return False
-        #    to_check = to_check.union(set(outs))
-        #if len(visited_nodes) == len(members):
-        #    return True
-        # If we didn't end up visiting all the nodes in the bubble, then there
-        # existed nodes that did not arise from paths from the source node.
-        return False
-        
     @staticmethod
     def is_valid_bubble(s):
         """Returns a 2-tuple of True and a list of the nodes comprising the
@@ -1082,7 +1249,7 @@ class Bubble(NodeGroup):
         # List of all nodes that are the "end" of divergent paths in the bubble
         mn_nodes = []
         for n in m1_nodes:
-            if len(n.incoming_nodes) != 1 or len(n.outgoing_nodes) != 1:
+            if n.in_degree != 1 or n.out_degree != 1:
                 return False, None
             # Now we know that this path is at least somewhat valid, get
             # all the middle nodes on it and the ending node from it.
@@ -1095,10 +1262,10 @@ class Bubble(NodeGroup):
                 if n.used_in_collapsing:
                     if type(n.group) == Chain:
                         path_nodes = n.group.nodes
-                        path_end = path_nodes[len(path_nodes)-1].outgoing_nodes
                         # The divergent paths of a bubble must converge
-                        if len(path_end) != 1:
+                        if path_nodes[len(path_nodes) - 1].out_degree != 1:
                             return False, None
+                        path_end = path_nodes[len(path_nodes)-1].outgoing_nodes
                         if e_node == None:
                             e_node = path_end[0]
                         # If the divergent paths of a bubble don't converge to
@@ -1126,9 +1293,9 @@ class Bubble(NodeGroup):
             else:
                 # The middle nodes form a chain that has not been "created" yet
                 # This makes this a little easier for us.
-                path_end = path_nodes[len(path_nodes) - 1].outgoing_nodes
-                if len(path_end) != 1:
+                if path_nodes[len(path_nodes) - 1].out_degree != 1:
                     return False, None
+                path_end = path_nodes[len(path_nodes) - 1].outgoing_nodes
                 if e_node == None:
                     e_node = path_end[0]
                 elif e_node != path_end[0]:
@@ -1141,8 +1308,12 @@ class Bubble(NodeGroup):
         if e_node.used_in_collapsing:
             return False, None
         # If the ending node has any incoming nodes that are not in
-        # mn_nodes, then reject this bubble.
-        elif set(e_node.incoming_nodes) != set(mn_nodes):
+        # mn_nodes, then reject this bubble. Each node in mn_nodes has exactly
+        # one outgoing edge, to the ending node, so this is just a matter of
+        # counting the ending node's incoming edges. (If mn_nodes contains
+        # the same node more than once, the check on composite below will
+        # reject this bubble anyway.)
+        elif e_node.in_degree != len(mn_nodes):
             return False, None
         # If the bubble is cyclical, reject it
         # (checking the outgoing/incoming nodes of m1_nodes, and only
@@ -1164,6 +1335,7 @@ class Bubble(NodeGroup):
 
 class Rope(NodeGroup):
     """A group of nodes collapsed into a Rope."""
+    __slots__ = ()
 
     def __init__(self, *nodes):
         """Initializes the Rope, given a list of nodes comprising it."""
@@ -1188,7 +1360,7 @@ class Rope(NodeGroup):
         # Ensure none of the start nodes have extraneous outgoing nodes
         # (or have been used_in_collapsing)
         for n in s_nodes:
-            if len(n.outgoing_nodes) != 1 or n.used_in_collapsing:
+            if n.out_degree != 1 or n.used_in_collapsing:
                 return False, None
         # Now we know that, regardless of the middle nodes' composition,
         # no chain can exist involving m1 that does not start AT m1.
@@ -1233,14 +1405,15 @@ class Rope(NodeGroup):
         for n in e_nodes:
             # Check for extraneous incoming edges, and that the ending nodes
             # haven't been used_in_collapsing.
-            if len(n.incoming_nodes) != 1 or n.used_in_collapsing:
+            if n.in_degree != 1 or n.used_in_collapsing:
                 return False, None
             for o in n.outgoing_nodes:
                 # We know now that all of the m_nodes (sans m1) and all of the
                 # e_nodes only have one incoming node, but we don't know
                 # that about the s_nodes. Make sure that this frayed rope
-                # isn't cyclical.
-                if o in s_nodes:
+                # isn't cyclical. (The s_nodes are exactly the nodes with an
+                # edge to m1, and each has only that one outgoing edge.)
+                if o.out_degree == 1 and o.outgoing_nodes[0] == m1:
                     return False, None
 
         # Check the entire frayed rope's structure
@@ -1258,10 +1431,55 @@ class Chain(NodeGroup):
     """A group of nodes collapsed into a Chain. This is defined as > 1
        nodes that occur one after the other, with no intermediate edges.
     """
+    __slots__ = ()
+
     def __init__(self, *nodes):
         """Initializes the Chain, given all the nodes comprising the chain."""
         super(Chain, self).__init__('C', config.CHAIN_STYLE, nodes);
 
+    @staticmethod
+    def chain_run(s):
+        """Returns a 2-tuple of (True or False, a list of all the nodes in
+           the longest possible Chain including s, in order from start to
+           end). The first element is True if Chain.is_valid_chain() would
+           accept these nodes as a Chain when given at least one of them.
+
+           A Chain is a stretch of a unitig (see graph_core.Unitigs) that
+           doesn't include any nodes that have already been used in
+           collapsing (aside from s itself, if it has been), so this just
+           looks up the stretch around s in the graph's unitigs instead of
+           walking forwards and backwards through the graph from s.
+        """
+        nodes = s.core.nodes
+        run, loops = s.core.unitigs.run(s.index,
+            lambda j: nodes[j].used_in_collapsing)
+        run_nodes = [nodes[j] for j in run]
+        if len(run) <= 1:
+            return False, run_nodes
+        # If the last node has an edge to the first node, then (following
+        # the walk that is_valid_chain() used to do) these nodes are usually
+        # a cycle rather than a Chain. is_valid_chain() rejects them when
+        # given their first node (the walk forwards from it comes back to it)
+        # or their last node (which is never the start of a Chain), so we
+        # just have to check whether it'd reject them given any node in
+        # between:
+        double = s.core.double
+        if loops and (
+                # There's no node in between.
+                len(run) == 2 or
+                # The walk backwards from the node in between reaches the
+                # first node, and one of the first node's incoming edges is
+                # from the Chain: the Chain "begins cyclically".
+                double.in_degrees[run[0]] != 1 or
+                # The last node's only outgoing edge is to the first node
+                # (and it's the first node's only incoming edge, by the check
+                # above), so these nodes are a whole cyclic unitig: the walk
+                # forwards goes all the way around, back to where it
+                # started. The Chain "ends cyclically".
+                double.out_degrees[run[-1]] == 1):
+            return False, run_nodes
+        return True, run_nodes
+
     @staticmethod
     def is_valid_chain(s):
         """Returns a 2-tuple of (True, a list of all the nodes in the Chain
@@ -1270,110 +1488,31 @@ class Chain(NodeGroup):
            Chain would be considered invalid.
            
            Note that this finds the longest possible Chain that includes s,
-           if a Chain exists starting at s. If we decide that no Chain
-           exists starting at s then we just return (False, None), but if we
-           find that a Chain does exist starting at s then we traverse
-           "backwards" to find the longest possible chain including s.
+           if a Chain exists starting at s (see Chain.chain_run()). A Chain
+           doesn't exist starting at s if s is the last node in it, or if
+           the Chain's last node has an edge to s: we'll detect this as a
+           Cycle when we're actually looking for cycles.
         """
-        if len(s.outgoing_nodes) != 1:
-            return False, None
-        # Determine the composition of the Chain (if one exists starting at s)
-        # First, check to make sure we have the minimal parts of a Chain:
-        # a starting node with one outgoing edge to another node, and the other
-        # node only has one incoming edge (from the starting node). The other
-        # node also cannot have an outgoing edge to the starting node.
-        if s.outgoing_nodes[0] == s or type(s.outgoing_nodes[0]) != Node:
+        nodes = s.core.nodes
+        run, loops = s.core.unitigs.run(s.index,
+            lambda j: nodes[j].used_in_collapsing)
+        # There's no Chain starting at s if s is the last node in its stretch
+        # of unitig: s doesn't have exactly one outgoing edge, or the node it
+        # has an edge to has other incoming edges (or has been used in
+        # collapsing).
+        if run[-1] == s.index:
             return False, None
-        chain_list = [s]
-        curr = s.outgoing_nodes[0]
-        chain_ends_cyclically = False
-        # We iterate "down" through the chain.
-        while True:
-            if (len(curr.incoming_nodes) != 1 or type(curr) != Node
-                                            or curr.used_in_collapsing):
-                # The chain has ended, and this can't be the last node in it
-                # (The node before this node, if applicable, is the chain's
-                # actual end.)
-                break
-            
-            if len(curr.outgoing_nodes) != 1:
-                # Like above, this means the end of the chain...
-                # NOTE that at this point, if curr has an outgoing edge to a
-                # node in the chain list, it has to be to the starting node.
-                # This is because we've already checked every other node in
-                # the chain list to ensure that every non-starting node has
-                # only 1 incoming node.
-                if len(curr.outgoing_nodes) > 1 and s in curr.outgoing_nodes:
-                    chain_ends_cyclically = True
-                else:
-                    # ...But this is still a valid end-node in the chain.
-                    chain_list.append(curr)
-                # Either way, we break -- we're done traversing the chain
-                # forwards.
-                break
-
-            # See above NOTE re: cyclic outgoing edges. This is basically
-            # the same thing.
-            if curr.outgoing_nodes[0] == s:
-                chain_ends_cyclically = True
-                break
-
-            # If we're here, the chain is still going on!
-            chain_list.append(curr)
-            curr = curr.outgoing_nodes[0]
-
-        # Alright, done iterating down the chain.
-        if len(chain_list) <= 1 or chain_ends_cyclically:
-            # There wasn't a Chain starting at s. (There might be a Chain
-            # that includes s that starts "before" s, but we don't really
-            # bother with that now -- we only care about optimality when
-            # reporting that a Chain exists. We would find such a Chain later,
-            # anyway.)
-            # Also, re chain_ends_cyclically:
-            # We'll detect a cycle here when we're actually looking for
-            # cycles -- so don't count this as a chain.
+        if loops and (
+                # The walk forwards from s comes back to s: the Chain "ends
+                # cyclically". (This includes every node of a whole cyclic
+                # unitig, since run() starts such a unitig's run at s.)
+                run[0] == s.index or
+                # The walk backwards from s reaches the first node, and one
+                # of that node's incoming edges is from the Chain: the Chain
+                # "begins cyclically".
+                s.core.double.in_degrees[run[0]] != 1):
             return False, None
-
-        if len(s.incoming_nodes) != 1:
-            # s was already the optimal starting node, so just return what we
-            # have currently
-            return True, chain_list
-
-        # If we're here, we know a Chain exists starting at s. Can it be
-        # extended in the opposite direction to start at a node "before" s?
-        # We run basically what we did above, but in reverse.
-        backwards_chain_list = []
-        curr = s.incoming_nodes[0]
-        while True:
-            if (len(curr.outgoing_nodes) != 1 or type(curr) != Node
-                                            or curr.used_in_collapsing):
-                # The node "before" this node is the optimal starting node.
-                # This node can't be a part of the chain.
-                break
-            if len(curr.incoming_nodes) != 1:
-                # This indicates the end of the chain, and this is the optimal
-                # starting node in the chain.
-                if len(set(curr.incoming_nodes) & set(chain_list)) > 0:
-                    # Chain "begins" cyclically, so we'll tag it as a cycle
-                    # when detecting cycles
-                    return False, None
-                backwards_chain_list.append(curr)
-                break
-            # The backwards chain continues. Fortunately, if the chain had
-            # invalid references (e.g. last node has an outgoing edge to the
-            # prior start node or something), those should have been caught
-            # in the forwards chain-checking, so we don't need to check for
-            # that corner case here.
-            backwards_chain_list.append(curr)
-            curr = curr.incoming_nodes[0]
-        if backwards_chain_list == []:
-            # There wasn't a more optimal starting node -- this is due to the
-            # node "before" s either not being a Node, or having > 1 outgoing
-            # edges.
-            return True, chain_list
-        # If we're here, we found a more optimal starting node
-        backwards_chain_list.reverse()
-        return True, backwards_chain_list + chain_list
+        return True, [nodes[j] for j in run]
 
 class Cycle(NodeGroup):
     """A group of nodes collapsed into a Cycle. This is defined as > 1
@@ -1381,87 +1520,15 @@ class Cycle(NodeGroup):
        the sequence of nodes repeats.
        
        (Less formally, this is essentially a Chain where the 'last' node has
-       one outgoing edge to the 'first' node.)
+       one outgoing edge to the 'first' node. See
+       graph_core.Unitigs.linear_cycles() for how Cycles are found.)
     """
+    __slots__ = ()
+
     def __init__(self, *nodes):
         """Initializes the Cycle, given all the nodes comprising it."""
         super(Cycle, self).__init__('Y', config.CYCLE_STYLE, nodes)
 
-    @staticmethod
-    def is_valid_cycle(s):
-        """Identifies the simple cycle that "starts at" a given starting
-           node, if such a cycle exists. Returns (True, [nodes]) if
-           such a cycle exists (where [nodes] is a list of all the nodes in
-           the cycle), and (False, None) otherwise.
-           
-           NOTE that this only identifies cycles without any intermediate
-           incoming/outgoing edges not in the simple cycle -- that is, this
-           basically just looks for chains that end cyclically. (This also
-           identifies single-node loops as cycles.)
-           
-           The ideal way to implement cycle detection in a graph is to use
-           Depth-First Search (so, in our case, it would be to modify the
-           code in collate.py that already runs DFS to identify cycles), but
-           for now I think this more limited-in-scope method should work ok.
-        """
-        s_outgoing_node_ct = len(s.outgoing_nodes)
-        if len(s.incoming_nodes) == 0 or s_outgoing_node_ct == 0:
-            # If s has no incoming or no outgoing nodes, it can't be in
-            # a cycle!
-            return False, None
-        # Edge case: we identify single nodes with loops to themselves.
-        # If the start node has multiple outgoing edges but no reference to
-        # itself, then it isn't the start node for a cycle. (It could very
-        # well be the end node of another cycle, but we would eventually
-        # test that node for being a cycle later on.)
-        if s in s.outgoing_nodes:
-            # Valid whether s has 1 or >= 1 outgoing edges
-            return True, [s]
-        elif s_outgoing_node_ct > 1:
-            # Although we allow singleton looped nodes to be cycles (and to
-            # have > 1 outgoing nodes), we don't allow larger cycles to be
-            # constructed from a start node with > 1 outgoing nodes (since
-            # these are chain-like cycles, as discussed above).
-            return False, None
-        # We iterate "down" through the cycle to determine its composition
-        cycle_list = [s]
-        curr = s.outgoing_nodes[0]
-        while True:
-            if (len(curr.incoming_nodes) != 1 or type(curr) != Node
-                                            or curr.used_in_collapsing):
-                # The cycle has ended, and this can't be the last node in it
-                # (The node before this node, if applicable, is the cycle's
-                # actual end.)
-                return False, None
-            
-            if len(curr.outgoing_nodes) != 1:
-                # Like above, this means the end of the cycle, but it can
-                # mean the cycle is valid.
-                # NOTE that at this point, if curr has an outgoing edge to a
-                # node in the cycle list, it has to be to the starting node.
-                # This is because we've already checked every other node in
-                # the cycle list to ensure that every non-starting node has
-                # only 1 incoming node.
-                if len(curr.outgoing_nodes) > 1 and s in curr.outgoing_nodes:
-                    return True, cycle_list + [curr]
-                else:
-                    # If we didn't loop back to start at the end of the
-                    # cycle, we never will for this particular cycle. So
-                    # just return False.
-                    return False, None
-
-            # We know curr has one incoming and one outgoing edge. If its
-            # outgoing edge is to s, then we've found a cycle.
-            if curr.outgoing_nodes[0] == s:
-                return True, cycle_list + [curr]
-
-            # If we're here, the cycle is still going on -- the next node to
-            # check is not already in the cycle_list.
-            cycle_list.append(curr)
-            curr = curr.outgoing_nodes[0]
-
-        # If we're here then something went terribly wrong
-
 class Component(object):
     """A connected component in the graph. We use this in order to
        maintain meta-information, such as node groups, for each connected
@@ -0,0 +1,288 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Handles opening assembly graph files for parsing, including assembly graph
+# files that have been compressed using gzip, bzip2, or xz.
+#
+# Compressed files are decompressed on the fly in a background thread, which
+# feeds blocks of decompressed data to the thread parsing the file. (zlib,
+# bz2, and lzma all release the GIL while decompressing, so decompression and
+# parsing can actually run at the same time.) This way, compressed files never
+# have to be decompressed to disk before running collate.py on them.
+
+import os
+import mmap
+import zlib
+import bz2
+import threading
+import Queue
+from cStringIO import StringIO
+import config
+
+# lzma (for xz-compressed files) isn't in Python 2's standard library, so we
+# only support xz-compressed files if backports.lzma is installed
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+def new_gzip_decompressor():
+    # Adding 16 to the window size makes zlib expect a gzip header and
+    # trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+def new_xz_decompressor():
+    if lzma is None:
+        raise IOError, config.NO_LZMA_ERR
+    return lzma.LZMADecompressor()
+
+# The compression formats we support, as (name, magic number, filename
+# suffix, decompressor constructor) tuples. The compression format of a file
+# is detected using its magic number (i.e. the first few bytes of the file);
+# the filename suffix is just stripped from the filename.
+COMPRESSION_FORMATS = (
+    ("gzip", "\x1f\x8b", ".gz", new_gzip_decompressor),
+    ("bzip2", "BZh", ".bz2", bz2.BZ2Decompressor),
+    ("xz", "\xfd7zXZ\x00", ".xz", new_xz_decompressor),
+)
+
+def decompressed_blocks(raw_file, new_decompressor):
+    """Generator that yields blocks of decompressed data from a compressed
+       file.
+
+       This handles files containing multiple concatenated compressed
+       streams (e.g. bgzip output, or the output of pbzip2), by starting a new
+       decompressor whenever one stream ends.
+    """
+    decompressor = new_decompressor()
+    while True:
+        data = raw_file.read(config.DECOMPRESSION_CHUNK_SIZE)
+        if data == "":
+            break
+        while data != "":
+            try:
+                block = decompressor.decompress(data)
+            except EOFError:
+                # The bz2 and lzma decompressors raise an EOFError when given
+                # data after the end of their stream -- in which case, this
+                # data is the start of the next stream
+                decompressor = new_decompressor()
+                continue
+            if block != "":
+                yield block
+            # The zlib decompressor instead stores data after the end of its
+            # stream in unused_data, as does the bz2 decompressor if a stream
+            # ends partway through a chunk
+            data = decompressor.unused_data
+            if data != "":
+                decompressor = new_decompressor()
+
+class AssemblyFile(object):
+    """An assembly graph file, opened for reading.
+
+       Iterating over an AssemblyFile yields the lines of the file (after
+       decompression, if the file is compressed).
+
+       This can be used in a "with" statement, like a normal file object.
+    """
+
+    def __init__(self, filename):
+        """Opens the file with the given filename, and detects whether or not
+           it's compressed.
+
+           If the file is compressed, then the compression suffix (e.g.
+           ".gz") is stripped from the end of self.name, so that it can
+           still be used to guess the file's filetype (see
+           parsers.get_parser()).
+        """
+        self.filename = filename
+        self.name = filename
+        self.compression = None
+        self.raw_file = open(filename, 'rb')
+        magic = self.raw_file.read(8)
+        self.raw_file.seek(0)
+        for name, magic_number, suffix, new_decompressor in \
+                COMPRESSION_FORMATS:
+            if magic.startswith(magic_number):
+                self.compression = name
+                if filename.lower().endswith(suffix):
+                    self.name = filename[:-len(suffix)]
+                break
+        # The memory map of this file, if one has been created by mmap()
+        self.mapped_file = None
+        # Blocks of data that were read from the file before it started to be
+        # iterated over (by head()). These are yielded again when iterating.
+        self.read_blocks = []
+        self.stop_event = threading.Event()
+        if self.compression is None:
+            self.block_queue = None
+        else:
+            self.block_queue = Queue.Queue(config.DECOMPRESSION_QUEUE_SIZE)
+            self.reader_thread = threading.Thread(
+                target=self.read_blocks_to_queue, args=(new_decompressor,))
+            # Don't let this thread prevent collate.py from exiting if the
+            # main thread crashes
+            self.reader_thread.daemon = True
+            self.reader_thread.start()
+
+    def read_blocks_to_queue(self, new_decompressor):
+        """Reads blocks of decompressed data from the file into
+           self.block_queue. This is run in a separate thread.
+
+           A None in the queue denotes the end of the file; an exception
+           raised while decompressing the file is put in the queue as well,
+           to be raised again in the main thread.
+        """
+        try:
+            for block in decompressed_blocks(self.raw_file, new_decompressor):
+                if not self.put_in_queue(block):
+                    return
+            self.put_in_queue(None)
+        except Exception as e:
+            self.put_in_queue(e)
+
+    def put_in_queue(self, item):
+        """Puts an item in self.block_queue, waiting until there's room for
+           it in the queue. Returns False (without putting anything in the
+           queue) if close() is called in the meantime.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.block_queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def next_block(self):
+        """Returns the next block of decompressed data from the file, or None
+           if the end of the file has been reached.
+        """
+        block = self.block_queue.get()
+        if isinstance(block, Exception):
+            raise block
+        if block is None:
+            # Leave the None in the queue, in case we're asked for another
+            # block
+            self.block_queue.put(None)
+        return block
+
+    def head(self):
+        """Returns (at least) the first config.SNIFF_SIZE bytes of the file,
+           or the entire file if it's shorter than that.
+
+           This doesn't affect iterating over the file.
+        """
+        if self.compression is None:
+            head = self.raw_file.read(config.SNIFF_SIZE)
+            self.raw_file.seek(0)
+            return head
+        while sum(len(b) for b in self.read_blocks) < config.SNIFF_SIZE:
+            block = self.next_block()
+            if block is None:
+                break
+            self.read_blocks.append(block)
+        return "".join(self.read_blocks)
+
+    def mmap(self):
+        """Returns a read-only memory map of the file, or None if the file is
+           compressed or empty (in which case the file should just be iterated
+           over).
+
+           Parsing a memory-mapped file means that the parser doesn't have to
+           copy every line of the file into a Python string (which, for files
+           with very long sequence lines, can take up a lot of memory). Since
+           the mapped pages are backed by the file itself, the OS can reclaim
+           them once the parser has moved past them.
+        """
+        if self.compression is not None:
+            return None
+        if os.fstat(self.raw_file.fileno()).st_size == 0:
+            # mmap can't map empty files
+            return None
+        if self.mapped_file is None:
+            self.mapped_file = mmap.mmap(self.raw_file.fileno(), 0,
+                access=mmap.ACCESS_READ)
+        return self.mapped_file
+
+    def __iter__(self):
+        if self.compression is None:
+            return iter(self.raw_file)
+        return self.decompressed_lines()
+
+    def blocks(self):
+        """Generator that yields the (decompressed) contents of the file in
+           blocks of arbitrary size, without regard for line boundaries.
+
+           This is useful for parsing filetypes that aren't line-based (e.g.
+           GML), since it means that we never have to hold a very long line
+           of the file in memory at once.
+        """
+        if self.compression is None:
+            while True:
+                block = self.raw_file.read(config.READ_BLOCK_SIZE)
+                if block == "":
+                    break
+                yield block
+            return
+        read_blocks = self.read_blocks
+        self.read_blocks = []
+        while True:
+            if len(read_blocks) > 0:
+                block = read_blocks.pop(0)
+            else:
+                block = self.next_block()
+                if block is None:
+                    break
+            yield block
+
+    def decompressed_lines(self):
+        """Generator that yields the lines of a compressed file."""
+        # The last line of each block is usually cut off partway, so we hold
+        # on to it until we've read the next block
+        leftover = ""
+        for block in self.blocks():
+            lines = StringIO(leftover + block).readlines()
+            if lines[-1][-1] != "\n":
+                leftover = lines.pop()
+            else:
+                leftover = ""
+            for line in lines:
+                yield line
+        if leftover != "":
+            yield leftover
+
+    def close(self):
+        """Closes the file (and its memory map, if one was created), and stops
+           the decompression thread (if this file is compressed).
+        """
+        self.stop_event.set()
+        if self.block_queue is not None:
+            self.reader_thread.join()
+        if self.mapped_file is not None:
+            self.mapped_file.close()
+        self.raw_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,273 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# A cache of "snapshots" of parsed assembly graphs, so that running collate.py
+# on the same assembly graph file multiple times (e.g. to try out different
+# layout settings) only requires parsing the file once.
+#
+# A snapshot contains all of the records (NodeRecords, EdgeRecords, etc.) that a
+# parser generated for a file,
+# stored using the marshal module (which is a lot faster to load than
+# re-parsing the file, or than loading a pickle). collate.py
+# builds the assembly graph from these records in the same way regardless of
+# whether they came from a snapshot or from a parser. Snapshots are keyed by a
+# hash of the assembly graph file's contents, parsers.PARSER_VERSION, and
+# whether or not sequences are being stored.
+#
+# A snapshot file consists of the snapshot format version; the SequenceRecords
+# (if sequences are being stored), marshalled one at a time and followed by
+# None; the lists of NodeRecords, EdgeRecords, and ReadCountRecords; and a
+# trailer giving the offset of these lists in the file. This lets the
+# SequenceRecords be written while the file is being parsed, and be read back
+# one at a time after the other records -- so the sequences of an assembly
+# never have to be in memory all at once.
+
+import os
+import errno
+import hashlib
+import marshal
+import struct
+import tempfile
+import config
+import parsers
+
+# The suffix of snapshot files in the cache directory
+SNAPSHOT_SUFFIX = ".snapshot"
+# Bump this whenever the layout of snapshot files changes
+SNAPSHOT_VERSION = 4
+# The format of the trailer at the end of a snapshot file, which gives the
+# offset of the snapshot's lists of node/edge/read count records (see
+# ParseCache.parse_and_save())
+TRAILER_FORMAT = "<q"
+TRAILER_SIZE = struct.calcsize(TRAILER_FORMAT)
+
+class ParseCache(object):
+    """A directory of snapshots of parsed assembly graphs.
+
+       Once the total size of the snapshots in the directory exceeds
+       max_size bytes, the least recently used snapshots are removed.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """Initializes the cache, creating cache_dir if needed."""
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise IOError, cache_dir + config.EXISTS_AS_NON_DIR_ERR
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # The temporary files of snapshots that are still being written (see
+        # parse_and_save())
+        self.temp_paths = set()
+
+    def snapshot_path(self, asm_fn, asm_parser):
+        """Returns the path of the snapshot for the given assembly graph
+           file, as parsed by asm_parser (whether or not that snapshot
+           exists).
+        """
+        h = hashlib.sha1("%d %d %d " % (SNAPSHOT_VERSION,
+            parsers.PARSER_VERSION, asm_parser.store_sequences))
+        with open(asm_fn, 'rb') as f:
+            while True:
+                chunk = f.read(config.READ_BLOCK_SIZE)
+                if chunk == "":
+                    break
+                h.update(chunk)
+        return os.path.join(self.cache_dir, h.hexdigest() + SNAPSHOT_SUFFIX)
+
+    def records(self, asm_fn, asm_parser):
+        """Returns an iterator over the records of the assembly graph file
+           with the given filename, which asm_parser is a parser for.
+
+           If a snapshot of the file exists in the cache, the records are
+           loaded from that snapshot. Otherwise, the records come from
+           asm_parser, and a snapshot is saved once all of them have been
+           iterated over.
+        """
+        path = self.snapshot_path(asm_fn, asm_parser)
+        snapshot = self.load(path)
+        if snapshot is not None:
+            return snapshot
+        return self.parse_and_save(path, asm_parser)
+
+    def load(self, path):
+        """Returns an iterator over the records in the snapshot at the given
+           path, or None if that snapshot doesn't exist (or can't be loaded).
+        """
+        try:
+            f = open(path, 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        try:
+            version = marshal.load(f)
+            if version != SNAPSHOT_VERSION:
+                f.close()
+                return None
+            sequences_offset = f.tell()
+            # (A file shorter than the trailer can't be seeked into like this,
+            # which raises an IOError)
+            f.seek(-TRAILER_SIZE, os.SEEK_END)
+            trailer_offset = f.tell()
+            lists_offset = struct.unpack(TRAILER_FORMAT,
+                f.read(TRAILER_SIZE))[0]
+            f.seek(lists_offset)
+            node_tuples = marshal.load(f)
+            edge_tuples = marshal.load(f)
+            read_count_tuples = marshal.load(f)
+            if f.tell() != trailer_offset:
+                raise ValueError
+        except (EOFError, ValueError, TypeError, IOError, struct.error):
+            # The snapshot was truncated or otherwise corrupted, so just
+            # get rid of it
+            f.close()
+            os.remove(path)
+            return None
+        # Mark this snapshot as recently used, so it won't be evicted soon
+        os.utime(path, None)
+        # Every edge's nodes are declared before that edge in the original
+        # file, so we don't need to preserve the interleaving of nodes and
+        # edges -- just their relative order. (Sequences are only stored in
+        # the .db file, so they can go anywhere; read counts just have to come
+        # after all of the nodes.)
+        return self.snapshot_records(path, f, sequences_offset, [
+            (parsers.NodeRecord, node_tuples),
+            (parsers.EdgeRecord, edge_tuples),
+            (parsers.ReadCountRecord, read_count_tuples)])
+
+    @staticmethod
+    def snapshot_records(path, snapshot_file, sequences_offset, sections):
+        """Generator that yields the records in sections, a list of (record
+           class, list of tuples) pairs, in order; and then the
+           SequenceRecords stored in the snapshot file starting at
+           sequences_offset, which are read from the file one at a time.
+
+           Each section is removed from sections (and its list of tuples is
+           freed) as soon as all of its records have been yielded, so the
+           records loaded from a snapshot never take up much more memory than
+           the snapshot's node and edge lists.
+
+           Raises an IOError (after removing the snapshot at path) if the
+           SequenceRecords turn out to be corrupted.
+        """
+        with snapshot_file:
+            while len(sections) > 0:
+                record_class, tuples = sections.pop(0)
+                for t in tuples:
+                    yield record_class._make(t)
+                del tuples
+            snapshot_file.seek(sequences_offset)
+            while True:
+                try:
+                    t = marshal.load(snapshot_file)
+                except (EOFError, ValueError, TypeError):
+                    os.remove(path)
+                    raise IOError, path + config.CORRUPT_SNAPSHOT_ERR
+                if t is None:
+                    break
+                yield parsers.SequenceRecord._make(t)
+
+    def parse_and_save(self, path, asm_parser):
+        """Generator that yields the records from asm_parser, while saving a
+           snapshot of these records at the given path.
+
+           SequenceRecords are written to the snapshot as soon as they're
+           generated, so they never pile up in memory. The other records are
+           written once all of the records have been generated.
+        """
+        node_tuples = []
+        edge_tuples = []
+        read_count_tuples = []
+        # Write the snapshot to a temporary file first, so that a snapshot
+        # that's only been partially written is never loaded
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        self.temp_paths.add(temp_path)
+        renamed = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(SNAPSHOT_VERSION, f)
+                for record in asm_parser.records():
+                    # marshal can't handle namedtuples, so store plain tuples
+                    if type(record) == parsers.NodeRecord:
+                        node_tuples.append(tuple(record))
+                    elif type(record) == parsers.EdgeRecord:
+                        edge_tuples.append(tuple(record))
+                    elif type(record) == parsers.SequenceRecord:
+                        marshal.dump(tuple(record), f)
+                    else:
+                        read_count_tuples.append(tuple(record))
+                    yield record
+                # Mark the end of the SequenceRecords
+                marshal.dump(None, f)
+                lists_offset = f.tell()
+                marshal.dump(node_tuples, f)
+                marshal.dump(edge_tuples, f)
+                marshal.dump(read_count_tuples, f)
+                f.write(struct.pack(TRAILER_FORMAT, lists_offset))
+            os.rename(temp_path, path)
+            renamed = True
+        finally:
+            # (This includes the GeneratorExit raised if we stop being
+            # iterated over before all of the records have been generated)
+            if not renamed:
+                self.remove_temp_file(temp_path)
+            self.temp_paths.discard(temp_path)
+        self.evict()
+
+    def remove_temp_file(self, temp_path):
+        """Removes a snapshot's temporary file, if it still exists."""
+        try:
+            os.remove(temp_path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def discard(self):
+        """Removes the temporary files of any snapshots that are still being
+           written.
+
+           If whatever is iterating over parse_and_save() raises an exception
+           partway through, the generator isn't resumed (and might not be
+           closed until much later, if at all), so its temporary file would
+           otherwise be left in the cache directory -- where evict() never
+           looks for it. collate.py registers this to be called when it exits.
+        """
+        for temp_path in list(self.temp_paths):
+            self.remove_temp_file(temp_path)
+        self.temp_paths.clear()
+
+    def evict(self):
+        """Removes the least recently used snapshots from the cache until the
+           total size of the snapshots in the cache is at most
+           self.max_size bytes.
+        """
+        snapshots = []
+        total_size = 0
+        for fn in os.listdir(self.cache_dir):
+            if fn.endswith(SNAPSHOT_SUFFIX):
+                st = os.stat(os.path.join(self.cache_dir, fn))
+                snapshots.append((st.st_mtime, st.st_size, fn))
+                total_size += st.st_size
+        snapshots.sort()
+        for mtime, size, fn in snapshots:
+            if total_size <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, fn))
+            total_size -= size
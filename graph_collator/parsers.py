@@ -0,0 +1,797 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Parsers for the assembly graph filetypes that collate.py supports.
+#
+# Each parser is a subclass of AssemblyGraphParser whose records() method is
+# a generator that yields a NodeRecord for each node and an EdgeRecord for
+# each edge in the assembly graph, in the order they're declared in the file
+# (plus SequenceRecords for the nodes' sequences, if these are being stored,
+# and ReadCountRecords for filetypes that can include read tracking data).
+# collate.py builds the assembly graph from these records without caring
+# about which filetype they came from -- so adding support for a new filetype
+# just involves writing a new parser class and adding it to PARSERS below.
+
+import re
+import string
+import mmap
+import multiprocessing
+from collections import namedtuple
+import config
+import sequence_utils
+
+# A node in the assembly graph.
+#
+# For "double-stranded" filetypes (see AssemblyGraphParser.double_stranded),
+# each NodeRecord describes both a node and its reverse complement: id is
+# the ID of the positive node (the reverse complement node's ID is "-" + id),
+# and gc_fwd/gc_rev are the G/C contents of the node's forward/reverse
+# sequences.
+#
+# gc_count is the total number of G/C nucleotides in the node's sequence(s)
+# -- so for double-stranded filetypes, this includes the G/C nucleotides in
+# both the forward and reverse sequences. gc_fwd, gc_rev, and gc_count are
+# None if no DNA sequence was given for the node.
+NodeRecord = namedtuple("NodeRecord", ("id", "length", "gc_fwd", "gc_rev",
+    "gc_count", "depth", "label", "is_reverse", "is_repeat"))
+NodeRecord.__new__.__defaults__ = (None, None, None, None, None, False, None)
+
+# An edge in the assembly graph, from source_id to target_id. These IDs are
+# oriented (e.g. "-5" refers to the reverse complement of node "5").
+#
+# For double-stranded filetypes, each EdgeRecord implies another edge from
+# -target_id to -source_id (see collate.py).
+EdgeRecord = namedtuple("EdgeRecord", ("source_id", "target_id",
+    "multiplicity", "orientation", "mean", "stdev"))
+EdgeRecord.__new__.__defaults__ = (None, None, None, None)
+
+# A block of up to config.SEQUENCE_BLOCK_SIZE nucleotides of the forward DNA
+# sequence of the node with the given (positive) ID, packed using
+# sequence_utils.pack_sequence(). block_index is the position of this block
+# within the sequence (0 for the first block, 1 for the next, etc.) and length
+# is the number of nucleotides in the block.
+#
+# These are only generated if the parser was created with store_sequences set
+# to True, in which case all of the SequenceRecords for a node are generated
+# before that node's NodeRecord.
+SequenceRecord = namedtuple("SequenceRecord", ("node_id", "block_index",
+    "length", "packed", "exceptions"))
+
+# The number of reads that were mapped to the node with the given (oriented)
+# ID. A node can have more than one ReadCountRecord, in which case the counts
+# should be added together. These are generated after the node's NodeRecord.
+ReadCountRecord = namedtuple("ReadCountRecord", ("node_id", "read_count"))
+
+class AssemblyGraphParser(object):
+    """Abstract class for a parser of an assembly graph file.
+
+       Subclasses should define filetype, double_stranded, and dna_given,
+       and should implement the sniff() and records() methods.
+    """
+
+    # The name of the filetype, as stored in the .db file
+    filetype = None
+    # The filename suffix usually used for this filetype; this is only used
+    # when detecting a file's filetype if sniff() fails (see get_parser())
+    suffix = None
+    # If True, then each node in the file implicitly has a reverse
+    # complement node and each edge in the file implicitly has a reverse
+    # complement edge (i.e. the file describes the single graph, and the
+    # double graph is derived from it)
+    double_stranded = True
+    # Whether or not this filetype can contain DNA sequences. If this is
+    # True, collate.py still checks that each node actually had a DNA
+    # sequence given (see NodeRecord.gc_count).
+    dna_given = True
+
+    # A regular expression matching the position just before a place in the
+    # file where parsing can start (i.e. where no state from the preceding
+    # lines is needed to parse the following lines), used when splitting
+    # files into chunks to parse in parallel. Filetypes that can't be parsed
+    # in parallel leave this as None.
+    chunk_start_re = None
+
+    def __init__(self, assembly_file, jobs=1, store_sequences=False):
+        """Initializes the parser for an open assembly graph file (an
+           input_files.AssemblyFile object).
+
+           If jobs is greater than 1 and the filetype supports it, then
+           large files are parsed in parallel using that many processes (see
+           parallel_records()).
+
+           If store_sequences is True and the filetype contains DNA
+           sequences, then SequenceRecords are generated for each node's
+           forward sequence.
+        """
+        self.assembly_file = assembly_file
+        self.jobs = jobs
+        self.store_sequences = store_sequences
+
+    @staticmethod
+    def sniff(head_lines):
+        """Returns True if the given list of lines from the start of a file
+           (excluding blank lines) looks like this parser's filetype.
+        """
+        raise NotImplementedError
+
+    def records(self):
+        """Returns an iterator that yields a NodeRecord or EdgeRecord for each
+           node or edge declared in the assembly graph file (and
+           SequenceRecords, if self.store_sequences is True).
+
+           By default, this parses the file via mmap_records() if the file
+           can be memory-mapped (parallelizing this via parallel_records() if
+           possible), and via line_records() otherwise.
+        """
+        buf = self.assembly_file.mmap()
+        if buf is None:
+            return self.line_records()
+        if self.jobs > 1 and self.chunk_start_re is not None and \
+                len(buf) >= config.PARALLEL_PARSE_MIN_SIZE:
+            return self.parallel_records(buf)
+        return self.mmap_records(buf, 0, len(buf))
+
+    def line_records(self):
+        """Generator that yields records by iterating over the lines of the
+           assembly graph file.
+        """
+        raise NotImplementedError
+
+    def mmap_records(self, buf, start, end):
+        """Generator that yields records from buf[start:end], where buf is a
+           memory-mapped assembly graph file.
+
+           start will always either be 0 or a position in the file just after
+           a match of chunk_start_re.
+        """
+        raise NotImplementedError
+
+    def chunk_boundaries(self, buf, chunk_count):
+        """Splits buf into (roughly) chunk_count chunks that can be parsed
+           independently, and returns a list of (start, end) tuples
+           describing these chunks.
+
+           Each chunk (besides the first) starts right after a match of
+           chunk_start_re, so chunks can be somewhat larger or smaller than
+           len(buf) / chunk_count bytes.
+        """
+        size = len(buf)
+        starts = [0]
+        for c in xrange(1, chunk_count):
+            nominal_start = max(size * c / chunk_count, starts[-1])
+            match = self.chunk_start_re.search(buf, nominal_start)
+            if match is None:
+                # The rest of the file has to go in the previous chunk
+                break
+            if match.end() > starts[-1]:
+                starts.append(match.end())
+        return zip(starts, starts[1:] + [size])
+
+    def parallel_records(self, buf):
+        """Generator that yields the same records as mmap_records(buf, 0,
+           len(buf)) would, in the same order, but parses chunks of buf in
+           parallel using self.jobs processes.
+
+           Each process memory-maps the file itself (so the file's contents
+           are never sent between processes), and sends back a list of the
+           records in its chunk.
+        """
+        chunks = self.chunk_boundaries(buf,
+            self.jobs * config.PARSE_CHUNKS_PER_JOB)
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            chunk_args = [(type(self), self.assembly_file.filename,
+                self.store_sequences, start, end) for start, end in chunks]
+            # imap() returns the chunks' records in order, so we can start
+            # building the graph from the first chunk while later chunks are
+            # still being parsed
+            for chunk_records in pool.imap(parse_chunk, chunk_args):
+                for record in chunk_records:
+                    yield record
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+class LastGraphParser(AssemblyGraphParser):
+    """Parses Velvet's LastGraph files.
+
+       The file starts with a header line of three or four integers. Each
+       node is declared by a NODE line followed by a line containing the
+       node's forward sequence and a line containing its reverse sequence;
+       each edge is declared by an ARC line.
+
+       If Velvet was run with read tracking enabled (-read_trkg yes), the
+       file also contains NR sections (each an "NR node_id read_count" line,
+       followed by a line for each of these reads) and SEQ sections (which
+       describe where long reads were mapped). These can be a lot bigger than
+       the rest of the file. Only the read counts given on NR lines are
+       used; the lines for individual reads are skipped over.
+    """
+
+    filetype = "LastGraph"
+    suffix = config.LASTGRAPH_SUFFIX
+    # Chunks start at a NODE line or an ARC line (i.e. never partway through
+    # a node's declaration)
+    chunk_start_re = re.compile(r"\n(?=(?:NODE|ARC)\t)")
+
+    # Matches the NR line that starts an NR section, capturing the node ID
+    # and read count
+    NR_LINE_RE = re.compile(r"^NR\t(\S+)\t(\d+)", re.MULTILINE)
+
+    @staticmethod
+    def sniff(head_lines):
+        header = head_lines[0].split()
+        return 3 <= len(header) <= 4 and all(h.isdigit() for h in header)
+
+    @staticmethod
+    def node_info(l):
+        """Returns the ID, length, and depth of a node given the fields of
+           its NODE line.
+        """
+        curr_node_bp = int(l[2])
+        # depth = $O_COV_SHORT1 / $COV_SHORT1 (bp)
+        return l[1], curr_node_bp, float(l[3]) / curr_node_bp
+
+    @staticmethod
+    def arc_record(a):
+        """Returns an EdgeRecord given the fields of an ARC line."""
+        # ARC information is only stored on one line -- makes things
+        # simple for us
+        # Per the Velvet docs: "This one line implicitly represents
+        # an arc from node A to B and another, with same
+        # multiplicity, from -B to -A."
+        # (http://computing.bio.cam.ac.uk/local/doc/velvet.pdf)
+        return EdgeRecord(a[1], a[2], multiplicity=int(a[3]))
+
+    @staticmethod
+    def read_tracking_end(buf, start, end):
+        """Returns the position in buf[start:end] at which the read tracking
+           information starting at start ends (i.e. the start of the next
+           NODE or ARC line, or end if there isn't one).
+
+           This is a single regular expression search over buf, so skipping
+           over the (possibly many) lines of read tracking information
+           doesn't involve looking at each of these lines in Python.
+        """
+        match = LastGraphParser.chunk_start_re.search(buf, start, end)
+        if match is None:
+            return end
+        return match.end()
+
+    def line_records(self):
+        curr_node_id = ""
+        curr_node_bp = 1
+        curr_node_depth = 1
+        curr_node_gcfwd = None
+        curr_node_gcfwd_ct = None
+        parsing_node = False
+        parsed_fwdseq = False
+        for line in self.assembly_file:
+            if line[:4] == "NODE":
+                parsing_node = True
+                curr_node_id, curr_node_bp, curr_node_depth = \
+                    LastGraphParser.node_info(line.split())
+            elif line[:3] == "ARC":
+                yield LastGraphParser.arc_record(line.split())
+            elif line[:3] == "NR\t":
+                # (The lines for individual reads following this line are
+                # ignored, since parsing_node is False)
+                l = line.split()
+                yield ReadCountRecord(l[1], int(l[2]))
+            elif parsing_node:
+                # If we're in the middle of parsing a node's info and
+                # the current line doesn't match either a NODE or ARC
+                # declaration, then it refers to the node's DNA sequence.
+                # It can either refer to the forward or reverse sequence -- in
+                # LastGraph files, the forward sequence occurs first.
+                if parsed_fwdseq:
+                    # Parsing reverse sequence
+                    curr_node_gcrev, gc_ct = \
+                        sequence_utils.gc_content(line.strip())
+                    # Now that we've parsed both the forward and reverse
+                    # sequences for the node's DNA, we are done getting data
+                    # for this node.
+                    # Note that only yielding nodes here ensures that only
+                    # "fully complete" node definitions are recorded.
+                    yield NodeRecord(curr_node_id, curr_node_bp,
+                        gc_fwd=curr_node_gcfwd, gc_rev=curr_node_gcrev,
+                        gc_count=curr_node_gcfwd_ct + gc_ct,
+                        depth=curr_node_depth)
+                    parsing_node = False
+                    parsed_fwdseq = False
+                else:
+                    # Parsing forward sequence (It's actually offset by a
+                    # number of bp, so we should probably mention that in
+                    # README or even in the Javascript graph viewer)
+                    parsed_fwdseq = True
+                    fwdseq = line.strip()
+                    curr_node_gcfwd, curr_node_gcfwd_ct = \
+                        sequence_utils.gc_content(fwdseq)
+                    if self.store_sequences:
+                        for sr in sequence_records(curr_node_id, fwdseq, 0,
+                                len(fwdseq)):
+                            yield sr
+
+    def mmap_records(self, buf, start, end):
+        """Like line_records(), but parses a memory-mapped file.
+
+           Sequence lines are never copied into Python strings in their
+           entirety; their G/C content is computed directly from buf (see
+           sequence_utils.buffer_gc_content()).
+        """
+        curr_node_id = ""
+        curr_node_bp = 1
+        curr_node_depth = 1
+        curr_node_gcfwd = None
+        curr_node_gcfwd_ct = None
+        parsing_node = False
+        parsed_fwdseq = False
+        pos = start
+        while pos < end:
+            eol = buf.find("\n", pos, end)
+            if eol == -1:
+                eol = end
+            if buf[pos:pos + 4] == "NODE":
+                parsing_node = True
+                curr_node_id, curr_node_bp, curr_node_depth = \
+                    LastGraphParser.node_info(buf[pos:eol].split())
+            elif buf[pos:pos + 3] == "ARC":
+                yield LastGraphParser.arc_record(buf[pos:eol].split())
+            elif buf[pos:pos + 3] == "NR\t" or buf[pos:pos + 4] == "SEQ\t":
+                # Skip to the next NODE/ARC line (if any) in one go, picking
+                # out the read counts on the NR lines along the way
+                section_end = LastGraphParser.read_tracking_end(buf, pos, end)
+                for m in LastGraphParser.NR_LINE_RE.finditer(buf, pos,
+                        section_end):
+                    yield ReadCountRecord(m.group(1), int(m.group(2)))
+                pos = section_end
+                continue
+            elif parsing_node:
+                seq_start, seq_end = strip_range(buf, pos, eol)
+                gc, gc_ct = sequence_utils.buffer_gc_content(buf, seq_start,
+                    seq_end)
+                if parsed_fwdseq:
+                    yield NodeRecord(curr_node_id, curr_node_bp,
+                        gc_fwd=curr_node_gcfwd, gc_rev=gc,
+                        gc_count=curr_node_gcfwd_ct + gc_ct,
+                        depth=curr_node_depth)
+                    parsing_node = False
+                    parsed_fwdseq = False
+                else:
+                    parsed_fwdseq = True
+                    curr_node_gcfwd = gc
+                    curr_node_gcfwd_ct = gc_ct
+                    if self.store_sequences:
+                        for sr in sequence_records(curr_node_id, buf,
+                                seq_start, seq_end):
+                            yield sr
+            pos = eol + 1
+
+class GFAParser(AssemblyGraphParser):
+    """Parses GFA (v1) files.
+
+       Currently, we only parse (S)egment and (L)ink lines in GFA files,
+       and only take into account their "required" fields (as given on the
+       GFA spec), along with the LN (length) optional field of S lines.
+    """
+    # TODO--
+    # We can look into parsing S+L optional fields, as well as
+    # (C)ontainment and (P)ath lines (and, more
+    # importantly, making use of this data in the AsmViz viewer) in the
+    # future, but for now having Segment + Link data should match what we
+    # have for the other two supported input assembly graph filetypes.
+
+    filetype = "GFA"
+    suffix = config.GFA_SUFFIX
+    # Each line in a GFA file is independent, so chunks can start at any line
+    chunk_start_re = re.compile(r"\n")
+
+    # The record types defined in GFA 1
+    LINE_START_RE = re.compile(r"[HSLCP]\t")
+
+    @staticmethod
+    def sniff(head_lines):
+        return GFAParser.LINE_START_RE.match(head_lines[0]) is not None
+
+    @staticmethod
+    def node_id(segment_name):
+        """Returns the node ID to use for a GFA segment name.
+
+           e.g. node_id("NODE_5_length_100_cov_2.5") == "5"
+                node_id("tig00000005") == "00000005"
+                node_id("5") == "5"
+        """
+        if segment_name.startswith("NODE_"):
+            return segment_name.split("_")[1]
+        elif segment_name.startswith("tig"):
+            return segment_name[3:]
+        return segment_name
+
+    @staticmethod
+    def segment_record(l):
+        """Returns a NodeRecord given the fields of an S line."""
+        # For GFA files: given a + DNA seq, its - DNA seq is the
+        # reverse complement of that DNA seq.
+        curr_node_id = GFAParser.node_id(l[1])
+        # The sequence data can be optionally not given -- in this
+        # case, a single asterisk, *, will be located at l[2].
+        if l[2] != "*":
+            # The G/C content of a DNA sequence "m" will always equal
+            # the G/C content of the reverse complement of m, since
+            # a reverse complement just flips A <-> T and C <-> G --
+            # meaning that the total count of C + G occurrences does
+            # not change.
+            # Hence, we just need to calculate the G/C content here
+            # once. This is not the case for LastGraph nodes, though.
+            # (For the same reason -- and since only forward sequences
+            # are stored in the .db file -- we don't need to compute
+            # the reverse complement of this sequence at all.)
+            curr_node_gc, gc_ct = sequence_utils.gc_content(l[2])
+            return NodeRecord(curr_node_id, len(l[2]), gc_fwd=curr_node_gc,
+                gc_rev=curr_node_gc, gc_count=(2 * gc_ct))
+        else:
+            # Allow user to not include DNA but indicate seq length via
+            # the LN property
+            curr_node_bp = None
+            for seq_attr in l[3:]:
+                if seq_attr.startswith("LN:i:"):
+                    curr_node_bp = int(seq_attr[5:])
+                    break
+            if curr_node_bp == None:
+                errmsg = config.SEQ_NOUN + curr_node_id + config.NO_DNA_ERR
+                raise AttributeError, errmsg
+            return NodeRecord(curr_node_id, curr_node_bp)
+
+    @staticmethod
+    def link_record(a):
+        """Returns an EdgeRecord given the fields of an L line."""
+        id1 = GFAParser.node_id(a[1])
+        id2 = GFAParser.node_id(a[3])
+        id1 = id1 if a[2] != '-' else '-' + id1
+        id2 = id2 if a[4] != '-' else '-' + id2
+        return EdgeRecord(id1, id2)
+
+    def line_records(self):
+        for line in self.assembly_file:
+            # Parsing a segment (node) line
+            if line.startswith("S"):
+                l = line.split()
+                if self.store_sequences and l[2] != "*":
+                    for sr in sequence_records(GFAParser.node_id(l[1]), l[2],
+                            0, len(l[2])):
+                        yield sr
+                yield GFAParser.segment_record(l)
+            # Parsing a link (edge) line from some id1 to id2
+            elif line.startswith("L"):
+                yield GFAParser.link_record(line.split())
+
+    def mmap_records(self, buf, start, end):
+        """Like line_records(), but parses a memory-mapped file.
+
+           The boundaries of the fields in each S line are found by scanning
+           buf for tabs, so the segment's sequence is never copied into a
+           Python string in its entirety; its length and G/C content are
+           computed directly from buf (see
+           sequence_utils.buffer_gc_content()).
+        """
+        pos = start
+        while pos < end:
+            eol = buf.find("\n", pos, end)
+            if eol == -1:
+                eol = end
+            line_type = buf[pos]
+            if line_type == "S":
+                name_start = buf.find("\t", pos, eol) + 1
+                seq_start = buf.find("\t", name_start, eol) + 1
+                seq_end = buf.find("\t", seq_start, eol)
+                if seq_end == -1:
+                    seq_end = eol
+                seq_start, seq_end = strip_range(buf, seq_start, seq_end)
+                if name_start == 0 or seq_start == 0 or \
+                        (seq_end - seq_start == 1 and buf[seq_start] == "*"):
+                    # Either this line isn't tab-separated or it doesn't
+                    # contain a sequence, so just parse it normally (the
+                    # line won't contain a long sequence, anyway)
+                    l = buf[pos:eol].split()
+                    if self.store_sequences and l[2] != "*":
+                        for sr in sequence_records(GFAParser.node_id(l[1]),
+                                l[2], 0, len(l[2])):
+                            yield sr
+                    yield GFAParser.segment_record(l)
+                else:
+                    curr_node_id = GFAParser.node_id(
+                        buf[name_start:seq_start - 1])
+                    if self.store_sequences:
+                        for sr in sequence_records(curr_node_id, buf,
+                                seq_start, seq_end):
+                            yield sr
+                    gc, gc_ct = sequence_utils.buffer_gc_content(buf,
+                        seq_start, seq_end)
+                    yield NodeRecord(curr_node_id, seq_end - seq_start,
+                        gc_fwd=gc, gc_rev=gc, gc_count=(2 * gc_ct))
+            elif line_type == "L":
+                yield GFAParser.link_record(buf[pos:eol].split())
+            pos = eol + 1
+
+class GMLParser(AssemblyGraphParser):
+    """Parses GML files produced by MetaCarvel (Bambus 3).
+
+       Nodes in these files are already oriented, so there are no implied
+       reverse complement nodes/edges. These files don't contain DNA, but
+       they might contain repeat information for nodes and bundle size
+       information for edges.
+
+       The file is split into tokens by tokens(), so this doesn't make any
+       assumptions about how the file is laid out (e.g. attributes can be on
+       the same line as each other, or as the "node [" that starts their
+       node).
+    """
+
+    filetype = "GML"
+    suffix = config.GRAPHML_SUFFIX
+    double_stranded = False
+    dna_given = False
+
+    GRAPH_START_RE = re.compile(r"(^|\s)graph\s*\[")
+    # A GML token is a string (in double quotes), a bracket, or any other
+    # run of non-whitespace characters (a key or a number). The closing
+    # quote of a string is optional so that a string that's been cut off at
+    # the end of a block can still be matched (see tokens()).
+    TOKEN_RE = re.compile(r'"[^"]*"?|[\[\]]|[^\s\["\]]+')
+    # Characters that can't be in any strings in a block of GML that's
+    # tokenized using str.split() (see tokenize())
+    SPLIT_UNSAFE_RE = re.compile(r"[\s\[\]]")
+
+    @staticmethod
+    def sniff(head_lines):
+        # GML files can start with arbitrary key-value pairs (e.g. "Creator"),
+        # so look for the start of the graph anywhere in the head of the file
+        for line in head_lines:
+            if GMLParser.GRAPH_START_RE.search(line) is not None:
+                return True
+        return False
+
+    def token_lists(self):
+        """Generator that yields lists of the tokens in the GML file, in
+           order (one list per block of the file read).
+
+           A token is a string (in double quotes), a bracket, or any other
+           run of non-whitespace characters (a key or a number).
+        """
+        leftover = ""
+        for block in self.assembly_file.blocks():
+            data = leftover + block
+            # Tokenize everything up to the last whitespace in the block,
+            # since the last token in the block might continue in the next
+            # block...
+            cut = max(data.rfind(" "), data.rfind("\n"), data.rfind("\t"),
+                data.rfind("\r"))
+            # ...unless that whitespace is within a string, in which case we
+            # cut off the block before that string starts
+            if data.count('"', 0, cut) % 2 == 1:
+                cut = data.rfind('"', 0, cut)
+            if cut <= 0:
+                leftover = data
+                continue
+            leftover = data[cut:]
+            yield GMLParser.tokenize(data[:cut])
+        yield GMLParser.tokenize(leftover)
+
+    @staticmethod
+    def tokenize(data):
+        """Returns a list of the tokens in a string of GML."""
+        # If none of the strings in data contain whitespace or brackets, then
+        # we can just split data on whitespace (after making sure brackets are
+        # surrounded by whitespace), which is a lot faster than using
+        # TOKEN_RE. The odd-indexed elements of data.split('"') are the
+        # contents of the strings in data.
+        if GMLParser.SPLIT_UNSAFE_RE.search("".join(data.split('"')[1::2])) \
+                is None:
+            return data.replace("[", " [ ").replace("]", " ] ").split()
+        return GMLParser.TOKEN_RE.findall(data)
+
+    @staticmethod
+    def node_record(attrs):
+        """Returns a NodeRecord given a dict mapping the keys of a node's
+           attributes to their values (with quotes removed from strings).
+        """
+        get = attrs.get
+        label = get("label")
+        if label is not None and label.startswith("NODE_"):
+            label = "NODE_" + label.split("_")[1]
+        is_repeat = get("repeat")
+        if is_repeat is not None:
+            is_repeat = int(is_repeat)
+        # TODO pass the repeat value via optional arg to Node()
+        # Then store the repeat thing in db_values, modifying the
+        # corresponding database construction thing for nodes also
+        # then in the viewer application in renderNodeObject()
+        # if the node has repeat === 1 then we can assign its
+        # repeatColor as the 100% color, and else we can assign its
+        # repeatColor as the 0% color. Then adding colorization
+        # stuff should just be a function of modifying the GC
+        # content stuff
+        # Also the detection of a single node where
+        # curr_node_is_repeat != None should result in a
+        # REPEAT_INFO_AVAILABLE var or something getting set to
+        # true, which should then be stored in the assembly table
+        # in the database. we'll use that in the viewer JS.
+        # (NodeRecords are constructed using positional arguments here since
+        # that's a good deal faster than using keyword arguments.)
+        return NodeRecord(get("id"), int(get("length", 0)), None, None, None,
+            None, label, get("orientation") == "REV", is_repeat)
+
+    @staticmethod
+    def edge_record(attrs):
+        """Returns an EdgeRecord given a dict mapping the keys of an edge's
+           attributes to their values (with quotes removed from strings).
+        """
+        get = attrs.get
+        bsize = get("bsize")
+        if bsize is not None:
+            bsize = int(bsize)
+        mean = get("mean")
+        if mean is not None:
+            mean = float(mean)
+        stdev = get("stdev")
+        if stdev is not None:
+            stdev = float(stdev)
+        return EdgeRecord(get("source"), get("target"), bsize,
+            get("orientation"), mean, stdev)
+
+    def records(self):
+        # The keys of the lists we're currently in, from the outermost list
+        # inwards (e.g. ["graph", "node"] when we're in a node declaration)
+        list_keys = []
+        # The key whose value is the next token (or None, if the next token
+        # is a key or the end of a list)
+        key = None
+        # The attributes of the node or edge we're currently in (or None, if
+        # we aren't directly within a node or edge -- so the contents of lists
+        # within nodes or edges, e.g. "graphics [ ... ]", are ignored)
+        attrs = None
+        # The attributes of the node or edge containing the list we're
+        # currently in, if we're in a list within a node or edge
+        record_attrs = None
+        for tokens in self.token_lists():
+            for token in tokens:
+                if key is None:
+                    if token != "]":
+                        key = token
+                        continue
+                    # End of a list
+                    if len(list_keys) == 2 and list_keys[0] == "graph":
+                        if list_keys[1] == "node":
+                            yield GMLParser.node_record(attrs)
+                        elif list_keys[1] == "edge":
+                            yield GMLParser.edge_record(attrs)
+                        attrs = None
+                    elif len(list_keys) == 3:
+                        # We've left a list within a node or edge
+                        attrs = record_attrs
+                    if len(list_keys) > 0:
+                        list_keys.pop()
+                elif token == "[":
+                    # Start of a list
+                    list_keys.append(key)
+                    if len(list_keys) == 2 and list_keys[0] == "graph":
+                        attrs = {}
+                    elif len(list_keys) == 3:
+                        record_attrs = attrs
+                        attrs = None
+                    key = None
+                else:
+                    if attrs is not None:
+                        if token[0] == '"':
+                            attrs[key] = token.strip('"')
+                        else:
+                            attrs[key] = token
+                    key = None
+
+def strip_range(buf, start, end):
+    """Returns (start, end), adjusted to exclude any whitespace at the start
+       or end of buf[start:end] -- like str.strip(), but without copying
+       buf[start:end].
+    """
+    while start < end and buf[start] in string.whitespace:
+        start += 1
+    while end > start and buf[end - 1] in string.whitespace:
+        end -= 1
+    return start, end
+
+def sequence_records(node_id, buf, start, end):
+    """Generator that yields SequenceRecords for buf[start:end], the forward
+       sequence of the node with the given ID. buf can be a str or a
+       memory-mapped file.
+
+       Like sequence_utils.buffer_gc_content(), this only copies one block
+       of the sequence out of buf at a time.
+    """
+    for block_index, block_start in enumerate(xrange(start, end,
+            config.SEQUENCE_BLOCK_SIZE)):
+        block_end = min(block_start + config.SEQUENCE_BLOCK_SIZE, end)
+        packed, exceptions = sequence_utils.pack_sequence(
+            buf[block_start:block_end])
+        yield SequenceRecord(node_id, block_index, block_end - block_start,
+            packed, exceptions)
+
+def parse_chunk(args):
+    """Returns a list of the records in a chunk of an assembly graph file.
+
+       args is a (parser class, filename, store_sequences, chunk start, chunk
+       end) tuple. This is run in a worker process by
+       AssemblyGraphParser.parallel_records().
+    """
+    parser_class, filename, store_sequences, start, end = args
+    with open(filename, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            parser = parser_class(None, store_sequences=store_sequences)
+            return list(parser.mmap_records(buf, start, end))
+        finally:
+            buf.close()
+
+# All of the available parsers. When detecting the filetype of a file, each
+# parser's sniff() method is tried in this order.
+PARSERS = (GFAParser, LastGraphParser, GMLParser)
+
+# Bump this whenever a change to any of the parsers changes the records they
+# generate for some file, or the NodeRecord/EdgeRecord fields. Snapshots of
+# parsed files are keyed on this (see parse_cache.py), so bumping this makes
+# collate.py ignore snapshots created by older versions of the parsers.
+PARSER_VERSION = 2
+
+def sniff_filetype(head):
+    """Returns the parser class for the filetype that the given string (the
+       first config.SNIFF_SIZE bytes or so of a file) looks like, or None if
+       it doesn't look like any of the supported filetypes.
+    """
+    # Ignore blank lines and GFA-style comments. The last line in head might
+    # be cut off partway, but that's fine for our purposes.
+    head_lines = [line for line in head.splitlines()
+        if line.strip() != "" and not line.startswith("#")]
+    if len(head_lines) == 0:
+        return None
+    for parser_class in PARSERS:
+        if parser_class.sniff(head_lines):
+            return parser_class
+    return None
+
+def get_parser(assembly_file, jobs=1, store_sequences=False):
+    """Returns a parser for an assembly graph file that has been opened as
+       assembly_file (an input_files.AssemblyFile object), which will use up
+       to jobs processes to parse the file (and will generate SequenceRecords
+       if store_sequences is True).
+
+       The filetype is detected from the first few bytes of the file,
+       falling back on the filename's suffix (excluding any compression
+       suffix, e.g. ".gz") if that doesn't work. If neither works, an IOError
+       is raised.
+    """
+    parser_class = sniff_filetype(assembly_file.head())
+    if parser_class is None:
+        # We don't really care about case in file extensions
+        lowercase_asm_fn = assembly_file.name.lower()
+        for p in PARSERS:
+            if lowercase_asm_fn.endswith(p.suffix):
+                parser_class = p
+                break
+        else:
+            raise IOError, config.FILETYPE_ERR
+    return parser_class(assembly_file, jobs, store_sequences)
@@ -0,0 +1,266 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Detectors for the patterns (bubbles, superbubbles, frayed ropes, cycles, and
+# chains) that collate.py collapses nodes in the standard mode view into.
+#
+# Each detector is a subclass of PatternDetector. Detectors are run one after
+# another, in the order given by config.PATTERN_PRECEDENCE (or by -pp): since
+# a node can only be in one pattern, detectors that are run earlier take
+# precedence over detectors that are run later (see issue #87 on GitHub).
+# Adding a new kind of pattern just involves writing a new detector class and
+# adding it to DETECTORS below.
+#
+# Rather than trying every node in the graph, each detector has a worklist of
+# the nodes whose degrees allow them to be the start of its pattern (found
+# using the degree arrays of the graph's GraphCore). Nodes are dropped from
+# the worklist once they've been collapsed into a pattern: collapsing nodes
+# never makes another pattern valid, so no node has to be tried again.
+
+import time
+import numpy
+import config
+import graph_core
+import graph_objects
+
+class PatternDetector(object):
+    """Finds all of the patterns of one kind in an assembly graph.
+
+       Subclasses define worklist() and detect(), or override run() if
+       their patterns aren't found by trying individual nodes.
+    """
+
+    # The name of this detector, as used in config.PATTERN_PRECEDENCE
+    name = None
+    # The message displayed while this detector is running
+    message = None
+
+    def __init__(self, nodeid2obj):
+        """Initializes the detector, given the dict mapping node IDs to Node
+           objects in the standard mode view (all of which should be in the
+           same GraphCore).
+        """
+        self.nodeid2obj = nodeid2obj
+        # The number of patterns found and the time (in seconds) spent
+        # finding them, for the run report
+        self.match_count = 0
+        self.time = 0.0
+
+    def worklist(self, nodes, out_degrees, in_degrees):
+        """Returns a list of the nodes in nodes that could be the start of a
+           pattern, given NumPy arrays of these nodes' out- and in-degrees.
+        """
+        raise NotImplementedError
+
+    def detect(self, n):
+        """Returns a NodeGroup containing the pattern starting at n, or None
+           if there isn't one.
+        """
+        raise NotImplementedError
+
+    def run(self, nodes):
+        """Returns a list of the new NodeGroups found among nodes (a list of
+           Node objects), in the order they were found.
+        """
+        groups = []
+        if len(nodes) == 0:
+            return groups
+        core = nodes[0].core
+        indices = numpy.array([n.index for n in nodes], dtype=numpy.int64)
+        for n in self.worklist(nodes, core.double.out_degrees[indices],
+                core.double.in_degrees[indices]):
+            if n.used_in_collapsing:
+                continue
+            group = self.detect(n)
+            if group is not None:
+                groups.append(group)
+        return groups
+
+    def timed_run(self, nodes):
+        """Calls run(), recording the number of patterns it finds and the
+           time it takes.
+        """
+        start = time.time()
+        groups = self.run(nodes)
+        self.time += time.time() - start
+        self.match_count += len(groups)
+        return groups
+
+    def report(self):
+        """Returns a line describing what this detector has found, for the
+           run report.
+        """
+        return config.PATTERN_REPORT_MSG % (self.name, self.match_count,
+            self.time)
+
+    @staticmethod
+    def collapse(nodes, index_lists, group_class):
+        """Returns a list of the NodeGroups of type group_class made from
+           each list (or NumPy array) of node indices in index_lists, in
+           order, skipping lists that include a node that isn't in nodes or
+           that has already been used in collapsing.
+        """
+        groups = []
+        if len(nodes) == 0:
+            return groups
+        core = nodes[0].core
+        candidates = numpy.zeros(len(core.nodes), dtype=bool)
+        candidates[[n.index for n in nodes]] = True
+        for indices in index_lists:
+            if not candidates[indices].all():
+                continue
+            member_nodes = [core.nodes[i] for i in indices]
+            if any(m.used_in_collapsing for m in member_nodes):
+                continue
+            groups.append(group_class(*member_nodes))
+        return groups
+
+    @staticmethod
+    def select(nodes, mask):
+        """Returns a list of the nodes for which the given NumPy boolean
+           array is True.
+        """
+        return [nodes[k] for k in numpy.flatnonzero(mask)]
+
+class BubbleDetector(PatternDetector):
+    """Finds "simple" bubbles: a starting node with at least two outgoing
+       paths, all of which linearly extend to the same ending node (see
+       graph_objects.Bubble.is_valid_bubble()).
+    """
+    name = "bubbles"
+    message = config.BUBBLE_SEARCH_MSG
+
+    def worklist(self, nodes, out_degrees, in_degrees):
+        # If n doesn't lead to multiple nodes, it couldn't be a bubble start
+        return self.select(nodes, out_degrees > 1)
+
+    def detect(self, n):
+        bubble_validity, member_nodes = graph_objects.Bubble.is_valid_bubble(n)
+        if bubble_validity:
+            return graph_objects.Bubble(*member_nodes)
+        return None
+
+class SuperbubbleDetector(PatternDetector):
+    """Finds the superbubbles of the graph (see graph_core.Superbubbles), of
+       any size.
+
+       This ignores the order of the nodes it's given, since its worklist is
+       the graph's superbubbles: these are tried from the smallest to the
+       largest, so a superbubble nested within another superbubble is
+       collapsed instead of the one containing it.
+    """
+    name = "superbubbles"
+    message = config.SUPERBUBBLE_SEARCH_MSG
+
+    def __init__(self, nodeid2obj):
+        super(SuperbubbleDetector, self).__init__(nodeid2obj)
+        # The Superbubbles found in the graph, for the run report
+        self.superbubbles = None
+
+    def run(self, nodes):
+        if len(nodes) == 0:
+            return []
+        self.superbubbles = graph_core.Superbubbles(nodes[0].core.double)
+        return self.collapse(nodes, self.superbubbles.members,
+            graph_objects.Bubble)
+
+    def report(self):
+        msg = super(SuperbubbleDetector, self).report()
+        if self.superbubbles is None:
+            return msg
+        depths = self.superbubbles.depths()
+        return msg + config.SUPERBUBBLE_NESTING_MSG % (len(depths),
+            (depths == 0).sum(), (depths > 0).sum(),
+            depths.max() if len(depths) > 0 else 0)
+
+class RopeDetector(PatternDetector):
+    """Finds frayed ropes (see graph_objects.Rope.is_valid_rope())."""
+    name = "frayed_ropes"
+    message = config.FRAYEDROPE_SEARCH_MSG
+
+    def worklist(self, nodes, out_degrees, in_degrees):
+        # If n doesn't lead to a single node, it couldn't be a rope start
+        return self.select(nodes, out_degrees == 1)
+
+    def detect(self, n):
+        rope_validity, member_nodes = graph_objects.Rope.is_valid_rope(n)
+        if rope_validity:
+            return graph_objects.Rope(*member_nodes)
+        return None
+
+class CycleDetector(PatternDetector):
+    """Finds cyclic chains, by looking them up in the graph's unitigs (see
+       graph_core.Unitigs.linear_cycles()).
+
+       This ignores the order of the nodes it's given, since its worklist is
+       the graph's linear cycles.
+    """
+    name = "cycles"
+    message = config.CYCLE_SEARCH_MSG
+
+    def run(self, nodes):
+        if len(nodes) == 0:
+            return []
+        return self.collapse(nodes, nodes[0].core.unitigs.linear_cycles(),
+            graph_objects.Cycle)
+
+class ChainDetector(PatternDetector):
+    """Finds chains, by looking up the stretch of unitig around each node
+       (see graph_objects.Chain.chain_run()).
+    """
+    name = "chains"
+    message = config.CHAIN_SEARCH_MSG
+
+    def run(self, nodes):
+        groups = []
+        if len(nodes) == 0:
+            return groups
+        # Every other node in the stretch of unitig around a node would give
+        # us the same stretch, so we only need to check each stretch once
+        chain_checked = numpy.zeros(len(nodes[0].core.nodes), dtype=bool)
+        for n in nodes:
+            if n.used_in_collapsing or chain_checked[n.index]:
+                continue
+            chain_validity, member_nodes = graph_objects.Chain.chain_run(n)
+            for m in member_nodes:
+                chain_checked[m.index] = True
+            if chain_validity:
+                groups.append(graph_objects.Chain(*member_nodes))
+        return groups
+
+# All of the available detectors
+DETECTORS = (BubbleDetector, SuperbubbleDetector, RopeDetector,
+    CycleDetector, ChainDetector)
+
+def get_detector_classes(names):
+    """Returns a list of the detector classes with the given names (see
+       DETECTORS), in the same order as the names.
+
+       Raises a ValueError if a name doesn't match any detector, or if a
+       name is given more than once.
+    """
+    name2class = dict((d.name, d) for d in DETECTORS)
+    detector_classes = []
+    for name in names:
+        if name not in name2class:
+            raise ValueError, config.ARG_ERR + config.PATTERN_ERR + name
+        if names.count(name) > 1:
+            raise ValueError, config.ARG_ERR + config.PATTERN_DUPLICATE_ERR + \
+                name
+        detector_classes.append(name2class[name])
+    return detector_classes
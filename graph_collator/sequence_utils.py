@@ -0,0 +1,221 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Utility functions for working with DNA sequences in collate.py.
+#
+# Assembly graph files can contain sequences that are millions of nucleotides
+# long, so none of these functions loop over the nucleotides in a sequence in
+# Python. Instead, they rely on str.translate() and str.count(), which each
+# make a single pass over a sequence in C. (Packing sequences, for the
+# sequences table of the .db file, uses numpy for the same reason.)
+
+import re
+import string
+import numpy
+import config
+
+# Translation table mapping each nucleotide (including IUPAC ambiguity codes,
+# in upper- and lowercase) to its complement. Characters not in
+# config.COMPLEMENT are left as-is.
+COMPLEMENT_TABLE = string.maketrans("".join(config.COMPLEMENT.keys()),
+    "".join(config.COMPLEMENT.values()))
+
+# The characters that count towards a sequence's G/C content. (Only uppercase
+# G and C are counted, as they always have been.)
+GC_CHARS = "GC"
+
+# The nucleotides that can be stored in 2 bits each by pack_sequence(), in
+# the order of their 2-bit codes (i.e. A = 0, C = 1, G = 2, T = 3)
+PACKED_NUCLEOTIDES = "ACGT"
+
+# Translation table mapping each character to its 2-bit code (as a byte).
+# Characters that aren't A/C/G/T (in either case) are mapped to 0, and are
+# recorded as exceptions by pack_sequence() instead.
+PACK_TABLE = "".join(chr(max(PACKED_NUCLEOTIDES.find(chr(c).upper()), 0))
+    for c in xrange(256))
+
+# Matches a run of the same character that isn't A/C/G/T (e.g. a gap of Ns)
+# in an uppercase sequence
+EXCEPTION_RUN_RE = re.compile(r"([^ACGT])\1*")
+
+def reverse_complement(dna_string):
+    """Returns the reverse complement of a string of DNA.
+
+       e.g. reverse_complement("GCATATA") == "TATATGC"
+
+       IUPAC ambiguity codes are complemented accordingly
+       (e.g. reverse_complement("ARN") == "NYT"), and the case of each
+       nucleotide is preserved. Any characters that aren't nucleotides or
+       IUPAC codes are left unchanged.
+
+       This runs in time linear in the length of dna_string. Note that
+       collate.py doesn't need to compute reverse complements while parsing
+       (the reverse complement of a sequence has the same length and G/C
+       content as the sequence itself), so this should only be called when a
+       reverse complement sequence is actually going to be used.
+    """
+    return dna_string.translate(COMPLEMENT_TABLE)[::-1]
+
+def gc_count(dna_string):
+    """Returns the number of G/C nucleotides in a string of DNA.
+
+       e.g. gc_count("GCATTCAN") == 3
+    """
+    # Deleting all of the G/C characters from the string and looking at how
+    # much shorter the string got is a lot faster than counting each of
+    # the G/C characters separately
+    return len(dna_string) - len(dna_string.translate(None, GC_CHARS))
+
+def gc_content(dna_string):
+    """Returns the GC content (as a float in the range [0, 1]) of a string of
+       DNA, in a 2-tuple with the second element of the tuple being the
+       actual number of Gs and Cs in the dna_string (as computed by
+       gc_count()).
+
+       Ambiguous nucleotides (e.g. N) are included in the length of the
+       sequence, but aren't counted as G or C.
+
+       For reference, the GC content of a DNA sequence is the percentage of
+       nucleotides within the sequence that are either G (guanine) or C
+       (cytosine).
+
+       e.g. gc_content("GCATTCAC") == (0.5, 4)
+    """
+    gc_ct = gc_count(dna_string)
+    return (float(gc_ct) / len(dna_string)), gc_ct
+
+def buffer_gc_content(buf, start, end):
+    """Returns the same thing as gc_content(buf[start:end]), where buf is a
+       str or a memory-mapped file (see input_files.AssemblyFile.mmap()).
+
+       To avoid copying a long sequence in its entirety out of buf, this
+       only copies config.SEQUENCE_WINDOW_SIZE bytes of it at a time -- so the
+       memory this uses doesn't depend on the length of the sequence.
+    """
+    gc_ct = 0
+    for window_start in xrange(start, end, config.SEQUENCE_WINDOW_SIZE):
+        window_end = min(window_start + config.SEQUENCE_WINDOW_SIZE, end)
+        gc_ct += gc_count(buf[window_start:window_end])
+    return (float(gc_ct) / (end - start)), gc_ct
+
+def pack_sequence(dna_string):
+    """Packs a string of DNA into 2 bits per nucleotide (so four nucleotides
+       per byte, with the first nucleotide in the two highest bits of the
+       first byte). Returns a 2-tuple of the packed bytes (as a str) and a
+       string describing the sequence's "exceptions."
+
+       Nucleotides that don't fit into 2 bits (e.g. N, or other IUPAC codes)
+       are packed as A; each run of the same one of these characters is
+       described in the exceptions string as "start:length:character", with
+       runs separated by commas (e.g. "3:2:N,7:1:R"). Since gaps in
+       assemblies are usually long runs of N, this keeps the exceptions short.
+
+       The sequence is stored in uppercase, so soft-masking (lowercase
+       nucleotides) isn't preserved.
+
+       e.g. pack_sequence("ACGTNNA") == ("\x1b\x00", "4:2:N")
+    """
+    codes = numpy.frombuffer(dna_string.translate(PACK_TABLE),
+        dtype=numpy.uint8)
+    # Pad the codes with As to a multiple of 4, so that they can be split
+    # into groups of four nucleotides (one group per byte)
+    padded = numpy.zeros(-(-len(codes) // 4) * 4, dtype=numpy.uint8)
+    padded[:len(codes)] = codes
+    groups = padded.reshape(-1, 4)
+    packed = (groups[:, 0] << 6) | (groups[:, 1] << 4) | \
+        (groups[:, 2] << 2) | groups[:, 3]
+    exceptions = ",".join("%d:%d:%s" % (m.start(), m.end() - m.start(),
+        m.group(1)) for m in EXCEPTION_RUN_RE.finditer(dna_string.upper()))
+    return packed.astype(numpy.uint8).tostring(), exceptions
+
+def unpack_sequence(packed, length, exceptions):
+    """Returns the (uppercase) string of DNA, of the given length, that was
+       packed into the given packed bytes and exceptions string by
+       pack_sequence().
+
+       The viewer interface does the same thing in Javascript when exporting
+       sequences; this is mostly useful for checking the contents of a .db
+       file.
+    """
+    codes = numpy.frombuffer(packed, dtype=numpy.uint8)
+    unpacked = numpy.empty((len(codes), 4), dtype=numpy.uint8)
+    for i in xrange(4):
+        unpacked[:, i] = (codes >> (6 - (2 * i))) & 3
+    chars = numpy.frombuffer(PACKED_NUCLEOTIDES, dtype=numpy.uint8)
+    dna = bytearray(chars[unpacked.ravel()[:length]].tostring())
+    if exceptions != "":
+        for run in exceptions.split(","):
+            start, run_length, char = run.split(":")
+            start = int(start)
+            run_length = int(run_length)
+            dna[start:start + run_length] = char * run_length
+    return str(dna)
+
+def fasta_gc_counts(blocks):
+    """Generator that yields a (name, length, G/C count) tuple for each
+       sequence in a FASTA file, given an iterable of blocks of the file's
+       contents (e.g. input_files.AssemblyFile.blocks()). The name of a
+       sequence is the first word of its header line, without the ">".
+
+       Blocks can start and end anywhere in the file, so only one block of
+       the file is held in memory at a time -- no matter how long its
+       sequences (or the lines they're split into) are. The length and G/C
+       count of each sequence are accumulated one block at a time, using
+       str.translate() to remove line breaks and count G/C nucleotides.
+    """
+    # The header line of the current sequence, if we're partway through it
+    # (i.e. it continues into the next block)
+    header = None
+    name = None
+    length = 0
+    gc_ct = 0
+    for block in blocks:
+        pos = 0
+        while pos < len(block):
+            if header is not None:
+                eol = block.find("\n", pos)
+                if eol == -1:
+                    header += block[pos:]
+                    break
+                header += block[pos:eol]
+                name_words = header.split()
+                name = name_words[0] if len(name_words) > 0 else ""
+                header = None
+                pos = eol + 1
+            else:
+                # ">" can't occur within a sequence, so any ">" marks the
+                # start of the next sequence's header line
+                next_header = block.find(">", pos)
+                seq_end = len(block) if next_header == -1 else next_header
+                seq = block[pos:seq_end].translate(None, string.whitespace)
+                length += len(seq)
+                gc_ct += gc_count(seq)
+                if next_header == -1:
+                    break
+                if name is not None:
+                    yield name, length, gc_ct
+                header = ""
+                length = 0
+                gc_ct = 0
+                pos = next_header + 1
+    if header is not None:
+        # The file ended with a header line (without a trailing newline)
+        name_words = header.split()
+        name = name_words[0] if len(name_words) > 0 else ""
+    if name is not None:
+        yield name, length, gc_ct
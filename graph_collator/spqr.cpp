@@ -277,7 +277,6 @@ void findTwoVertexCuts(Bicomponent &bicomp, Skeleton &sk, unordered_map<int,int>
     
     node n1;
     const int nrNodes = G.numberOfNodes();
-    //cout<<"Number of nodes = "<<nrNodes<<endl;
     int allnodes[nrNodes];
     int count = 0;
     
@@ -285,9 +284,7 @@ void findTwoVertexCuts(Bicomponent &bicomp, Skeleton &sk, unordered_map<int,int>
         allnodes[count] = sk2orig[n1->index()];
         count++;
     }
-    //cout<<"Done"<<endl;
     if (type == "R") {
-        //cout<<"R"<<endl;
         //A virtual edge in an R node represents a two vertex cut
         forall_edges(e,G) {
             if (sk.isVirtual(e))
@@ -296,7 +293,6 @@ void findTwoVertexCuts(Bicomponent &bicomp, Skeleton &sk, unordered_map<int,int>
     }//if
     else if (type == "P") {
         //Node associated with p-nodes with two or more virtual edges are 2-vertex cuts
-        //cout<<"P"<<endl;
         virtualCount = 0;
         forall_edges(e,G) {
             if (sk.isVirtual(e)) {
@@ -310,7 +306,6 @@ void findTwoVertexCuts(Bicomponent &bicomp, Skeleton &sk, unordered_map<int,int>
     }//else if
     else if (type == "S") 
     {
-        //cout<<"S"<<endl;
         // A virtual edge in an S node represents a 2-vertex cuts
         unordered_map<pair<int,int>, bool, pair_hash > adjacent;
         forall_edges(e,G) {
@@ -328,7 +323,6 @@ void findTwoVertexCuts(Bicomponent &bicomp, Skeleton &sk, unordered_map<int,int>
                         if(adjacent.find(make_pair(allnodes[i], allnodes[j])) == adjacent.end() or adjacent.find(make_pair(allnodes[j], allnodes[i])) == adjacent.end())
                             pairs.push_back(make_pair(allnodes[i], allnodes[j]));
     }//else if
-    //cout<<pairs.size()<<endl;
 } //getTwoVertexCuts
 
 std::set<int> getBiComponent(GraphCopy *GC, BCTree *p_bct, node bcTreeNode) 
@@ -377,11 +371,18 @@ node original(node &n, BCTree &bc, const GraphCopy &GC, Skeleton &sk)
 
 int main(int argc, char* argv[])
 {    
+    // Only iostreams are used, so there's no need to keep them in sync with
+    // C stdio (which makes reading links from stdin a lot slower)
+    ios_base::sync_with_stdio(false);
     cmdline ::parser pr;
-    pr.add<string>("oriented_graph",'l',"file of list of oriented links",
+    pr.add<string>("oriented_graph",'l',
+        "file of list of oriented links (- to read them from stdin)",
         true,"");
     pr.add("seppairs",'s', "output separation pairs to a file");
     pr.add("spqrtree",'t',"output SPQR tree files for each bicomponent");
+    pr.add("pipe",'p',
+        "write the SPQR trees to stdout as frames instead of to files; "
+        "implies -t");
     pr.add<string>("output",'o',
         "file to write separation pairs to; used if -s is passed",false,
         "");
@@ -400,9 +401,16 @@ int main(int argc, char* argv[])
     if (directory != "" && directory[directory.length() - 1] != '/') {
        directory += "/";
     }
-    ifstream linkfile(getCharExpr(pr.get<string>("oriented_graph")));
+    string links_filename = pr.get<string>("oriented_graph");
+    ifstream linkfile;
+    istream *linkstream = &cin;
+    if (links_filename != "-") {
+        linkfile.open(getCharExpr(links_filename));
+        linkstream = &linkfile;
+    }
+    bool pipe_spqrtree = pr.exist("pipe");
     bool write_seppairs = pr.exist("seppairs");
-    bool write_spqrtree = pr.exist("spqrtree");
+    bool write_spqrtree = pr.exist("spqrtree") || pipe_spqrtree;
     ofstream ofile;
     if (write_seppairs) {
         string seppairs_filename = pr.get<string>("output");
@@ -416,17 +424,19 @@ int main(int argc, char* argv[])
     //unordered_map<int, Link> linkmap;
    
     unordered_map<string,node> revid2contig;
+    // The links are read in a single pass (so that they can be streamed in
+    // through stdin): nodes are created as they're first seen, and the edges
+    // between them are added once all of the nodes exist
+    vector<pair<node,node> > links;
     int contig_id = 1, linkid = 0;
-    while(getline(linkfile,line))
+    while(getline(*linkstream,line))
     {
-        //cout<<line<<endl;    
         string a,b,c,d;
         double e,f;
         int g;
         istringstream iss(line);
         if(!(iss >> a >> b >> c >> d >> e >> f >> g))
             break;
-        cout<<a<<"\t"<<c<<endl;
         //Link l(linkid,a,b,c,d,e,f,g);
         //Link l(linkid,a,b,c,d,e,f);
         node first = 0, second = 0;
@@ -447,31 +457,15 @@ int main(int argc, char* argv[])
                id2contig[second] = c;
                contig_id++;
            }
-           // cout<<first<<"\t"<<second<<endl;
-           // G.newEdge((node)first,(node)second);
-           // cout<<"edge added"<<endl;
+           links.push_back(make_pair(revid2contig[a], revid2contig[c]));
         //contigs2bundle[a+c] = g;
     }
-    linkfile.close();
-    //cout<<"Nodes: "<<G.numberOfNodes()<<endl;
-    ifstream linkfile1(getCharExpr(pr.get<string>("oriented_graph")));
-    while(getline(linkfile1,line))
+    if (linkfile.is_open()) {
+        linkfile.close();
+    }
+    for (int i = 0; i < links.size(); i++)
     {
-        //cout<<line<<endl;    
-        string a,b,c,d;
-        double e,f;
-        int g;
-        istringstream iss(line);
-        if(!(iss >> a >> b >> c >> d >> e >> f >> g))
-            break;
-        //Link l(linkid,a,b,c,d,e,f,g);
-        //Link l(linkid,a,b,c,d,e,f);
-        node first = revid2contig[a];
-        node second = revid2contig[c];
-           cout<<first<<"\t"<<second<<endl;
-           edge x = G.newEdge(node(first),node(second));
-           //cout<<"edge added"<<endl;
-        //contigs2bundle[a+c] = g;
+           G.newEdge(links[i].first, links[i].second);
     }
 
     cerr<<"Nodes: "<<G.numberOfNodes()<<endl;
@@ -481,15 +475,6 @@ int main(int argc, char* argv[])
     //since this is giving an error, lets just read tsv file and construct graph ourself
 
     // GraphIO::writeDOT(G,"tmp/original.dot");
-    // cout<<ok<<endl;
-    // if(ok)
-    // {
-    //     cout<<"Graph loaded correctly!"<<endl;
-    // }
-    // else
-    // {
-    //     cout<<"Graph loaded incorrectly!"<<endl;
-    // }
     
     
     //decompose into connected components
@@ -513,18 +498,10 @@ int main(int argc, char* argv[])
     forall_nodes(n, G)
     {
         index = node2cc[n];
-        cout << "Node " << intid2contig[n -> index()] << " in cc "
-            << index << endl;
         if (startNodes[index] == NULL) {
             startNodes[index] = n;
         }
     }
-    // following commented-out code verifies that startNodes is being set
-    // correctly.
-    //for (int asdf = 0; asdf < nrCC; asdf++) {
-    //    cout << "startNodes[" << asdf << "] = "
-    //      << intid2contig[startNodes[asdf] -> index()] << endl;
-    //}
     set<int> memberNodes;
     unordered_map<int,int> sk2orig; // node mapping
     //Building BC tree for each component
@@ -584,9 +561,7 @@ int main(int argc, char* argv[])
                 }
                 getCutVertexPair(GC,bcTreeNode,bc,j,bicomp);
                 StaticSPQRTree spqr(GC);
-                //cout<<"SPQR generated"<<endl;
                 const Graph &T = spqr.tree();
-                //cout<<"SPQR tree made"<<endl;
                 // Root the SPQR tree at the node with the largest value of
                 // |V| + |E|, where |V| = number of nodes in the skeleton graph
                 // and |E| = number of edges (real and virtual) in the skeleton
@@ -602,28 +577,39 @@ int main(int argc, char* argv[])
                     }
                 }
                 spqr.rootTreeAt(currentRootNode);
-                if (write_spqrtree) {
-                    //cout << "Making SPQR tree " << tree_index << endl;
+                if (write_spqrtree && !pipe_spqrtree) {
                     GraphIO::writeGML(T,directory+"spqr"+to_string(tree_index)+".gml");
                 }
-                // cout<<"S nodes: "<<spqr.numberOfSNodes()<<endl;
-                // cout<<"P nodes: "<<spqr.numberOfPNodes()<<endl;
-                // cout<<"R nodes: "<<spqr.numberOfRNodes()<<endl;
                 int c = 0;
                 GraphCopy GCopy(T);
                 node n,Nn,cn,tn,Tn;
                 edge Ee;
                 ofstream compfile;
-                if (write_spqrtree) {
+                if (write_spqrtree && !pipe_spqrtree) {
                     compfile.open(directory+"component_"+to_string(tree_index)+".info");
                 }
+                // With -p, the tree is written to stdout as a frame:
+                //   B <bicomponent ID>        starts the frame
+                //   M <metanode ID> <type>    starts a metanode's skeleton
+                //   r|v <node> <node>         real/virtual skeleton edge
+                //   n <node>                  skeleton node
+                //   T <metanode ID> <metanode ID>   SPQR tree edge
+                //   E                         ends the frame
+                ostream &info = pipe_spqrtree ? cout : compfile;
+                if (pipe_spqrtree) {
+                    info << "B\t" << tree_index << "\n";
+                }
                 tree_index++;
                 forall_nodes(n, T) 
                 {
                     const Graph &Gn = spqr.skeleton(n).getGraph(); // Print the skeleton of a tree node to dis
 
                     // Generate hash table: sk2orig[Skeleton node] = Original node 
-                    if (write_spqrtree) {
+                    if (pipe_spqrtree) {
+                        info << "M\t" << n << "\t"
+                            << getTypeString(n, spqr) << "\n";
+                    }
+                    else if (write_spqrtree) {
                         compfile<<n<<endl;
                         compfile << getTypeString(n, spqr)<<endl;
                     }
@@ -639,22 +625,27 @@ int main(int argc, char* argv[])
                         forall_adj_edges(Ee, Nn) {
                             if (Ee -> source() -> index() == Nn -> index()) {
                                 if (spqr.skeleton(n).isVirtual(Ee)) {
-                                    compfile << "v\t";
+                                    info << "v\t";
                                 }
                                 else {
-                                    compfile << "r\t";
+                                    info << "r\t";
                                 }
                                 // Get original target node
                                 Tn = Ee -> target();
                                 tn=original(Tn,bc,GC,spqr.skeleton(n));
-                                compfile << intid2contig[cn -> index()];
-                                compfile << "\t";
-                                compfile << intid2contig[tn -> index()];
-                                compfile << endl;
+                                info << intid2contig[cn -> index()];
+                                info << "\t";
+                                info << intid2contig[tn -> index()];
+                                info << "\n";
                             }
                         }
                         sk2orig[Nn->index()] = cn->index();
-                        compfile<<Nn->index()<<"\t"<<intid2contig[cn->index()]<<endl;
+                        if (pipe_spqrtree) {
+                            info << "n\t" << intid2contig[cn->index()] << "\n";
+                        }
+                        else {
+                            compfile<<Nn->index()<<"\t"<<intid2contig[cn->index()]<<endl;
+                        }
                     }
                                     
                         
@@ -663,6 +654,16 @@ int main(int argc, char* argv[])
                     findTwoVertexCuts(bicomp,spqr.skeleton(n) , sk2orig, type);
                     
                 }
+                if (pipe_spqrtree) {
+                    edge Te;
+                    forall_edges(Te, T) {
+                        info << "T\t" << Te -> source() << "\t"
+                            << Te -> target() << "\n";
+                    }
+                    // Flush each frame as soon as it's done, so that it can
+                    // be read while the next bicomponent is decomposed
+                    info << "E" << endl;
+                }
                 if (write_seppairs) {
                     for(int i = 0;i < pairs.size();i++)
                     {
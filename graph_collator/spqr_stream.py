@@ -0,0 +1,271 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Runs the SPQR script (spqr.cpp) as a subprocess. The links file it takes as
+# input is streamed to its stdin (from graph_core.GraphCore.links_chunks()) in
+# a background thread, while the SPQR trees it outputs are read from its stdout
+# as they're written -- so no links, component_*.info, or spqr*.gml files are
+# written to (or searched for in) the output directory.
+#
+# Builds of the script from before -p was added can't do this: in that case
+# (detected from the options listed in its usage message), the links file is
+# written to the script's temporary directory, the script is run on it with
+# -t, and the component_*.info and spqr*.gml files it writes there are read
+# once it has finished.
+#
+# The script (run with -p) writes the SPQR tree of each bicomponent as a
+# "frame" of tab-separated lines, the first field of which gives each line's
+# kind:
+#
+#   B <bicomponent ID>               starts the frame
+#   M <metanode ID> <S, P, or R>     starts the skeleton of a metanode
+#   r <node ID> <node ID>            a real edge in the metanode's skeleton
+#   v <node ID> <node ID>            a virtual edge in the metanode's skeleton
+#   n <node ID>                      a node in the metanode's skeleton
+#   T <metanode ID> <metanode ID>    an edge in the SPQR tree
+#   E                                ends the frame
+#
+# Metanode IDs are only unique within a bicomponent. The script is run in a
+# private temporary directory, which also holds its stderr (included in the
+# error raised if the script fails); this directory is removed afterwards.
+
+import os
+import re
+import errno
+import shutil
+import tempfile
+import threading
+import subprocess
+import config
+
+# The files that an older build of the script writes each SPQR tree to (see
+# SPQRProcess.file_frames())
+COMPONENT_FN_REGEX = re.compile("^component_(\d+)\.info$")
+COMPONENT_FN_TEMPLATE = "component_%s.info"
+TREE_FN_TEMPLATE = "spqr%s.gml"
+
+def supports_streaming(spqr_fullfn):
+    """Returns True if the SPQR script located at spqr_fullfn accepts -p (and
+       so can read its links file from stdin), judging by the usage message
+       that it prints for --help.
+    """
+    help_process = subprocess.Popen([spqr_fullfn, "--help"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    usage = help_process.communicate()[0]
+    return "--pipe" in usage
+
+class SPQRProcess(object):
+    """A running instance of the SPQR script."""
+
+    def __init__(self, spqr_fullfn, links_chunks):
+        """Starts the SPQR script located at spqr_fullfn, and starts writing
+           the links file given by links_chunks (an iterable of strings) to
+           its stdin.
+
+           If the script doesn't support -p, the links file is written to
+           its temporary directory instead, before the script is started.
+        """
+        self.temp_dir = tempfile.mkdtemp(prefix="spqr.")
+        self.stderr_fullfn = os.path.join(self.temp_dir, "stderr")
+        self.streaming = supports_streaming(spqr_fullfn)
+        # An exception raised while writing the links file, to be raised
+        # again in the main thread
+        self.write_error = None
+        self.writer_thread = None
+        if self.streaming:
+            self.invocation = [spqr_fullfn, "-l", "-", "-p"]
+            with open(self.stderr_fullfn, "w") as stderr_file:
+                self.process = subprocess.Popen(self.invocation,
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                    stderr=stderr_file, cwd=self.temp_dir)
+            self.writer_thread = threading.Thread(target=self.write_links,
+                args=(links_chunks,))
+            # Don't let this thread prevent collate.py from exiting if the
+            # main thread crashes
+            self.writer_thread.daemon = True
+            self.writer_thread.start()
+        else:
+            links_fullfn = os.path.join(self.temp_dir, "links")
+            with open(links_fullfn, "w") as links_file:
+                for chunk in links_chunks:
+                    links_file.write(chunk)
+            self.invocation = [spqr_fullfn, "-l", links_fullfn, "-t", "-d",
+                self.temp_dir]
+            # (These builds of the script also print progress messages to
+            # stdout, so those are kept with its stderr)
+            with open(self.stderr_fullfn, "w") as stderr_file:
+                self.process = subprocess.Popen(self.invocation,
+                    stdout=stderr_file, stderr=subprocess.STDOUT,
+                    cwd=self.temp_dir)
+
+    def write_links(self, links_chunks):
+        """Writes each chunk of the links file to the script's stdin, then
+           closes it. This is run in a separate thread.
+        """
+        try:
+            for chunk in links_chunks:
+                self.process.stdin.write(chunk)
+        except IOError as error:
+            # EPIPE means that the script exited before reading all of the
+            # links, in which case its exit status explains why
+            if error.errno != errno.EPIPE:
+                self.write_error = error
+        except Exception as error:
+            self.write_error = error
+        finally:
+            self.process.stdin.close()
+
+    def frames(self):
+        """Generator that yields a (bicomponent ID, metanodes, tree edges)
+           tuple for each frame the script outputs, as soon as the frame has
+           been read.
+
+           metanodes is a list of (metanode ID, type, node IDs, edges) tuples,
+           where each of edges is a list of its line's fields (["r" or "v",
+           node ID, node ID]); tree edges is a list of (source metanode ID,
+           target metanode ID) tuples.
+
+           Once all of the frames have been read, raises a
+           subprocess.CalledProcessError if the script failed, or the error
+           raised while writing the links file (if any).
+
+           If the script doesn't support -p, the frames are only read (from
+           the files it wrote) once it has finished; see file_frames().
+        """
+        if not self.streaming:
+            for frame in self.file_frames():
+                yield frame
+            return
+        bicomponent_id = None
+        metanodes = []
+        tree_edges = []
+        # (Iterating over stdout directly would read ahead in large blocks,
+        # delaying frames until the block containing them was full)
+        for line in iter(self.process.stdout.readline, ""):
+            fields = line.split()
+            kind = fields[0] if len(fields) > 0 else None
+            if kind == "B":
+                bicomponent_id = fields[1]
+                metanodes = []
+                tree_edges = []
+            elif kind == "M":
+                metanodes.append((fields[1], fields[2], [], []))
+            elif kind == "n":
+                metanodes[-1][2].append(fields[1])
+            elif kind == "r" or kind == "v":
+                metanodes[-1][3].append(fields)
+            elif kind == "T":
+                tree_edges.append((fields[1], fields[2]))
+            elif kind == "E":
+                yield bicomponent_id, metanodes, tree_edges
+            else:
+                self.close()
+                raise ValueError, config.SPQR_FRAME_ERR + line.rstrip("\n")
+        self.finish()
+
+    def file_frames(self):
+        """Generator that waits for the script to finish, then yields the
+           frames (in the same form as frames() does) described by the
+           component_*.info and spqr*.gml files it wrote, in order of
+           bicomponent ID.
+
+           In a component_*.info file, each metanode's skeleton starts with a
+           line giving the metanode's ID, followed by a line giving its type;
+           each of its nodes is given by a "<skeleton node index> <node ID>"
+           line, and each of its edges by a "r/v <node ID> <node ID>" line.
+           The edges of the SPQR tree are the edges of the spqr*.gml file.
+        """
+        if self.process.wait() != 0:
+            # Raises the script's error
+            self.finish()
+        bicomponent_ids = []
+        for fn in os.listdir(self.temp_dir):
+            match = COMPONENT_FN_REGEX.match(fn)
+            if match is not None:
+                bicomponent_ids.append(int(match.group(1)))
+        bicomponent_ids.sort()
+        for bicomponent_id in bicomponent_ids:
+            metanodes = []
+            metanode_id = None
+            component_fullfn = os.path.join(self.temp_dir,
+                COMPONENT_FN_TEMPLATE % (bicomponent_id))
+            with open(component_fullfn, "r") as component_file:
+                for line in component_file:
+                    fields = line.split()
+                    if len(fields) == 1 and fields[0].isdigit():
+                        metanode_id = fields[0]
+                    elif len(fields) == 1 and metanode_id is not None:
+                        # The metanode's type always follows its ID
+                        metanodes.append((metanode_id, fields[0], [], []))
+                        metanode_id = None
+                    elif len(fields) == 2:
+                        metanodes[-1][2].append(fields[1])
+                    elif len(fields) == 3 and fields[0] in ("r", "v"):
+                        metanodes[-1][3].append(fields)
+                    elif len(fields) > 0:
+                        self.close()
+                        raise ValueError, \
+                            config.SPQR_FRAME_ERR + line.rstrip("\n")
+            tree_edges = []
+            tree_fullfn = os.path.join(self.temp_dir,
+                TREE_FN_TEMPLATE % (bicomponent_id))
+            with open(tree_fullfn, "r") as tree_file:
+                source_id = None
+                for line in tree_file:
+                    fields = line.split()
+                    if len(fields) != 2:
+                        continue
+                    if fields[0] == "source":
+                        source_id = fields[1]
+                    elif fields[0] == "target":
+                        tree_edges.append((source_id, fields[1]))
+            yield str(bicomponent_id), metanodes, tree_edges
+        self.finish()
+
+    def finish(self):
+        """Waits for the script to exit, then cleans up after it (see
+           close()).
+
+           Raises a subprocess.CalledProcessError if the script failed, or
+           the error raised while writing the links file (if any).
+        """
+        returncode = self.process.wait()
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+        output = None
+        if returncode != 0:
+            with open(self.stderr_fullfn, "r") as stderr_file:
+                output = stderr_file.read()
+        self.close()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.invocation,
+                output)
+        if self.write_error is not None:
+            raise self.write_error
+
+    def close(self):
+        """Stops the script (if it's still running) and removes its temporary
+           directory. Calling this more than once is fine.
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.streaming:
+            self.process.stdout.close()
+            self.writer_thread.join()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
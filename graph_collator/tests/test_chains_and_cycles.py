@@ -0,0 +1,140 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Regression tests for chain and cycle detection, which look patterns up in
+# the graph's unitigs (see graph_core.Unitigs) instead of walking the graph
+# from every node. The expected patterns are the ones that the walks that
+# Chain.is_valid_chain() and Cycle.is_valid_cycle() used to do find in the
+# same graphs.
+
+import unittest
+import graph_core
+import graph_objects
+import pattern_detectors
+
+def build_nodes(node_count, edges, used=()):
+    """Returns a list of the Node objects of a single-stranded graph with
+       node_count nodes (with IDs "0", "1", ...) and the given edges
+       (2-tuples of node numbers), in which the nodes numbered in used have
+       already been used in collapsing.
+    """
+    core = graph_core.GraphCore(False)
+    nodes = []
+    for i in xrange(node_count):
+        n = graph_objects.Node(str(i), 10, False)
+        core.add_node(n, None, graph_objects.Node(str(i), 10, False,
+            is_single=True))
+        nodes.append(n)
+    for i, j in edges:
+        core.add_edge(str(i), str(j))
+    core.finalize()
+    for i in used:
+        nodes[i].used_in_collapsing = True
+    return nodes
+
+def find_patterns(pattern_names, node_count, edges, used=()):
+    """Returns a dict mapping each of the given pattern names to a list of
+       the patterns of that kind found in a graph (see build_nodes()), in the
+       order they were found. Each pattern is a list of the numbers of its
+       member nodes, in order.
+    """
+    nodes = build_nodes(node_count, edges, used)
+    nodeid2obj = dict((n.id_string, n) for n in nodes)
+    patterns = {}
+    for d in pattern_detectors.get_detector_classes(pattern_names):
+        groups = d(nodeid2obj).run(nodes)
+        patterns[d.name] = [[int(m.id_string) for m in g.nodes]
+            for g in groups]
+    return patterns
+
+class ChainTests(unittest.TestCase):
+
+    def chains(self, node_count, edges, used=()):
+        return find_patterns(["chains"], node_count, edges, used)["chains"]
+
+    def test_path(self):
+        self.assertEqual(self.chains(4, [(0, 1), (1, 2), (2, 3)]),
+            [[0, 1, 2, 3]])
+
+    def test_branches_end_chains(self):
+        # 1 has two incoming edges, and 3 has two outgoing edges
+        self.assertEqual(self.chains(6,
+            [(0, 1), (5, 1), (1, 2), (2, 3), (3, 4), (3, 5)]), [[1, 2, 3]])
+
+    def test_collapsed_node_splits_chain(self):
+        self.assertEqual(self.chains(5, [(0, 1), (1, 2), (2, 3), (3, 4)],
+            used=[2]), [[0, 1], [3, 4]])
+
+    def test_two_node_loop_is_not_a_chain(self):
+        self.assertEqual(self.chains(4, [(0, 1), (1, 0), (1, 2), (3, 0)]), [])
+
+    def test_chain_that_begins_cyclically(self):
+        # 0 has another incoming edge besides the one from 2
+        self.assertEqual(self.chains(5,
+            [(0, 1), (1, 2), (2, 0), (3, 0), (2, 4)]), [])
+
+    def test_loop_with_an_exit_is_a_chain(self):
+        # 2 -> 0 is 0's only incoming edge, but not 2's only outgoing edge
+        self.assertEqual(self.chains(4, [(0, 1), (1, 2), (2, 0), (2, 3)]),
+            [[0, 1, 2]])
+
+    def test_cyclic_unitig_is_not_a_chain(self):
+        self.assertEqual(self.chains(3, [(0, 1), (1, 2), (2, 0)]), [])
+
+class CycleTests(unittest.TestCase):
+
+    def cycles(self, node_count, edges, used=()):
+        # (The starting node of a cycle depends on the order that nodes are
+        # tried in, so just compare the sets of nodes in each cycle)
+        return sorted(sorted(c) for c in
+            find_patterns(["cycles"], node_count, edges, used)["cycles"])
+
+    def test_self_loop(self):
+        self.assertEqual(self.cycles(2, [(0, 0), (0, 1)]), [[0]])
+
+    def test_cyclic_unitig(self):
+        self.assertEqual(self.cycles(3, [(0, 1), (1, 2), (2, 0)]),
+            [[0, 1, 2]])
+
+    def test_chain_that_ends_cyclically(self):
+        self.assertEqual(self.cycles(5,
+            [(0, 1), (1, 2), (2, 0), (3, 0), (2, 4)]), [[0, 1, 2]])
+
+    def test_cycle_with_an_exit_at_its_end(self):
+        # Only the last node of a cycle can have other outgoing edges
+        self.assertEqual(self.cycles(4, [(0, 1), (1, 2), (2, 0), (1, 3)]),
+            [[0, 1, 2]])
+
+    def test_cycle_with_a_branch_inside_is_not_a_cycle(self):
+        # 1 has another outgoing edge, and 0 has another incoming edge, so
+        # no node can be the end of the cycle
+        self.assertEqual(self.cycles(5,
+            [(0, 1), (1, 2), (2, 0), (1, 3), (4, 0)]), [])
+
+    def test_collapsed_node_breaks_cycle(self):
+        self.assertEqual(self.cycles(3, [(0, 1), (1, 2), (2, 0)], used=[1]),
+            [])
+
+    def test_cycles_take_precedence_over_chains(self):
+        patterns = find_patterns(["cycles", "chains"], 6,
+            [(0, 1), (1, 2), (2, 0), (2, 3), (3, 4), (4, 5)])
+        self.assertEqual(sorted(patterns["cycles"][0]), [0, 1, 2])
+        self.assertEqual(patterns["chains"], [[3, 4, 5]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Tests for moving the finished .db file into place (see
+# db_writer.DatabaseWriter.finish()), including on filesystems that don't
+# support hard links.
+
+import os
+import errno
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import db_writer
+
+def unsupported_link(source, link_name):
+    """Stands in for os.link() on a filesystem without hard links."""
+    raise OSError(errno.EPERM, os.strerror(errno.EPERM), link_name)
+
+class TestFinish(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.db_fullfn = os.path.join(self.output_dir, "out.db")
+        self.real_link = os.link
+
+    def tearDown(self):
+        os.link = self.real_link
+        shutil.rmtree(self.output_dir)
+
+    def write_db(self, overwrite):
+        """Writes a .db file with one row in its assembly table."""
+        db = db_writer.DatabaseWriter(self.db_fullfn, overwrite)
+        db.insert("assembly", ("in.gfa", "GFA") + (0,) * 12)
+        db.finish()
+
+    def assert_only_db_left(self):
+        """Checks that the .db file was written, and that no temporary files
+           were left behind.
+        """
+        self.assertEqual(os.listdir(self.output_dir), ["out.db"])
+        connection = sqlite3.connect(self.db_fullfn)
+        rows = connection.execute("SELECT filename FROM assembly").fetchall()
+        connection.close()
+        self.assertEqual(rows, [(u"in.gfa",)])
+
+    def test_new_file(self):
+        self.write_db(False)
+        self.assert_only_db_left()
+
+    def test_new_file_without_hard_links(self):
+        os.link = unsupported_link
+        self.write_db(False)
+        self.assert_only_db_left()
+
+    def test_existing_file_without_hard_links(self):
+        os.link = unsupported_link
+        with open(self.db_fullfn, "w") as existing_file:
+            existing_file.write("existing")
+        self.assertRaises(OSError, self.write_db, False)
+        self.assertEqual(os.listdir(self.output_dir), ["out.db"])
+        with open(self.db_fullfn, "r") as existing_file:
+            self.assertEqual(existing_file.read(), "existing")
+
+    def test_overwrite(self):
+        with open(self.db_fullfn, "w") as existing_file:
+            existing_file.write("existing")
+        self.write_db(True)
+        self.assert_only_db_left()
+
+if __name__ == "__main__":
+    unittest.main()
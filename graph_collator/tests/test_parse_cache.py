@@ -0,0 +1,91 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Tests for saving and loading snapshots of parsed assembly graphs (see
+# parse_cache.py), including cleaning up after snapshots that were only
+# partially written.
+
+import os
+import shutil
+import tempfile
+import unittest
+import parse_cache
+import parsers
+
+RECORDS = [
+    parsers.SequenceRecord("1", 0, 4, "packed", ""),
+    parsers.NodeRecord("1", 4, 0.5, 0.5, 4),
+    parsers.NodeRecord("2", 6),
+    parsers.EdgeRecord("1", "2", 3),
+    parsers.ReadCountRecord("1", 7),
+]
+
+class ListParser(object):
+    """Stands in for a parser (see parsers.py) that generates RECORDS."""
+
+    store_sequences = True
+
+    def records(self):
+        for record in RECORDS:
+            yield record
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.asm_fn = os.path.join(self.temp_dir, "in.gfa")
+        with open(self.asm_fn, "w") as asm_file:
+            asm_file.write("S\t1\tACGT\n")
+        self.cache = parse_cache.ParseCache(self.cache_dir, 1048576)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_snapshot_saved_and_loaded(self):
+        self.assertEqual(list(self.cache.records(self.asm_fn, ListParser())),
+            RECORDS)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertTrue(os.listdir(self.cache_dir)[0].endswith(
+            parse_cache.SNAPSHOT_SUFFIX))
+        # Nodes and edges come first when loaded from a snapshot
+        loaded = list(self.cache.records(self.asm_fn, ListParser()))
+        self.assertEqual(loaded, RECORDS[1:] + RECORDS[:1])
+
+    def test_closed_early(self):
+        records = self.cache.records(self.asm_fn, ListParser())
+        next(records)
+        records.close()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_consumer_failed(self):
+        # The generator isn't closed here, as if the exception raised while
+        # its records were being used left it referenced until collate.py
+        # exited
+        records = self.cache.records(self.asm_fn, ListParser())
+        next(records)
+        next(records)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.cache.discard()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        # Closing the generator afterwards is harmless
+        records.close()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Tests for running the SPQR script (see spqr_stream.py), both with builds of
+# it that support -p and with older builds that only read and write files.
+# Shell scripts that output the SPQR tree of a fixed bicomponent stand in for
+# the script, so OGDF isn't needed.
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+import spqr_stream
+
+LINKS = "a\tB\tb\tB\t0\t0\t0\nb\tB\tc\tB\t0\t0\t0\nc\tB\ta\tB\t0\t0\t0\n"
+
+# Outputs the SPQR tree of the triangle a -> b -> c -> a, in the form written
+# by builds of the script with -p
+STREAMING_SCRIPT = r"""#!/bin/sh
+if [ "$1" = "--help" ]; then
+    echo "usage: spqr --oriented_graph=string [options] ..." >&2
+    echo "  -p, --pipe              write the SPQR trees to stdout" >&2
+    exit 0
+fi
+cat > /dev/null
+printf 'B\t1\nM\t0\tS\nr\ta\tb\nn\ta\nr\tb\tc\nn\tb\nr\tc\ta\nn\tc\nE\n'
+"""
+
+# Outputs the same SPQR tree in the files written by older builds of the
+# script (which print progress messages to stdout, and whose usage message
+# doesn't list --pipe)
+FILE_SCRIPT = r"""#!/bin/sh
+if [ "$1" = "--help" ]; then
+    echo "usage: spqr --oriented_graph=string [options] ..." >&2
+    echo "  -t, --spqrtree          output SPQR tree files" >&2
+    exit 0
+fi
+echo "Nodes: 3"
+printf '0\nS\nr\ta\tb\n0\ta\nr\tb\tc\n1\tb\nr\tc\ta\n2\tc\n' \
+    > "$5/component_1.info"
+printf 'graph [\n  node [\n    id 0\n  ]\n]\n' > "$5/spqr1.gml"
+"""
+
+FAILING_SCRIPT = r"""#!/bin/sh
+if [ "$1" = "--help" ]; then
+    exit 0
+fi
+echo "something went wrong" >&2
+exit 1
+"""
+
+EXPECTED_FRAMES = [("1", [("0", "S", ["a", "b", "c"],
+    [["r", "a", "b"], ["r", "b", "c"], ["r", "c", "a"]])], [])]
+
+class TestSPQRProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.script_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.script_dir)
+
+    def run_script(self, script_text):
+        """Returns a list of the frames read from an SPQRProcess running a
+           script with the given text, and the SPQRProcess itself.
+        """
+        script_fullfn = os.path.join(self.script_dir, "spqr")
+        with open(script_fullfn, "w") as script_file:
+            script_file.write(script_text)
+        os.chmod(script_fullfn, stat.S_IRWXU)
+        process = spqr_stream.SPQRProcess(script_fullfn, [LINKS])
+        return list(process.frames()), process
+
+    def test_streaming(self):
+        frames, process = self.run_script(STREAMING_SCRIPT)
+        self.assertTrue(process.streaming)
+        self.assertEqual(frames, EXPECTED_FRAMES)
+        self.assertFalse(os.path.exists(process.temp_dir))
+
+    def test_files(self):
+        frames, process = self.run_script(FILE_SCRIPT)
+        self.assertFalse(process.streaming)
+        self.assertEqual(frames, EXPECTED_FRAMES)
+        self.assertFalse(os.path.exists(process.temp_dir))
+
+    def test_failure(self):
+        with self.assertRaises(spqr_stream.subprocess.CalledProcessError) \
+                as context:
+            self.run_script(FAILING_SCRIPT)
+        self.assertIn("something went wrong", context.exception.output)
+
+if __name__ == "__main__":
+    unittest.main()
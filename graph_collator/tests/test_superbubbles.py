@@ -0,0 +1,75 @@
+# Copyright (C) 2017 Marcus Fedarko, Jay Ghurye, Todd Treangen, Mihai Pop
+# Authored by Marcus Fedarko
+#
+# This file is part of MetagenomeScope.
+#
+# MetagenomeScope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# MetagenomeScope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with MetagenomeScope.  If not, see <http://www.gnu.org/licenses/>.
+####
+# Regression tests for superbubble detection (see graph_core.Superbubbles) in
+# cyclic components that have no edges to or from the rest of the graph, in
+# which the superbubbles found used to depend on how the nodes were numbered.
+
+import itertools
+import unittest
+import numpy
+import graph_core
+
+def find_superbubbles(node_count, edges):
+    """Returns a dict mapping the (entrance, exit) node numbers of each
+       superbubble found in the graph with node_count nodes and the given
+       edges (2-tuples of node numbers) to the set of its node numbers.
+    """
+    graph = graph_core.AdjacencyArrays(node_count,
+        numpy.array([e[0] for e in edges], dtype=numpy.int32),
+        numpy.array([e[1] for e in edges], dtype=numpy.int32))
+    superbubbles = graph_core.Superbubbles(graph)
+    found = {}
+    for b in xrange(len(superbubbles)):
+        found[(superbubbles.entrances[b], superbubbles.exits[b])] = \
+            set(superbubbles.members[b].tolist())
+    return found
+
+def check_all_numberings(test, node_count, edges, expected):
+    """Checks that exactly the superbubbles in expected (a dict in the form
+       returned by find_superbubbles()) are found under every numbering of
+       the graph's nodes, with its edges given in either order.
+    """
+    for numbering in itertools.permutations(xrange(node_count)):
+        renumbered = [(numbering[i], numbering[j]) for i, j in edges]
+        renumbered_expected = {}
+        for (s, t), members in expected.iteritems():
+            renumbered_expected[(numbering[s], numbering[t])] = \
+                set(numbering[m] for m in members)
+        for ordered_edges in (renumbered, renumbered[::-1]):
+            test.assertEqual(find_superbubbles(node_count, ordered_edges),
+                renumbered_expected)
+
+class TestIsolatedCycles(unittest.TestCase):
+
+    def test_superbubble_with_tip(self):
+        # 0 -> {1, 2} -> 3 -> 4, with 1 -> 4 and the cycle closed by 4 -> 5
+        # -> 0: only (0, 4) is a superbubble
+        edges = [(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (1, 4), (4, 5),
+            (5, 0)]
+        check_all_numberings(self, 6, edges, {(0, 4): set(xrange(5))})
+
+    def test_simple_bubble(self):
+        edges = [(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (4, 0)]
+        check_all_numberings(self, 5, edges, {(0, 3): set(xrange(4))})
+
+    def test_cycle_without_superbubbles(self):
+        check_all_numberings(self, 4, [(0, 1), (1, 2), (2, 3), (3, 0)], {})
+
+if __name__ == "__main__":
+    unittest.main()
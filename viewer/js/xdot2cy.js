@@ -127,6 +127,9 @@ var DNA_AVAILABLE;
 // Whether or not repeat data was provided in the input to the preprocessing
 // script (impacts the availability of repeat colorization)
 var REPEAT_INFO_AVAILABLE;
+// Whether or not nodes' DNA sequences were stored in the .db file by the
+// preprocessing script (impacts the availability of FASTA export)
+var SEQUENCES_AVAILABLE;
 // FIlename of the currently loaded .db file
 var DB_FILENAME;
 // Total number of nodes and edges in the current asm graph
@@ -977,6 +980,9 @@ function setGraphBindings() {
                     SELECTED_CLUSTER_COUNT === 1) {
                 enableButton("fitSelectedButton");
             }
+            if (SELECTED_NODE_COUNT === 1 && SEQUENCES_AVAILABLE) {
+                enableButton("exportDNAButton");
+            }
         }
     );
     cy.on('unselect', 'node.noncluster, edge, node.cluster',
@@ -1006,6 +1012,9 @@ function setGraphBindings() {
                     SELECTED_CLUSTER_COUNT <= 0) {
                 disableButton("fitSelectedButton");
             }
+            if (SELECTED_NODE_COUNT <= 0) {
+                disableButton("exportDNAButton");
+            }
         }
     );
     // TODO look into getting this more efficient in the future, if possible
@@ -1199,6 +1208,9 @@ function parseDBcomponents() {
     var asmGC = graphInfo["gc_content"];
     DNA_AVAILABLE = (graphInfo["dna_given"] === 1) ? true : false;
     REPEAT_INFO_AVAILABLE = (graphInfo["repeats_given"] === 1) ? true : false;
+    // (.db files created before sequences could be stored don't have a
+    // sequences_given column at all)
+    SEQUENCES_AVAILABLE = (graphInfo["sequences_given"] === 1) ? true : false;
     if (ASM_FILETYPE === "LastGraph" || ASM_FILETYPE === "GFA") {
         // Since the nodes in these graphs are unoriented (i.e. we draw both
         // strands of each sequence of DNA included in the assembly graph),
@@ -1552,6 +1564,7 @@ function drawSPQRComponent(cmpRank) {
     $("#selectedNodeBadge").text(0);
     $("#selectedEdgeBadge").text(0);
     $("#selectedClusterBadge").text(0);
+    disableButton("exportDNAButton");
     BICOMPONENTID2VISIBLESINGLENODEIDS = {};
     $("#searchForElementsControls").addClass("notviewable");
     $("#assemblyFinishingControls").addClass("notviewable");
@@ -1730,6 +1743,7 @@ function drawComponent(cmpRank) {
     $("#selectedNodeBadge").text(0);
     $("#selectedEdgeBadge").text(0);
     $("#selectedClusterBadge").text(0);
+    disableButton("exportDNAButton");
     BICOMPONENTID2VISIBLESINGLENODEIDS = {};
     // Set the controls that aren't viewable in the SPQR view to be viewable,
     // since we're not drawing the SPQR view
@@ -2329,54 +2343,165 @@ function clearSelectedInfo() {
     }
 }
 
+// The maximum number of node IDs whose sequences are fetched from the
+// sequences table in a single query. (SQLite limits the number of parameters
+// a query can have to 999 by default.)
+var SEQUENCE_QUERY_BATCH_SIZE = 500;
+// The number of nucleotides per line of exported FASTA files
+var FASTA_LINE_LENGTH = 70;
+// Maps each nucleotide (or IUPAC ambiguity code) to its complement. Sequences
+// stored in the .db file are always uppercase.
+var COMPLEMENT = {"A": "T", "T": "A", "C": "G", "G": "C", "U": "A", "N": "N",
+    "R": "Y", "Y": "R", "K": "M", "M": "K", "S": "S", "W": "W", "B": "V",
+    "V": "B", "D": "H", "H": "D"};
+// Maps each possible byte of a packed sequence to the four nucleotides it
+// encodes. Filled in by unpackSequenceBlock() the first time it's called.
+var PACKED_BYTE_TO_NTS = null;
+
+/* Returns the DNA sequence stored in a row of the sequences table, as a
+ * string. packed is a Uint8Array of nucleotides packed into 2 bits each (A =
+ * 0, C = 1, G = 2, T = 3, with the first nucleotide in the two highest bits
+ * of the first byte), length is the number of nucleotides in the block, and
+ * exceptions describes runs of nucleotides that couldn't be packed as
+ * comma-separated "start:length:character" strings (e.g. "3:2:N,7:1:R").
+ *
+ * See pack_sequence() in graph_collator/sequence_utils.py for the other side
+ * of this.
+ */
+function unpackSequenceBlock(packed, length, exceptions) {
+    var b, i;
+    if (PACKED_BYTE_TO_NTS === null) {
+        var nts = "ACGT";
+        PACKED_BYTE_TO_NTS = [];
+        for (b = 0; b < 256; b++) {
+            PACKED_BYTE_TO_NTS.push(nts[b >> 6] + nts[(b >> 4) & 3] +
+                nts[(b >> 2) & 3] + nts[b & 3]);
+        }
+    }
+    var chunks = new Array(packed.length);
+    for (i = 0; i < packed.length; i++) {
+        chunks[i] = PACKED_BYTE_TO_NTS[packed[i]];
+    }
+    // The last byte might've been padded with As
+    var dna = chunks.join("").substring(0, length);
+    if (exceptions === "") {
+        return dna;
+    }
+    var runs = exceptions.split(",");
+    var pieces = [];
+    var pos = 0;
+    var run, runStart, runLength;
+    for (i = 0; i < runs.length; i++) {
+        run = runs[i].split(":");
+        runStart = parseInt(run[0]);
+        runLength = parseInt(run[1]);
+        pieces.push(dna.substring(pos, runStart));
+        pieces.push(new Array(runLength + 1).join(run[2]));
+        pos = runStart + runLength;
+    }
+    pieces.push(dna.substring(pos));
+    return pieces.join("");
+}
+
+/* Returns the reverse complement of a string of (uppercase) DNA. */
+function reverseComplement(dna) {
+    var rc = new Array(dna.length);
+    var nt;
+    for (var i = 0; i < dna.length; i++) {
+        nt = dna[i];
+        rc[dna.length - 1 - i] = COMPLEMENT.hasOwnProperty(nt) ?
+            COMPLEMENT[nt] : nt;
+    }
+    return rc.join("");
+}
+
 /* Return a single string containing the DNA sequences of the selected
- * nodes, in FASTA format. NOTE that this only works if nodes in the database
- * have a dnafwd column, which (as of June 7, 2017) they don't. Hence why the
- * button for calling this function is disabled at present.
- * (There's some limits on data URI sizes that, given sufficiently large
- * contigs, is relatively easy to hit -- that's why this feature is
- * disabled at present.)
+ * nodes, in FASTA format. This only works if the .db file contains nodes'
+ * sequences (i.e. SEQUENCES_AVAILABLE is true); the button for calling this
+ * function is disabled otherwise.
+ *
+ * Only forward sequences are stored in the .db file, so the sequences of
+ * reverse complement nodes (e.g. "-5") are computed from the sequences of
+ * their positive nodes (e.g. "5"). Selected nodes without a stored sequence
+ * are left out.
  */
 function getSelectedNodeDNA() {
-    // Get DNA sequences from database file, and append them to a string
-    var dnaStmt;
-    var dnaSeqs = "";
-    var currDnaSeq;
-    var seqIndex;
-    var afterFirstSeqLine;
+    // Figure out which stored sequences we need. We use the IDs of nodes in
+    // the .db file (and not their IDs in Cytoscape.js, which are different in
+    // the SPQR view)
+    var seqIDs = [];
+    var id2blocks = {};
+    var nodeIDs = [];
     SELECTED_NODES.each(function(e, i) {
-        // Is there any way to make this more efficient? Like, via
-        // selecting multiple dnafwd values at once...?
-        dnaStmt = CURR_DB.prepare("SELECT dnafwd FROM nodes WHERE id = ?",
-            [e.id()]);
-        dnaStmt.step();
-        if (i > 0) {
-            dnaSeqs += "\n";
+        var nodeID = e.data("db_id");
+        var seqID = nodeID;
+        if (ASM_FILETYPE !== "GML" && nodeID[0] === "-") {
+            seqID = nodeID.substring(1);
         }
-        dnaSeqs += ">NODE_" + e.id() + "\n";
-        afterFirstSeqLine = false;
-        currDnaSeq = dnaStmt.getAsObject()['dnafwd'];
-        for (seqIndex = 0; seqIndex < currDnaSeq.length; seqIndex += 70) {
-            if (afterFirstSeqLine) {
-                dnaSeqs += "\n";
-            }
-            else {
-                afterFirstSeqLine = true;
-            }
-            dnaSeqs += currDnaSeq.substring(seqIndex, seqIndex + 70);
+        nodeIDs.push(nodeID);
+        if (!id2blocks.hasOwnProperty(seqID)) {
+            id2blocks[seqID] = [];
+            seqIDs.push(seqID);
         }
-        dnaStmt.free();
     });
-    return dnaSeqs;
+    // Fetch the blocks of these sequences in as few queries as possible
+    var batch, questionMarks, seqStmt, row;
+    for (var b = 0; b < seqIDs.length; b += SEQUENCE_QUERY_BATCH_SIZE) {
+        batch = seqIDs.slice(b, b + SEQUENCE_QUERY_BATCH_SIZE);
+        questionMarks = "(" + new Array(batch.length + 1).join("?,");
+        questionMarks = questionMarks.slice(0, questionMarks.length - 1) + ")";
+        seqStmt = CURR_DB.prepare(
+            "SELECT * FROM sequences WHERE node_id IN " + questionMarks
+          + " ORDER BY node_id, block_index", batch);
+        while (seqStmt.step()) {
+            row = seqStmt.getAsObject();
+            id2blocks[row["node_id"]].push(unpackSequenceBlock(
+                row["packed"], row["length"], row["exceptions"]));
+        }
+        seqStmt.free();
+    }
+    // Assemble the FASTA file
+    var fastaEntries = [];
+    var nodeID, seqID, currDnaSeq, seqLines, seqIndex;
+    for (var n = 0; n < nodeIDs.length; n++) {
+        nodeID = nodeIDs[n];
+        seqID = nodeID;
+        if (ASM_FILETYPE !== "GML" && nodeID[0] === "-") {
+            seqID = nodeID.substring(1);
+        }
+        if (id2blocks[seqID].length === 0) {
+            continue;
+        }
+        currDnaSeq = id2blocks[seqID].join("");
+        if (seqID !== nodeID) {
+            currDnaSeq = reverseComplement(currDnaSeq);
+        }
+        seqLines = [">NODE_" + nodeID];
+        for (seqIndex = 0; seqIndex < currDnaSeq.length;
+                seqIndex += FASTA_LINE_LENGTH) {
+            seqLines.push(currDnaSeq.substring(seqIndex,
+                seqIndex + FASTA_LINE_LENGTH));
+        }
+        fastaEntries.push(seqLines.join("\n"));
+    }
+    return fastaEntries.join("\n") + "\n";
 }
- 
-/* Exports selected node DNA to a FASTA file via a data URI. */
+
+/* Exports selected node DNA to a FASTA file.
+ *
+ * This uses a Blob instead of a base64 data URI, since browsers limit the
+ * size of data URIs (and a FASTA file of a few contigs can easily exceed
+ * those limits).
+ */
 function exportSelectedNodeDNA() {
-    window.open(
-        "data:text/FASTA;charset=utf-8;base64," +
-        window.btoa(getSelectedNodeDNA()),
-        "_blank"
-    );
+    var fastaBlob = new Blob([getSelectedNodeDNA()], {type: "text/plain"});
+    var fastaURL = window.URL.createObjectURL(fastaBlob);
+    downloadDataURI("selected_nodes.fasta", fastaURL, false);
+    // Give the browser a chance to start the download before releasing the
+    // Blob
+    window.setTimeout(function() {
+        window.URL.revokeObjectURL(fastaURL);
+    }, 1000);
 }
 
 /* Fits the graph to all its elements if toSelected is false, and to only
@@ -3839,7 +3964,9 @@ function renderNodeObject(nodeObj, cyNodeID, boundingboxObject, mode) {
             }
         }
     }
-    var nodeData = {id: cyNodeID, label: labelUsed,
+    // db_id is the node's ID in the .db file (which, in the SPQR view,
+    // isn't the same as its ID in Cytoscape.js)
+    var nodeData = {id: cyNodeID, db_id: nodeObj['id'], label: labelUsed,
                w: INCHES_TO_PIXELS * nodeObj['h'],
                h: INCHES_TO_PIXELS * nodeObj['w'], depth: nodeDepth,
                length: nodeLength, gc_content: nodeGC, gc_color: gcColor,